@@ -2,7 +2,7 @@
 Helper functions to produce the About page for each version of the dashboard
 """
 
-from kailo_beewell_dashboard.images import get_image_path
+from kailo_beewell_dashboard.images import COLUMN_WIDTH, get_image_path
 from kailo_beewell_dashboard.reuse_text import reuse_text
 from kailo_beewell_dashboard.stylable_container import header_container
 import streamlit as st
@@ -17,26 +17,29 @@ def symbol_content():
     st.markdown("""The survey contained ten questions which use the Widgit
                 symbol system. These were:""")
     # Add the images (they are the same as those used for the survey, but
-    # cropped to height of 340 to remove the 'choose one' from each)
-    st.image(get_image_path("symbol_survey/family_crop.png"))
-    st.image(get_image_path("symbol_survey/home_crop.png"))
-    st.image(get_image_path("symbol_survey/friends_crop.png"))
-    st.image(get_image_path("symbol_survey/choice_crop.png"))
-    st.image(get_image_path("symbol_survey/things_crop.png"))
-    st.image(get_image_path("symbol_survey/health_crop.png"))
-    st.image(get_image_path("symbol_survey/future_crop.png"))
-    st.image(get_image_path("symbol_survey/school_crop.png"))
-    st.image(get_image_path("symbol_survey/free_time_crop.png"))
-    st.image(get_image_path("symbol_survey/life_crop.png"))
+    # cropped to height of 340 to remove the 'choose one' from each). These
+    # are shown at their own width, up to the width of the column, so use
+    # copies resized to the column width (and a third of it for the faces,
+    # which are in three columns)
+    st.image(get_image_path("symbol_survey/family_crop.png", COLUMN_WIDTH))
+    st.image(get_image_path("symbol_survey/home_crop.png", COLUMN_WIDTH))
+    st.image(get_image_path("symbol_survey/friends_crop.png", COLUMN_WIDTH))
+    st.image(get_image_path("symbol_survey/choice_crop.png", COLUMN_WIDTH))
+    st.image(get_image_path("symbol_survey/things_crop.png", COLUMN_WIDTH))
+    st.image(get_image_path("symbol_survey/health_crop.png", COLUMN_WIDTH))
+    st.image(get_image_path("symbol_survey/future_crop.png", COLUMN_WIDTH))
+    st.image(get_image_path("symbol_survey/school_crop.png", COLUMN_WIDTH))
+    st.image(get_image_path("symbol_survey/free_time_crop.png", COLUMN_WIDTH))
+    st.image(get_image_path("symbol_survey/life_crop.png", COLUMN_WIDTH))
     st.markdown("For each questions, pupils had three response options:")
-    st.image(get_image_path("symbol_survey/choose_one.png"))
+    st.image(get_image_path("symbol_survey/choose_one.png", COLUMN_WIDTH))
     cols = st.columns(3)
     with cols[0]:
-        st.image(get_image_path("symbol_survey/happy.png"))
+        st.image(get_image_path("symbol_survey/happy.png", COLUMN_WIDTH // 3))
     with cols[1]:
-        st.image(get_image_path("symbol_survey/ok.png"))
+        st.image(get_image_path("symbol_survey/ok.png", COLUMN_WIDTH // 3))
     with cols[2]:
-        st.image(get_image_path("symbol_survey/sad.png"))
+        st.image(get_image_path("symbol_survey/sad.png", COLUMN_WIDTH // 3))
 
 
 def create_about_page(dashboard_type):
@@ -66,7 +69,10 @@ def create_about_page(dashboard_type):
     # Description of the Kailo project
     with st.expander("What is Kailo?", expanded=expand):
         st.markdown(reuse_text["kailo"])
-        st.image(get_image_path("kailo_systems_adapted.png"), use_column_width=True)
+        st.image(
+            get_image_path("kailo_systems_adapted.png", COLUMN_WIDTH),
+            use_column_width=True,
+        )
 
     # FAQs about the #BeeWell survey
     header_container("orange_container", "🐝 The #BeeWell survey", "#F7DCC8")
@@ -77,7 +83,10 @@ def create_about_page(dashboard_type):
             st.markdown(reuse_text["sample_symbol"])
         else:
             st.markdown(reuse_text["sample"])
-        st.image(get_image_path("northern_devon.png"), use_column_width=True)
+        st.image(
+            get_image_path("northern_devon.png", COLUMN_WIDTH),
+            use_column_width=True,
+        )
 
     # Survey content, and design of the survey
     if dashboard_type == "public":
@@ -89,7 +98,10 @@ def create_about_page(dashboard_type):
         # Public dashboard - survey design
         with st.expander("How was the standard survey designed?", expanded=expand):
             st.markdown(reuse_text["standard_design"])
-            st.image(get_image_path("canva_people.png"), use_column_width=True)
+            st.image(
+                get_image_path("canva_people.png", COLUMN_WIDTH),
+                use_column_width=True,
+            )
         with st.expander("How was the symbol survey designed?", expanded=expand):
             st.markdown(reuse_text["symbol_design"])
     else:
@@ -105,12 +117,18 @@ def create_about_page(dashboard_type):
                 st.markdown(reuse_text["standard_design"])
             elif dashboard_type == "symbol":
                 st.markdown(reuse_text["symbol_design"])
-            st.image(get_image_path("canva_people.png"), use_column_width=True)
+            st.image(
+                get_image_path("canva_people.png", COLUMN_WIDTH),
+                use_column_width=True,
+            )
 
     # Other #BeeWell sites
     with st.expander("Where else have these surveys been completed?", expanded=expand):
         st.markdown(reuse_text["other_beewell_sites"])
-        st.image(get_image_path("beewell_map.png"), use_column_width=True)
+        st.image(
+            get_image_path("beewell_map.png", COLUMN_WIDTH),
+            use_column_width=True,
+        )
 
     # FAQs about the dashboard
     header_container("blue_container", "📊 Dashboard", "#D0C9FF")
@@ -127,14 +145,20 @@ def create_about_page(dashboard_type):
     # How to use the results
     with st.expander("How should we use these results?", expanded=expand):
         st.markdown(reuse_text["how_to_use_results"])
-        st.image(get_image_path("thinking.png"), use_column_width=True)
+        st.image(
+            get_image_path("thinking.png", COLUMN_WIDTH),
+            use_column_width=True,
+        )
 
     # Accessing the dashboard on different devices
     with st.expander(
         "Can I access this dashboard on different devices?", expanded=expand
     ):
         st.markdown(reuse_text["view_devices"])
-        st.image(get_image_path("devices.png"), use_column_width=True)
+        st.image(
+            get_image_path("devices.png", COLUMN_WIDTH),
+            use_column_width=True,
+        )
 
     # Support with dashboards (for school dashboards only)
     if dashboard_type != "public":
@@ -3,11 +3,27 @@ Helper functions for user authentication
 '''
 import streamlit as st
 import os
-from django.core.wsgi import get_wsgi_application
-from django.contrib.auth import authenticate
+import threading
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
-application = get_wsgi_application()
+# Whether Django has been set up by setup_django()
+_django_ready = False
+_django_lock = threading.Lock()
+
+
+def setup_django():
+    '''
+    Set up Django (settings, apps and database connection), so it can be used
+    to check passwords. This is done the first time it is needed, rather than
+    when the module is imported, so pages (and processes, such as building
+    the reports) that don't check passwords don't need to load Django.
+    '''
+    global _django_ready
+    with _django_lock:
+        if not _django_ready:
+            import django
+            os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+            django.setup()
+            _django_ready = True
 
 
 def get_school(username):
@@ -35,6 +51,8 @@ def password_entered():
     Checks whether a password entered by the user is correct
     '''
     # Use Django to check if the username and password match record
+    setup_django()
+    from django.contrib.auth import authenticate
     user = authenticate(
         username=st.session_state['username'],
         password=st.session_state['password']
@@ -2,11 +2,13 @@
 Functions used to produce the two types of bar chart
 '''
 from contextlib import nullcontext
+from functools import lru_cache
 from markdown import markdown
 import numpy as np
-import plotly.express as px
+from plotly.colors import qualitative
+import plotly.io as pio
 import streamlit as st
-from .images import convert_fig_to_html
+from .images import convert_fig_to_html, convert_figs_to_html
 from .grammar import lower_first
 
 
@@ -49,8 +51,241 @@ def create_group_list(drop, page='explore'):
     return string
 
 
+@lru_cache
+def base_layout(font_size):
+    '''
+    Create the layout shared by all of the bar charts, including the plotly
+    template. This is cached, so the template is only resolved once for each
+    font size. The returned dictionary is shared, so should be copied before
+    it is changed.
+
+    Parameters
+    ----------
+    font_size : integer
+        Font size of the bar labels
+
+    Returns
+    -------
+    layout : dictionary
+        Layout for the plotly figure
+    '''
+    return {'template': pio.templates[pio.templates.default].to_plotly_json(),
+            'margin': {'t': 60},
+            'font': {'size': font_size}}
+
+
+def bar_trace(name, colour, x, y, customdata, hovertemplate):
+    '''
+    Create a bar trace, matching those created by plotly express
+
+    Parameters
+    ----------
+    name : string
+        Name of the trace (shown in legend)
+    colour : string
+        Colour of the bars
+    x : array
+        Values for the x axis
+    y : array
+        Values for the y axis
+    customdata : array
+        Data used in the hover template
+    hovertemplate : string
+        Template for text shown when hover over the bars
+
+    Returns
+    -------
+    trace : dictionary
+        Bar trace for the plotly figure
+    '''
+    return {'type': 'bar', 'name': name, 'x': x, 'y': y,
+            'customdata': customdata, 'hovertemplate': hovertemplate,
+            'marker': {'color': colour, 'pattern': {'shape': ''}},
+            'legendgroup': name, 'offsetgroup': name,
+            'alignmentgroup': 'True', 'orientation': 'v',
+            'showlegend': True, 'textposition': 'auto',
+            'xaxis': 'x', 'yaxis': 'y'}
+
+
+def axis_layout(title, font_size, **kwargs):
+    '''
+    Create the layout for an axis of the bar charts
+
+    Parameters
+    ----------
+    title : string
+        Axis title
+    font_size : integer
+        Font size of the axis title and labels
+    **kwargs
+        Any other properties for the axis
+
+    Returns
+    -------
+    axis : dictionary
+        Layout for the axis
+    '''
+    font = {'color': '#05291F', 'size': font_size}
+    return {'title': {'text': title, 'font': font}, 'tickfont': font,
+            'domain': [0.0, 1.0], 'fixedrange': True, **kwargs}
+
+
+def legend_layout(title, font_size):
+    '''
+    Create the layout for the legend of the bar charts, with interactivity
+    removed
+
+    Parameters
+    ----------
+    title : string
+        Legend title
+    font_size : integer
+        Font size of the legend title and labels
+
+    Returns
+    -------
+    legend : dictionary
+        Layout for the legend
+    '''
+    font = {'color': '#05291F', 'size': font_size}
+    return {'title': {'text': title, 'font': font}, 'font': font,
+            'tracegroupgap': 0, 'itemclick': False, 'itemdoubleclick': False}
+
+
+def responses_figure(df, colour_map, yaxis_title, font_size=16):
+    '''
+    Create figure with grouped bar chart of the responses to a question,
+    built directly as a dictionary (matching the figure previously created
+    using plotly express)
+
+    Parameters
+    ----------
+    df : dataframe
+        Dataframe with the responses to a question for each group
+    colour_map : dictionary
+        Colour of the bars for each group
+    yaxis_title : string
+        Title for the y axis
+    font_size : integer
+        Font size of x axis labels, y axis labels and legend text, default=16
+
+    Returns
+    -------
+    fig : dictionary
+        Plotly figure
+    '''
+    # Groups without a colour take the next colour from the template (as in
+    # plotly express)
+    layout = dict(base_layout(font_size))
+    colourway = (layout['template'].get('layout', {}).get('colorway') or
+                 qualitative.D3)
+    groups = df['group'].drop_duplicates()
+    colour_map = dict(colour_map)
+    for group in groups:
+        if group not in colour_map:
+            colour_map[group] = colourway[len(colour_map) % len(colourway)]
+
+    # Create a trace for each group (in the order they appear), labelling the
+    # bars with the percentage to 1 decimal place
+    data = []
+    for group in groups:
+        group_df = df[df['group'] == group]
+        trace = bar_trace(
+            name=group, colour=colour_map[group],
+            x=group_df['cat_lab'].to_numpy(),
+            y=group_df['percentage'].to_numpy(),
+            customdata=group_df[['count', 'measure_lab', 'group']].to_numpy(),
+            hovertemplate=('cat_lab=%{x}<br>percentage=%{y:.1f}<br>' +
+                           'count=%{customdata[0]}<extra></extra>'))
+        trace['texttemplate'] = '%{y:.1f} %'
+        data.append(trace)
+
+    # Set axis to type category, else only shows integer categories if you
+    # have a mix of numbers and strings
+    layout['barmode'] = 'group'
+    layout['xaxis'] = axis_layout('Response', font_size, anchor='y',
+                                  type='category')
+    layout['yaxis'] = axis_layout(yaxis_title, font_size, anchor='x',
+                                  ticksuffix='%')
+    layout['legend'] = legend_layout('Pupils', font_size)
+
+    return {'data': data, 'layout': layout}
+
+
+def ordered_bar_figure(df, boundaries, font_size=16):
+    '''
+    Create figure with ordered bar chart of the mean score at each school,
+    with the RAG areas shaded, built directly as a dictionary (matching the
+    figure previously created using plotly express)
+
+    Parameters
+    ----------
+    df : dataframe
+        Dataframe with the mean score at each school, and columns with the
+        'colour' and 'Mean score' (rounded) for each school
+    boundaries : list
+        Minimum of y axis, lower and upper RAG boundaries, and maximum of y
+        axis
+    font_size : integer
+        Font size of x axis labels, y axis labels and legend text, default=16
+
+    Returns
+    -------
+    fig : dictionary
+        Plotly figure
+    '''
+    # Create a trace for the chosen school and for other schools
+    colours = {'Your school': '#5D98AB', 'Other schools': '#BFD8E0'}
+    data = []
+    for name, colour in colours.items():
+        group_df = df[df['colour'] == name]
+        if len(group_df.index) > 0:
+            data.append(bar_trace(
+                name=name, colour=colour,
+                x=group_df['school_lab'].to_numpy(),
+                y=group_df['mean'].to_numpy(),
+                customdata=group_df[['colour', 'Mean score']].to_numpy(),
+                hovertemplate='Mean score=%{customdata[1]}<extra></extra>'))
+
+    # Order x axis so in ascending order, and hide x axis tick labels (but
+    # seems to be a bug that means the axis label is then above the plot, so
+    # had to use a work around of replacing the axis labels with spaces)
+    layout = dict(base_layout(font_size))
+    layout['barmode'] = 'relative'
+    layout['xaxis'] = axis_layout(
+        'Northern Devon schools<br>(ordered by mean score)', font_size,
+        anchor='y', categoryorder='total ascending',
+        tickvals=df['school_lab'].to_numpy(),
+        ticktext=[' ']*len(df['school_lab']))
+    layout['yaxis'] = axis_layout(
+        'Mean score', font_size, anchor='x',
+        range=[boundaries[0], boundaries[-1]], showgrid=False)
+    layout['legend'] = legend_layout('School', font_size)
+
+    # Shade the RAG areas (colours used were matched to those from the
+    # summary page), with the label in the top left of each
+    areas = [('Below average', '#FFCCCC', '#9A505B'),
+             ('Average', '#FFE8BF', '#B3852A'),
+             ('Above average', '#B6E6B6', '#3A8461')]
+    layout['shapes'] = []
+    layout['annotations'] = []
+    for i, (label, fill, line) in enumerate(areas):
+        y0, y1 = boundaries[i], boundaries[i+1]
+        layout['shapes'].append({
+            'type': 'rect', 'layer': 'below', 'fillcolor': fill,
+            'line': {'color': line, 'width': 0.5},
+            'x0': 0, 'x1': 1, 'xref': 'x domain',
+            'y0': y0, 'y1': y1, 'yref': 'y'})
+        layout['annotations'].append({
+            'text': label, 'showarrow': False,
+            'x': 0, 'xanchor': 'left', 'xref': 'x domain',
+            'y': y1, 'yanchor': 'top', 'yref': 'y'})
+
+    return {'data': data, 'layout': layout}
+
+
 def survey_responses(dataset, font_size=16, output='streamlit', content=None,
-                     page='explore'):
+                     page='explore', chart_format='png'):
     '''
     Create bar charts for each of the questions in the provided dataframe.
     The dataframe should contain questions which all have the same set
@@ -70,12 +305,21 @@ def survey_responses(dataset, font_size=16, output='streamlit', content=None,
     page : string
         Specifies whether this is for the 'explore' page or 'demographic' page.
         Default is the 'explore' page.
+    chart_format : string
+        Format of the charts when output=='pdf' - either 'png' (default),
+        'svg' (which are drawn without kaleido) or 'plotly' (which are drawn
+        by plotly.js when the HTML is opened)
 
     Returns
     -------
     content : list
         Optional return, used when output=='pdf', contains HTML for report.
     '''
+    # PDF: Create empty list to store content and figure for each measure, so
+    # the figures can be exported together at the end
+    if output == 'pdf':
+        measure_content = []
+
     # Create seperate figures for each of the measures
     for measure in dataset['measure_lab'].drop_duplicates():
 
@@ -86,6 +330,7 @@ def survey_responses(dataset, font_size=16, output='streamlit', content=None,
             # PDF: Create empty list to store content for PDF
             if output == 'pdf':
                 temp_content = []
+                measure_fig = None
 
             # Streamlit and PDF: Create header for plot
             # Don't use in-built plotly title as that overlaps the legend if it
@@ -160,30 +405,6 @@ Due to small sample sizes, response rates are hidden for:
                     colour_map = {unique_groups[0]: '#ffb49a',
                                   unique_groups[1]: '#e05a38'}
 
-                # Create figure
-                fig = px.bar(
-                    df, x='cat_lab', y='percentage',
-                    # Set colours and grouping
-                    color='group', barmode='group',
-                    color_discrete_map=colour_map,
-                    # Label bars with the percentage to 1 decimal place
-                    text_auto='.1f',
-                    # Specify what to show when hover over the bars
-                    hover_data={
-                        'cat_lab': True,
-                        'percentage': ':.1f',
-                        'count': True,
-                        'measure_lab': False,
-                        'group': False})
-
-                # Set x axis to type category, else only shows integer
-                # categories if you have a mix of numbers and strings
-                fig.update_layout(xaxis_type='category')
-
-                # Add percent sign to the numbers labelling the bars
-                fig.for_each_trace(lambda t: t.update(
-                    texttemplate=t.texttemplate + ' %'))
-
                 # Choose survey or council label for y axis, based on tick for
                 # x axis ('no response' is survey, 'no data' is council)
                 if 'No response' in df['cat_lab'].values:
@@ -191,34 +412,8 @@ Due to small sample sizes, response rates are hidden for:
                 else:
                     yaxis_title = 'Percentage of pupils'
 
-                # Make changes to figure design...
-                fig.update_layout(
-                    # Set font size of bar labels
-                    font=dict(size=font_size),
-                    # Set x axis title, labels, colour and size
-                    xaxis=dict(
-                        title='Response',
-                        tickfont=dict(color='#05291F', size=font_size),
-                        titlefont=dict(color='#05291F', size=font_size)),
-                    # Set y axis title, labels, colour and size
-                    yaxis=dict(
-                        title=yaxis_title,
-                        titlefont=dict(color='#05291F', size=font_size),
-                        tickfont=dict(color='#05291F', size=font_size),
-                        ticksuffix='%'
-                    ),
-                    # Legend title and labels and remove interactivity
-                    legend=dict(
-                        title='Pupils',
-                        font=dict(color='#05291F', size=font_size),
-                        itemclick=False, itemdoubleclick=False),
-                    # Legend title font
-                    legend_title=dict(
-                        font=dict(color='#05291F', size=font_size)))
-
-                # Disable zooming and panning
-                fig.layout.xaxis.fixedrange = True
-                fig.layout.yaxis.fixedrange = True
+                # Create figure
+                fig = responses_figure(df, colour_map, yaxis_title, font_size)
 
                 # Streamlit: Create plot on streamlit app, hiding the plotly
                 # settings bar
@@ -226,27 +421,34 @@ Due to small sample sizes, response rates are hidden for:
                     st.plotly_chart(fig, use_container_width=True,
                                     config={'displayModeBar': False})
 
-                # PDF: Write image to a temporary PNG file, convert that
-                # to HTML, and add the image HTML to temp_content
+                # PDF: Keep figure to export with the others
                 elif output == 'pdf':
-                    # Make and add HTML image tag to temp_content
-                    temp_content.append(convert_fig_to_html(
-                        fig=fig, alt_text=measure))
+                    measure_fig = fig
 
-            # Insert temp_content into a div class and add to content
+            # PDF: Store temp_content and figure for the measure
             if output == 'pdf':
-                content.append(f'''
+                measure_content.append((temp_content, measure_fig, measure))
+
+    # At the end of the loop, if PDF report, export the figures together and
+    # convert to HTML image tags, then add each to the end of temp_content for
+    # its measure, insert temp_content into a div class and add to content
+    if output == 'pdf':
+        figs = [fig for _, fig, _ in measure_content if fig is not None]
+        alt_texts = [measure for _, fig, measure in measure_content
+                     if fig is not None]
+        img_tags = iter(convert_figs_to_html(figs, alt_texts, chart_format))
+        for temp_content, fig, _ in measure_content:
+            if fig is not None:
+                temp_content.append(next(img_tags))
+            content.append(f'''
 <div class='responses_container'>
 {''.join(temp_content)}
 </div>''')
-
-    # At the end of the loop, if PDF report, return content
-    if output == 'pdf':
         return content
 
 
 def details_ordered_bar(school_scores, school_name, font_size=16,
-                        output='streamlit', content=None):
+                        output='streamlit', content=None, chart_format='png'):
     '''
     Created ordered bar chart with the results from each school, with the
     chosen school highlighted
@@ -264,6 +466,10 @@ def details_ordered_bar(school_scores, school_name, font_size=16,
         Must be either 'streamlit' or 'pdf, default is 'streamlit.
     content : list
         Optional input used when output=='pdf', contains HTML for report.
+    chart_format : string
+        Format of the charts when output=='pdf' - either 'png' (default),
+        'svg' (which are drawn without kaleido) or 'plotly' (which are drawn
+        by plotly.js when the HTML is opened)
 
     Returns
     -------
@@ -280,18 +486,6 @@ def details_ordered_bar(school_scores, school_name, font_size=16,
     # Create column with mean rounded to 2 d.p.
     df['Mean score'] = round(df['mean'], 2)
 
-    # Plot the results, specifying colours and hover data
-    fig = px.bar(
-        df, x='school_lab', y='mean', color='colour',
-        color_discrete_map={'Your school': '#5D98AB',
-                            'Other schools': '#BFD8E0'},
-        category_orders={'colour': ['Your school', 'Other schools']},
-        hover_data={'school_lab': False, 'colour': False,
-                    'mean': False, 'Mean score': True})
-
-    # Reorder x axis so in ascending order
-    fig.update_layout(xaxis={'categoryorder': 'total ascending'})
-
     # Set y axis limits so the first and last bars of the chart a consistent
     # height between different plots - find 15% of range and adjust the min
     # and max by that
@@ -300,48 +494,13 @@ def details_ordered_bar(school_scores, school_name, font_size=16,
     adj_axis = (max - min)*0.15
     ymin = np.max([0, (min - adj_axis)])
     ymax = max + adj_axis
-    fig.update_layout(yaxis_range=[ymin, ymax])
 
-    # Extract lower and upper rag boundaries amd shade the RAG areas
-    # (Colours used were matched to those from the summary page)
+    # Extract lower and upper rag boundaries
     lower = df['lower'].to_list()[0]
     upper = df['upper'].to_list()[0]
-    fig.add_hrect(
-        y0=ymin, y1=lower, fillcolor='#FFCCCC', layer='below',
-        line={'color': '#9A505B'}, line_width=0.5,
-        annotation_text='Below average', annotation_position='top left')
-    fig.add_hrect(
-        y0=lower, y1=upper, fillcolor='#FFE8BF', layer='below',
-        line={'color': '#B3852A'}, line_width=0.5,
-        annotation_text='Average', annotation_position='top left')
-    fig.add_hrect(
-        y0=upper, y1=ymax, fillcolor='#B6E6B6', layer='below',
-        line={'color': '#3A8461'}, line_width=0.5,
-        annotation_text='Above average', annotation_position='top left')
-
-    # Set font size and hide x axis tick labels (but seems to be a bug that
-    # means the axis label is then above the plot, so had to use a work around
-    # of replacing the axis labels with spaces
-    fig.update_layout(
-        font=dict(size=font_size),
-        xaxis=dict(title='Northern Devon schools<br>(ordered by mean score)',
-                   tickfont=dict(color='#05291F', size=font_size),
-                   titlefont=dict(color='#05291F', size=font_size),
-                   tickvals=df['school_lab'],
-                   ticktext=[' ']*len(df['school_lab'])),
-        yaxis=dict(title='Mean score',
-                   tickfont=dict(color='#05291F', size=font_size),
-                   titlefont=dict(color='#05291F', size=font_size)),
-        legend=dict(title='School',
-                    font=dict(color='#05291F', size=font_size),
-                    itemclick=False, itemdoubleclick=False),
-        legend_title=dict(font=dict(color='#05291F', size=font_size))
-    )
-
-    # Prevent zooming and panning, remove grid, and hide plotly toolbar
-    fig.layout.xaxis.fixedrange = True
-    fig.layout.yaxis.fixedrange = True
-    fig.update_yaxes(showgrid=False)
+
+    # Create figure
+    fig = ordered_bar_figure(df, [ymin, lower, upper, ymax], font_size)
 
     if output == 'streamlit':
         st.plotly_chart(fig, use_container_width=True,
@@ -352,7 +511,8 @@ def details_ordered_bar(school_scores, school_name, font_size=16,
 
         # Get the HTML image tag for the figure and add to temp_content
         temp_content.append(convert_fig_to_html(
-            fig=fig, alt_text='Comparison with other schools'))
+            fig=fig, alt_text='Comparison with other schools',
+            chart_format=chart_format))
 
         # Insert temp_content into a div class and add to content
         content.append(f'''
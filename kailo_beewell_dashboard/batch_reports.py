@@ -0,0 +1,397 @@
+'''
+Build the PDF reports for every school (and, for the standard survey, every
+group) at once, by splitting the reports between a pool of processes. Figures
+are shared between reports (and processes) using the figure cache on disk,
+and finished reports are added to the report cache, so the dashboard can serve
+them without building them again.
+'''
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import json
+import multiprocessing
+import os
+import time
+from .grammar import slugify
+from .pdf_report import get_report_pdf
+from .report_cache import report_cache_key, report_disk_cache
+from .renderer_pool import start_renderer_pool
+from .reshape_data import prepare_table
+from .static_report import REPORT_GROUPS
+
+# Datasets and settings used by the reports in a worker process, set by
+# init_report_worker()
+_worker = dict()
+
+
+def report_filename(chosen_school, chosen_group=None):
+    '''
+    Create the file name for a school's report, from the school and group
+
+    Parameters
+    ----------
+    chosen_school : string
+        Name of the school
+    chosen_group : string
+        Name of the group the results are shown by (None for symbol reports)
+
+    Returns
+    -------
+    filename : string
+        Name of the PDF file (e.g. 'school_a_by_year_group.pdf')
+    '''
+    name = chosen_school if chosen_group is None else (
+        f'{chosen_school} {chosen_group}')
+    return f'{slugify(name)}.pdf'
+
+
+def init_report_worker(tables, survey_type, chart_format):
+    '''
+    Set up a worker process. The datasets are partitioned and indexed again
+    (as that information is not copied to the process with them), and, if the
+    charts are PNG, a renderer pool with one renderer is started (as each
+    process only builds one report at a time).
+
+    Parameters
+    ----------
+    tables : dictionary
+        Datasets used in the reports - 'responses', 'counts' and 'demographic'
+        (and 'scores_rag' for the standard survey)
+    survey_type : string
+        Designates whether this is for 'standard' or 'symbol' survey
+    chart_format : string
+        Format of the charts - either 'png' or 'svg'
+    '''
+    _worker['tables'] = {key: prepare_table(key, df, survey_type)
+                         for key, df in tables.items()}
+    _worker['survey_type'] = survey_type
+    _worker['chart_format'] = chart_format
+    if chart_format == 'png':
+        start_renderer_pool(size=1)
+
+
+def get_report_args(tables, survey_type, chosen_school, chosen_group,
+                    chart_format, pdf_title):
+    '''
+    Get the inputs to the report for a school and group
+
+    Parameters
+    ----------
+    tables : dictionary
+        Datasets used in the reports - see init_report_worker()
+    survey_type : string
+        Designates whether this is for 'standard' or 'symbol' survey
+    chosen_school : string
+        Name of the school
+    chosen_group : string
+        Name of the group to view results by (None for symbol reports)
+    chart_format : string
+        Format of the charts - either 'png' or 'svg'
+    pdf_title : string
+        Title for the PDF file
+
+    Returns
+    -------
+    report_args : dictionary
+        Inputs to get_report_pdf()
+    '''
+    report_args = dict(
+        chosen_school=chosen_school,
+        df_prop=tables['responses'],
+        counts=tables['counts'],
+        dem_prop=tables['demographic'],
+        pdf_title=pdf_title,
+        chart_format=chart_format)
+    if survey_type == 'standard':
+        report_args.update(chosen_group=chosen_group,
+                           df_scores=tables['scores_rag'])
+    return report_args
+
+
+def build_report(chosen_school, chosen_group, output_dir, pdf_title):
+    '''
+    Build the report for a school and group (or get it from the report
+    cache), and write it as a PDF. Run within a worker process set up by
+    init_report_worker().
+
+    Parameters
+    ----------
+    chosen_school : string
+        Name of the school
+    chosen_group : string
+        Name of the group to view results by (None for symbol reports)
+    output_dir : string
+        Directory to save the PDF to (or None to only add it to the report
+        cache)
+    pdf_title : string
+        Title for the PDF file
+
+    Returns
+    -------
+    entry : dictionary
+        Manifest entry for the report, with its path, size, whether it was
+        from the report cache, and the time taken to build the HTML, lay out
+        the pages, write the PDF, and in total (in seconds)
+    '''
+    start = time.perf_counter()
+    report_args = get_report_args(
+        _worker['tables'], _worker['survey_type'], chosen_school,
+        chosen_group, _worker['chart_format'], pdf_title)
+
+    # Build report as PDF (referring to the logo and illustration files, as
+    # the reports are converted on this machine)
+    pdf, timings = get_report_pdf(
+        survey_type=_worker['survey_type'], image_urls='file', **report_args)
+    cached = timings is None
+    if cached:
+        timings = {'html': 0, 'layout': 0, 'write': 0,
+                   'total': time.perf_counter() - start}
+
+    path = None
+    if output_dir is not None:
+        path = os.path.join(output_dir,
+                            report_filename(chosen_school, chosen_group))
+        with open(path, 'wb') as f:
+            f.write(pdf)
+
+    return manifest_entry(chosen_school, chosen_group, path=path,
+                          size=len(pdf), cached=cached, timings=timings)
+
+
+def manifest_entry(chosen_school, chosen_group, path=None, size=None,
+                   cached=None, timings=None, error=None):
+    '''
+    Create the manifest entry for a report. Failed reports have the same keys
+    as the others, with None for the values they don't have.
+
+    Parameters
+    ----------
+    chosen_school : string
+        Name of the school
+    chosen_group : string
+        Name of the group (None for symbol reports)
+    path : string
+        Path to the PDF (None if it wasn't written)
+    size : integer
+        Size of the PDF in bytes
+    cached : boolean
+        Whether the report was from the report cache
+    timings : dictionary
+        Time taken for each stage - 'html', 'layout', 'write' and 'total' (in
+        seconds)
+    error : string
+        Error raised when building the report (None if it succeeded)
+
+    Returns
+    -------
+    entry : dictionary
+        Manifest entry for the report
+    '''
+    return {
+        'school': chosen_school,
+        'group': chosen_group,
+        'path': path,
+        'size': size,
+        'cached': cached,
+        **{f'{stage}_time': (round(timings[stage], 3)
+                             if timings is not None else None)
+           for stage in ['html', 'layout', 'write', 'total']},
+        'error': error}
+
+
+def list_report_jobs(tables, survey_type, schools=None, groups=None):
+    '''
+    List the reports to build, as (school, group) pairs
+
+    Parameters
+    ----------
+    tables : dictionary
+        Datasets used in the reports - see build_all_reports()
+    survey_type : string
+        Designates whether this is for 'standard' or 'symbol' survey
+    schools : list
+        Names of the schools - default None, which uses every school in the
+        counts
+    groups : list
+        Groups for the standard survey - default None, which uses
+        REPORT_GROUPS. Not used for the symbol survey.
+
+    Returns
+    -------
+    jobs : list
+        List of (school, group) tuples, with group None for the symbol survey
+    '''
+    if schools is None:
+        schools = sorted(tables['counts']['school_lab'].unique())
+    if survey_type == 'standard':
+        if groups is None:
+            groups = REPORT_GROUPS
+        return [(school, group) for school in schools for group in groups]
+    return [(school, None) for school in schools]
+
+
+def run_report_jobs(jobs, tables, output_dir, survey_type, max_workers,
+                    chart_format, pdf_title):
+    '''
+    Build reports using a pool of processes
+
+    Parameters
+    ----------
+    jobs : list
+        List of (school, group) tuples - see list_report_jobs()
+    tables : dictionary
+        Datasets used in the reports - see build_all_reports()
+    output_dir : string
+        Directory to save the PDFs to (or None to only add them to the report
+        cache)
+    survey_type : string
+        Designates whether this is for 'standard' or 'symbol' survey
+    max_workers : integer
+        Number of processes (None uses the number of CPUs)
+    chart_format : string
+        Format of the charts - either 'png' or 'svg'
+    pdf_title : string
+        Title for the PDF files
+
+    Returns
+    -------
+    reports : list
+        Manifest entry for each job, in the same order as jobs
+    '''
+    # Build reports, using spawn so that processes don't inherit running
+    # renderers or threads from this process
+    reports = [None] * len(jobs)
+    with ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=init_report_worker,
+            initargs=(tables, survey_type, chart_format)) as executor:
+        futures = {
+            executor.submit(build_report, school, group, output_dir,
+                            pdf_title): i
+            for i, (school, group) in enumerate(jobs)}
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                reports[i] = future.result()
+            except Exception as err:
+                school, group = jobs[i]
+                reports[i] = manifest_entry(school, group, error=repr(err))
+    return reports
+
+
+def build_all_reports(
+        tables, output_dir, survey_type='standard', schools=None,
+        groups=None, max_workers=None, chart_format='png',
+        pdf_title='#BeeWell survey report'):
+    '''
+    Build the PDF reports for every school (and group, for the standard
+    survey) using a pool of processes, and write a manifest (manifest.json)
+    listing each report with its timings, or the error if it failed.
+
+    Parameters
+    ----------
+    tables : dictionary
+        Datasets used in the reports, as from load_tidb_tables() - 'responses',
+        'counts' and 'demographic' (and 'scores_rag' for the standard survey)
+    output_dir : string
+        Directory to save the PDFs and the manifest to
+    survey_type : string
+        Designates whether this is for 'standard' or 'symbol' survey
+    schools : list
+        Names of the schools to build reports for - default None, which
+        builds them for every school in the counts
+    groups : list
+        Groups to build the standard survey reports for - default None, which
+        uses REPORT_GROUPS. Not used for the symbol survey.
+    max_workers : integer
+        Number of processes - default None, which uses the number of CPUs
+    chart_format : string
+        Format of the charts - either 'png' (default) or 'svg'
+    pdf_title : string
+        Title for the PDF files
+
+    Returns
+    -------
+    manifest : dictionary
+        The manifest, with the settings, total time and an entry per report
+    '''
+    start = time.perf_counter()
+    os.makedirs(output_dir, exist_ok=True)
+
+    jobs = list_report_jobs(tables, survey_type, schools, groups)
+    reports = run_report_jobs(jobs, tables, output_dir, survey_type,
+                              max_workers, chart_format, pdf_title)
+
+    # Write manifest
+    manifest = {
+        'survey_type': survey_type,
+        'chart_format': chart_format,
+        'total_time': round(time.perf_counter() - start, 3),
+        'failed': sum(report['error'] is not None for report in reports),
+        'reports': reports}
+    with open(os.path.join(output_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    return manifest
+
+
+def prewarm_report_cache(
+        tables, survey_type='standard', schools=None, groups=None,
+        max_workers=None, chart_format='png',
+        pdf_title='#BeeWell survey report'):
+    '''
+    Build any reports that are not already in the report cache, so that they
+    can be downloaded from the dashboard straight away. This should be run
+    after each data refresh, as the reports are keyed on the data version.
+
+    Parameters
+    ----------
+    tables : dictionary
+        Datasets used in the reports, as from load_tidb_tables() - see
+        build_all_reports()
+    survey_type : string
+        Designates whether this is for 'standard' or 'symbol' survey
+    schools : list
+        Names of the schools - default None, which uses every school in the
+        counts
+    groups : list
+        Groups for the standard survey - default None, which uses
+        REPORT_GROUPS. Not used for the symbol survey.
+    max_workers : integer
+        Number of processes - default None, which uses the number of CPUs
+    chart_format : string
+        Format of the charts - either 'png' (default) or 'svg'. This should
+        match the format used by the dashboard.
+    pdf_title : string
+        Title for the PDF files. This should match the title used by the
+        dashboard.
+
+    Returns
+    -------
+    summary : dictionary
+        Number of reports already cached ('cached'), the manifest entry for
+        each report built ('reports'), number that failed ('failed') and the
+        total time (in seconds)
+    '''
+    start = time.perf_counter()
+
+    # Find the reports missing from the cache (preparing the tables as in
+    # the worker processes, so that the data versions match)
+    prepared = {key: prepare_table(key, df, survey_type)
+                for key, df in tables.items()}
+    all_jobs = list_report_jobs(prepared, survey_type, schools, groups)
+    jobs = [
+        (school, group) for school, group in all_jobs
+        if report_cache_key(survey_type, get_report_args(
+            prepared, survey_type, school, group, chart_format,
+            pdf_title)) not in report_disk_cache]
+
+    reports = []
+    if jobs:
+        reports = run_report_jobs(jobs, tables, None, survey_type,
+                                  max_workers, chart_format, pdf_title)
+
+    return {
+        'cached': len(all_jobs) - len(jobs),
+        'reports': reports,
+        'failed': sum(report['error'] is not None for report in reports),
+        'total_time': round(time.perf_counter() - start, 3)}
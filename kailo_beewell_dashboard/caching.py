@@ -0,0 +1,341 @@
+'''
+Helper classes for caching results in memory or on disk, shared between all
+sessions of the dashboard
+'''
+from collections import OrderedDict
+import os
+import sys
+import tempfile
+import threading
+
+
+class SizedLRUCache:
+    '''
+    Least recently used (LRU) cache, bounded by the total size of the items
+    stored. When adding an item would take the cache over the maximum size,
+    the least recently used items are removed. As the dashboard runs each
+    session in a separate thread, access to the cache is protected by a lock.
+
+    Items returned from the cache are shared, so should not be modified.
+
+    Parameters
+    ----------
+    max_size : integer
+        Maximum total size of the items in the cache (in bytes)
+    size_func : function
+        Function which returns the size of an item (in bytes) - default is
+        sys.getsizeof()
+
+    Attributes
+    ----------
+    hits : integer
+        Number of times an item was found in the cache
+    misses : integer
+        Number of times an item was not found in the cache
+    '''
+    def __init__(self, max_size, size_func=sys.getsizeof):
+        self.max_size = max_size
+        self.size_func = size_func
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        '''
+        Get an item from the cache, marking it as most recently used
+
+        Parameters
+        ----------
+        key : hashable
+            Key for the item
+        default : any
+            Value to return if the item is not in the cache - default None
+
+        Returns
+        -------
+        value : any
+            The cached item, or default if not in the cache
+        '''
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return self._items[key][0]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        '''
+        Add an item to the cache, removing least recently used items if needed
+        to stay within the maximum size. Items larger than the maximum size are
+        not stored.
+
+        Parameters
+        ----------
+        key : hashable
+            Key for the item
+        value : any
+            Item to store
+        '''
+        size = self.size_func(value)
+        with self._lock:
+            if key in self._items:
+                self._size -= self._items.pop(key)[1]
+            if size > self.max_size:
+                return
+            self._items[key] = (value, size)
+            self._size += size
+            while self._size > self.max_size:
+                self._size -= self._items.popitem(last=False)[1][1]
+
+    def get_or_create(self, key, create):
+        '''
+        Get an item from the cache, or create it and add it to the cache if
+        not present
+
+        Parameters
+        ----------
+        key : hashable
+            Key for the item
+        create : function
+            Function with no inputs which returns the item
+
+        Returns
+        -------
+        value : any
+            The cached or newly created item
+        '''
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = create()
+            self.set(key, value)
+        return value
+
+    def clear(self):
+        '''
+        Remove all items from the cache and reset the counters
+        '''
+        with self._lock:
+            self._items.clear()
+            self._size = 0
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        '''
+        Get the number of hits and misses, and the number and size of items
+
+        Returns
+        -------
+        stats : dictionary
+            Dictionary with 'hits', 'misses', 'items', 'size' and 'max_size'
+        '''
+        with self._lock:
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'items': len(self._items),
+                    'size': self._size,
+                    'max_size': self.max_size}
+
+
+class DiskCache:
+    '''
+    Cache of bytes stored as files in a directory, bounded by the total size
+    of the files. When adding a file takes the cache over the maximum size,
+    the least recently used files (those with the oldest modification time,
+    which is updated when read) are removed. Files are written to a temporary
+    file and then renamed, so other threads and processes never read a
+    partially written file.
+
+    Parameters
+    ----------
+    directory : string
+        Path to directory to store the files in (created if needed)
+    max_size : integer
+        Maximum total size of the files (in bytes)
+
+    Attributes
+    ----------
+    hits : integer
+        Number of times a file was found in the cache
+    misses : integer
+        Number of times a file was not found in the cache
+    '''
+    def __init__(self, directory, max_size):
+        self.directory = directory
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._size = None
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        '''
+        Get path to the file for a key (which should be a valid file name,
+        such as a hash)
+        '''
+        return os.path.join(self.directory, key)
+
+    def _files(self):
+        '''
+        Get the path, size and modification time of each file in the cache
+        (excluding temporary files being written)
+        '''
+        try:
+            entries = list(os.scandir(self.directory))
+        except FileNotFoundError:
+            return []
+        files = []
+        for entry in entries:
+            if entry.name.startswith('.tmp'):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            files.append((entry.path, stat.st_size, stat.st_mtime))
+        return files
+
+    def get(self, key):
+        '''
+        Get file contents from the cache, marking it as most recently used
+
+        Parameters
+        ----------
+        key : string
+            Key for the file
+
+        Returns
+        -------
+        value : bytes
+            Contents of the file, or None if not in the cache
+        '''
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as file:
+                value = file.read()
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return value
+
+    def __contains__(self, key):
+        '''
+        Check whether a file is in the cache, without reading it or marking it
+        as used
+        '''
+        return os.path.exists(self._path(key))
+
+    def set(self, key, value):
+        '''
+        Add file to the cache, removing least recently used files if needed to
+        stay within the maximum size
+
+        Parameters
+        ----------
+        key : string
+            Key for the file
+        value : bytes
+            Contents of the file
+        '''
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        handle, temp_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp')
+        try:
+            with os.fdopen(handle, 'wb') as file:
+                file.write(value)
+            # Replace under the lock so the size of any file being replaced is
+            # the one that gets subtracted
+            with self._lock:
+                try:
+                    replaced_size = os.path.getsize(path)
+                except FileNotFoundError:
+                    replaced_size = 0
+                os.replace(temp_path, path)
+        except BaseException:
+            # Don't leave the temporary file behind if the write failed
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+            raise
+
+        # Find size of the files the first time, and then keep track of it,
+        # only checking the files again when they might be over the limit
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self._files())
+            else:
+                self._size += len(value) - replaced_size
+            if self._size > self.max_size:
+                self._evict()
+
+    def _evict(self):
+        '''
+        Remove the least recently used files until within the maximum size
+        '''
+        files = sorted(self._files(), key=lambda file: file[2])
+        self._size = sum(size for _, size, _ in files)
+        for path, size, _ in files:
+            if self._size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self._size -= size
+
+    def clear(self):
+        '''
+        Remove all files from the cache and reset the counters
+        '''
+        with self._lock:
+            for path, _, _ in self._files():
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            self._size = 0
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        '''
+        Get the number of hits and misses, and the number and size of files
+
+        Returns
+        -------
+        stats : dictionary
+            Dictionary with 'hits', 'misses', 'items', 'size' and 'max_size'
+        '''
+        files = self._files()
+        with self._lock:
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'items': len(files),
+                    'size': sum(size for _, size, _ in files),
+                    'max_size': self.max_size}
+
+
+def frame_size(df):
+    '''
+    Get the memory used by a dataframe, for use as size_func in SizedLRUCache
+
+    Parameters
+    ----------
+    df : dataframe
+        Dataframe to find the size of
+
+    Returns
+    -------
+    size : integer
+        Memory used by the dataframe (in bytes), including string contents
+    '''
+    return int(df.memory_usage(deep=True).sum())
@@ -7,10 +7,16 @@ import streamlit as st
 from markdown import markdown
 from .bar_charts_text import create_response_description
 from .bar_charts import survey_responses, details_ordered_bar
+from .caching import SizedLRUCache, frame_size
 from .summary_rag import result_box
-from .reshape_data import filter_by_group, extract_nested_results
+from .reshape_data import (
+    filter_by_group, extract_nested_results, get_data_version)
 from .score_descriptions import score_descriptions
 
+# Cache of results from get_chosen_result(), shared between all sessions
+chosen_result_cache = SizedLRUCache(max_size=64*1024*1024,
+                                    size_func=frame_size)
+
 
 def write_page_title(output='streamlit', survey_type='standard'):
     '''
@@ -267,6 +273,11 @@ def get_chosen_result(chosen_variable, chosen_group, df, school,
     Filters the dataframe with responses to each question, to just responses
     for the chosen topic, school and group.
 
+    Results are stored in chosen_result_cache (keyed by the version of the
+    data, and the chosen topic, group, school and survey type) so that they
+    can be reused by any session without extracting them again. The returned
+    dataframe is therefore shared, and should not be modified.
+
     Parameters
     ----------
     chosen_variable : string
@@ -289,16 +300,23 @@ def get_chosen_result(chosen_variable, chosen_group, df, school,
         than original format where they are nested in lists)
 
     '''
-    # Filter by the specified school and grouping
-    chosen, group_lab = filter_by_group(
-        df=df, chosen_group=chosen_group, output='explore',
-        chosen_school=school, survey_type=survey_type)
+    def create_chosen_result():
+        # Filter by the specified school and grouping
+        chosen, group_lab = filter_by_group(
+            df=df, chosen_group=chosen_group, output='explore',
+            chosen_school=school, survey_type=survey_type)
 
-    # Filter by the chosen variable
-    chosen = chosen[chosen['group'] == chosen_variable]
+        # Filter by the chosen variable
+        chosen = chosen[chosen['group'] == chosen_variable]
 
-    # Extract the nested lists in the dataframe
-    chosen_result = extract_nested_results(chosen, group_lab)
+        # Extract the nested lists in the dataframe
+        return extract_nested_results(chosen, group_lab)
+
+    # Get result from the cache, or create it if not there
+    key = (get_data_version(df), chosen_variable, chosen_group, school,
+           survey_type)
+    chosen_result = chosen_result_cache.get_or_create(
+        key, create_chosen_result)
 
     return chosen_result
 
@@ -388,7 +406,7 @@ def define_multiple_charts():
 
 
 def create_bar_charts(chosen_variable, chosen_result,
-                      output='streamlit', content=None):
+                      output='streamlit', content=None, chart_format='png'):
     '''
     Creates the section of bar charts and their accompanying text, for
     streamlit page or PDF report.
@@ -403,6 +421,10 @@ def create_bar_charts(chosen_variable, chosen_result,
         Specifies whether to write for 'streamlit' (default) or 'pdf'.
     content : list
         Optional input used when output=='pdf', contains HTML for report.
+    chart_format : string
+        Format of the charts when output=='pdf' - either 'png' (default),
+        'svg' (which are drawn without kaleido) or 'plotly' (which are drawn
+        by plotly.js when the HTML is opened)
 
     Returns
     -------
@@ -454,7 +476,7 @@ def create_bar_charts(chosen_variable, chosen_result,
             elif output == 'pdf':
                 content = survey_responses(
                     dataset=to_plot, font_size=14,
-                    output='pdf', content=content)
+                    output='pdf', content=content, chart_format=chart_format)
 
     # Otherwise create a single stacked bar chart
     else:
@@ -477,7 +499,7 @@ def create_bar_charts(chosen_variable, chosen_result,
         elif output == 'pdf':
             content = survey_responses(
                 dataset=chosen_result, font_size=14,
-                output='pdf', content=content)
+                output='pdf', content=content, chart_format=chart_format)
 
     if output == 'pdf':
         return content
@@ -538,7 +560,8 @@ school is average, below average or above average.'''
 
 
 def write_comparison_result(chosen_school, between_schools, group,
-                            output='streamlit', content=None):
+                            output='streamlit', content=None,
+                            chart_format='png'):
     '''
     Write the introduction to the comparison section (heading, description
     and RAG rating)
@@ -555,6 +578,10 @@ def write_comparison_result(chosen_school, between_schools, group,
         Optional input used when output=='pdf', contains HTML for report.
     group : string
         Pupil group
+    chart_format : string
+        Format of the charts when output=='pdf' - either 'png' (default),
+        'svg' (which are drawn without kaleido) or 'plotly' (which are drawn
+        by plotly.js when the HTML is opened)
 
     Returns
     -------
@@ -620,7 +647,8 @@ compared to other schools in Northern Devon, was:'''
             content.append(result_box(devon_rag, 'pdf'))
             content = details_ordered_bar(
                 school_scores=between_schools, school_name=chosen_school,
-                font_size=16, output='pdf', content=content)
+                font_size=16, output='pdf', content=content,
+                chart_format=chart_format)
 
     if output == 'pdf':
         return content
@@ -628,7 +656,7 @@ compared to other schools in Northern Devon, was:'''
 
 def create_explore_topic_page(
         chosen_variable_lab, topic_dict, df_scores, chosen_school,
-        chosen_group, df_prop, content):
+        chosen_group, df_prop, content, chart_format='png'):
     '''
     Add an explore results page with responses to a given topic to report HTML.
 
@@ -650,6 +678,10 @@ def create_explore_topic_page(
         survey question
     content : list
         Optional input used when output=='pdf', contains HTML for report.
+    chart_format : string
+        Format of the charts - either 'png' (default), 'svg' (which are
+        drawn without kaleido) or 'plotly' (which are drawn by plotly.js when
+        the HTML is opened, so can't be converted to PDF)
 
     Returns
     -------
@@ -673,7 +705,8 @@ def create_explore_topic_page(
 
     # Produce bar charts, plus their chart section descriptions and titles
     content = create_bar_charts(
-        chosen_variable, chosen_result, output='pdf', content=content)
+        chosen_variable, chosen_result, output='pdf', content=content,
+        chart_format=chart_format)
 
     # Create dataframe based on chosen variable
     between_schools, group_lab, order = filter_by_group(
@@ -693,7 +726,7 @@ def create_explore_topic_page(
         group_result = between_schools[between_schools[group_lab] == group]
         temp_content = write_comparison_result(
             chosen_school, group_result, group, output='pdf',
-            content=temp_content)
+            content=temp_content, chart_format=chart_format)
         # Insert temp_content into a div class and add to content
         content.append(f'''
     <div class='responses_container'>
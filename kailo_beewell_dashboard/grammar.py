@@ -1,7 +1,9 @@
 '''
-Function to convert first letter of string to lower case, unless all other
-letters are upper case
+Functions to modify strings - converting first letter of string to lower case
+(unless all other letters are upper case), and converting names to use in
+file names
 '''
+import re
 
 
 def lower_first(string):
@@ -24,3 +26,21 @@ def lower_first(string):
     else:
         new_string = string[0].lower() + string[1:]
     return new_string
+
+
+def slugify(string):
+    '''
+    Converts string to lower case, with each run of characters other than
+    letters and numbers replaced by an underscore, for use in file names.
+
+    Parameters
+    ----------
+    string : string
+        The string to be converted (e.g. 'School A By year group')
+
+    Returns
+    -------
+    slug : string
+        The converted string (e.g. 'school_a_by_year_group')
+    '''
+    return re.sub(r'[^a-z0-9]+', '_', string.lower()).strip('_')
@@ -1,64 +1,548 @@
 '''
 Helper functions for working with image files
 '''
-from tempfile import NamedTemporaryFile
 import base64
+from functools import lru_cache
+import hashlib
 from importlib.resources import files
+from io import BytesIO
+import json
+import mimetypes
+import os
+from pathlib import Path
+from PIL import Image
+import plotly
+from plotly.utils import PlotlyJSONEncoder
+import tempfile
+import time
+from .caching import DiskCache, SizedLRUCache
+from .renderer_pool import get_renderer_pool
+from .svg_charts import fig_to_svg
 
+# Cache of exported images, shared between reports - held in memory, and on
+# disk in the directory set by the KAILO_FIGURE_CACHE_DIR environment variable
+# (or a folder in the temporary directory if that isn't set)
+figure_memory_cache = SizedLRUCache(max_size=64*1024*1024, size_func=len)
+figure_disk_cache = DiskCache(
+    directory=os.environ.get(
+        'KAILO_FIGURE_CACHE_DIR',
+        os.path.join(tempfile.gettempdir(), 'kailo_beewell_figures')),
+    max_size=512*1024*1024)
 
-def convert_fig_to_html(fig, alt_text):
+# Resolution of the PNG charts when printed, in dots per inch (with 96 being
+# one image pixel per pixel of the figure layout, as in the browser), set by
+# the KAILO_CHART_DPI environment variable
+CHART_DPI = float(os.environ.get('KAILO_CHART_DPI', 96))
+
+# Number of colours in the palette that PNG charts are reduced to, set by the
+# KAILO_PNG_COLOURS environment variable (0 keeps them in full colour)
+PNG_COLOURS = int(os.environ.get('KAILO_PNG_COLOURS', 256))
+
+# Width of the main column of the dashboard (in the centered layout), and the
+# widths of the resized copies of the images in the package (see
+# build_image_variants()) - half the column, the full column, and twice that
+# for high resolution screens
+COLUMN_WIDTH = 704
+IMAGE_WIDTHS = [COLUMN_WIDTH // 2, COLUMN_WIDTH, COLUMN_WIDTH * 2]
+
+# Data URIs for the chart images, so an image used more than once (within or
+# between reports) is only encoded once, and WeasyPrint (which caches images
+# by URL) only includes it once in the PDF
+data_uri_cache = SizedLRUCache(max_size=64*1024*1024, size_func=len)
+
+
+def format_fig_for_pdf(fig):
+    '''
+    Adjust the layout so the figure proportions fit in the PDF report and are
+    similar to streamlit, with automargin to ensure labels aren't cut off
+
+    Parameters
+    ----------
+    fig : plotly figure object or dictionary
+        Figure to be adjusted (modified in place)
+    '''
+    if isinstance(fig, dict):
+        layout = fig.setdefault('layout', dict())
+        layout['height'] = 411
+        layout['width'] = 600
+        for axis in ['xaxis', 'yaxis']:
+            layout[axis] = {**layout.get(axis, dict()), 'automargin': True}
+    else:
+        fig.update_layout(
+            height=411,
+            width=600,
+            xaxis=dict(automargin=True),
+            yaxis=dict(automargin=True))
+
+
+def figure_cache_key(fig, format='png'):
+    '''
+    Get the key for a figure in the figure cache - a hash of the figure's data
+    and layout, the image format, the resolution and palette size (see
+    CHART_DPI and PNG_COLOURS), and the plotly version (as that could change
+    how the image looks)
+
+    Parameters
+    ----------
+    fig : plotly figure object or dictionary
+        Figure to find key for
+    format : string
+        Image format (e.g. 'png', 'svg') - default 'png'
+
+    Returns
+    -------
+    key : string
+        Hash of the figure
+    '''
+    if not isinstance(fig, dict):
+        fig = fig.to_plotly_json()
+    fig_json = json.dumps(fig, cls=PlotlyJSONEncoder, sort_keys=True)
+    hasher = hashlib.sha256(fig_json.encode('utf-8'))
+    hasher.update(f'{format}-{CHART_DPI}-{PNG_COLOURS}-{plotly.__version__}'
+                  .encode('utf-8'))
+    return f'{hasher.hexdigest()}.{format}'
+
+
+def get_cached_figure(key):
+    '''
+    Get an exported image from the figure cache, checking memory and then
+    disk (adding to memory if it was found on disk)
+
+    Parameters
+    ----------
+    key : string
+        Key for the figure, from figure_cache_key()
+
+    Returns
+    -------
+    image : bytes
+        The image, or None if not in the cache
+    '''
+    image = figure_memory_cache.get(key)
+    if image is None:
+        image = figure_disk_cache.get(key)
+        if image is not None:
+            figure_memory_cache.set(key, image)
+    return image
+
+
+def cache_figure(key, image):
+    '''
+    Add an exported image to the figure cache, in memory and on disk
+
+    Parameters
+    ----------
+    key : string
+        Key for the figure, from figure_cache_key()
+    image : bytes
+        The image
+    '''
+    figure_memory_cache.set(key, image)
+    figure_disk_cache.set(key, image)
+
+
+def optimise_png(image, colours=PNG_COLOURS):
+    '''
+    Reduce the size of a PNG image by converting it to a palette of colours
+    (without dithering, as the charts are mostly blocks of flat colour) and
+    compressing it. The original image is returned if that is smaller.
+
+    Parameters
+    ----------
+    image : bytes
+        The PNG image
+    colours : integer
+        Number of colours in the palette - default PNG_COLOURS. If 0, the
+        image is returned unchanged.
+
+    Returns
+    -------
+    image : bytes
+        The optimised PNG image
+    '''
+    if not colours:
+        return image
+    with Image.open(BytesIO(image)) as img:
+        palette_img = img.convert('RGBA').quantize(
+            colors=colours, method=Image.Quantize.FASTOCTREE,
+            dither=Image.Dither.NONE)
+    buffer = BytesIO()
+    palette_img.save(buffer, format='PNG', optimize=True)
+    optimised = buffer.getvalue()
+    return optimised if len(optimised) < len(image) else image
+
+
+def export_figures(figs, format='png', use_cache=True):
+    '''
+    Export plotly figures as images in memory. Each figure is first looked for
+    in the figure cache, as many are identical between reports. The others
+    are all rendered by one renderer leased from the shared pool of kaleido
+    renderers (which are kept running between calls), so concurrent exports
+    run in parallel, at the resolution set by CHART_DPI. PNG images are
+    optimised by optimise_png(), and are then added to the cache.
+
+    Parameters
+    ----------
+    figs : list
+        List of plotly figure objects or dictionaries
+    format : string
+        Image format (e.g. 'png', 'svg') - default 'png'
+    use_cache : boolean
+        Whether to use the figure cache - default True
+
+    Returns
+    -------
+    images : list
+        Bytes of the image for each figure
+    render_times : list
+        Time taken to get each image from the cache or render it (in seconds)
+    '''
+    images = [None] * len(figs)
+    render_times = [0.0] * len(figs)
+    keys = [None] * len(figs)
+
+    # Find any figures in the cache
+    if use_cache:
+        for i, fig in enumerate(figs):
+            start = time.perf_counter()
+            keys[i] = figure_cache_key(fig, format)
+            images[i] = get_cached_figure(keys[i])
+            render_times[i] = time.perf_counter() - start
+
+    # Render the rest, adding them to the cache (and reusing them for any
+    # identical figures in this batch)
+    missing = [i for i, image in enumerate(images) if image is None]
+    if missing:
+        rendered = dict()
+        with get_renderer_pool().lease() as renderer:
+            for i in missing:
+                start = time.perf_counter()
+                if use_cache and keys[i] in rendered:
+                    images[i] = rendered[keys[i]]
+                else:
+                    images[i] = renderer.render(
+                        figs[i], format=format, scale=CHART_DPI/96)
+                    if format == 'png':
+                        images[i] = optimise_png(images[i])
+                    if use_cache:
+                        cache_figure(keys[i], images[i])
+                        rendered[keys[i]] = images[i]
+                render_times[i] += time.perf_counter() - start
+
+    return images, render_times
+
+
+@lru_cache
+def get_plotlyjs():
+    '''
+    Get the plotly.js library included with the plotly package, to be
+    included once in interactive reports. This is cached, so it is only read
+    once per process.
+
+    Returns
+    -------
+    plotlyjs : string
+        Minified plotly.js source
+    '''
+    return plotly.offline.get_plotlyjs()
+
+
+def fig_to_plotly_html(fig, alt_text=''):
+    '''
+    Convert plotly figure to HTML which draws it using plotly.js (which must
+    be included in the page - see get_plotlyjs()), with the figure embedded as
+    JSON. The chart is drawn into the element before the script, so no ID is
+    needed and the HTML is the same each time.
+
+    Parameters
+    ----------
+    fig : plotly figure object or dictionary
+        Figure to be converted
+    alt_text : string
+        Alternative text for the figure
+
+    Returns
+    -------
+    html : string
+        HTML to draw the figure
     '''
-    Convert plotly fig to HTML by saving it as a temporary PNG file, and then
-    importing that and converting it to HTML which can produce the figure.
+    if not isinstance(fig, dict):
+        fig = fig.to_plotly_json()
+    fig = {'data': fig.get('data', []), 'layout': fig.get('layout', dict()),
+           'config': {'displayModeBar': False}}
+    # Escape '</' so the JSON can't end the script element
+    fig_json = json.dumps(fig, cls=PlotlyJSONEncoder).replace('</', '<\\/')
+    return f'''
+<div class='plotly-chart' role='img' aria-label='{alt_text}'></div>
+<script>
+Plotly.newPlot(document.currentScript.previousElementSibling, {fig_json});
+</script>'''
+
+
+def get_data_uri(image, mime_type):
+    '''
+    Get a base64 data URI for an image. These are cached (see
+    data_uri_cache), so identical images share the same URI.
 
     Parameters
     ----------
-    fig : plotly figure object
+    image : bytes
+        The image
+    mime_type : string
+        MIME type of the image (e.g. 'image/png')
+
+    Returns
+    -------
+    data_uri : string
+        Data URI with the encoded image
+    '''
+    key = hashlib.sha1(image).hexdigest()
+    return data_uri_cache.get_or_create(
+        key,
+        lambda: f"data:{mime_type};base64,{base64.b64encode(image).decode()}")
+
+
+def convert_figs_to_html(figs, alt_texts, chart_format='png'):
+    '''
+    Convert plotly figures to HTML image tags, with the images embedded as
+    base64 data URIs (see get_data_uri()). PNG images are exported together
+    by export_figures() (and sized to print at the size of the figure),
+    whilst SVG images are drawn by fig_to_svg() (without kaleido). Otherwise,
+    if chart_format is 'plotly', the figures are embedded as JSON and drawn
+    by plotly.js when the HTML is opened (for interactive reports).
+
+    Parameters
+    ----------
+    figs : list
+        List of plotly figure objects or dictionaries to be converted
+    alt_texts : list
+        Alternative text for each figure
+    chart_format : string
+        Format of the images - either 'png' (default), 'svg' or 'plotly'
+
+    Returns
+    -------
+    img_tags : list
+        HTML to generate each image
+    '''
+    for fig in figs:
+        format_fig_for_pdf(fig)
+
+    if chart_format == 'plotly':
+        return [fig_to_plotly_html(fig, alt_text)
+                for fig, alt_text in zip(figs, alt_texts)]
+
+    # Export or draw images, then convert each to HTML
+    if chart_format == 'svg':
+        images = [fig_to_svg(fig if isinstance(fig, dict)
+                             else fig.to_plotly_json(), alt_text).encode()
+                  for fig, alt_text in zip(figs, alt_texts)]
+        mime_type = 'image/svg+xml'
+    else:
+        images, _ = export_figures(figs)
+        mime_type = 'image/png'
+    img_tags = []
+    for fig, image, alt_text in zip(figs, images, alt_texts):
+        data_uri = get_data_uri(image, mime_type)
+        # Set the size of PNG images, so they are printed at the size of the
+        # figure whatever their resolution
+        size = ''
+        if chart_format == 'png':
+            layout = fig['layout'] if isinstance(fig, dict) else fig.layout
+            size = f" style='width: {layout['width']}px'"
+        img_tags.append(f'''
+<img src='{data_uri}' alt='{alt_text}'{size}>''')
+
+    return img_tags
+
+
+def convert_fig_to_html(fig, alt_text, chart_format='png'):
+    '''
+    Convert plotly fig to HTML, by exporting it as a PNG image in memory (or
+    drawing it as an SVG image) and converting that to HTML which can produce
+    the figure.
+
+    Parameters
+    ----------
+    fig : plotly figure object or dictionary
         Figure to be converted
     alt_text : string
         Alternative text for the figure
+    chart_format : string
+        Format of the image - either 'png' (default), 'svg' or 'plotly'
 
     Returns
     -------
     img_tag : string
         HTML to generate image
     '''
-    # Adjust the layout so the figure proportions fit in the PDF report and are
-    # similar to streamlit, with automargin to ensure labels aren't cut off
-    fig.update_layout(
-        height=411,
-        width=600,
-        xaxis=dict(automargin=True),
-        yaxis=dict(automargin=True))
+    return convert_figs_to_html([fig], [alt_text], chart_format)[0]
+
+
+def variant_filename(filename, width):
+    '''
+    Get name of the resized copy of an image (see build_image_variants())
+
+    Parameters
+    ----------
+    filename: string
+        Name of the image file within the package (e.g.
+        'symbol_survey/family_crop.png')
+    width : integer
+        Width of the copy (in pixels)
+
+    Returns
+    -------
+    variant : string
+        Name of the copy within the package (e.g.
+        'variants/symbol_survey/family_crop_704w.png')
+    '''
+    stem, extension = os.path.splitext(filename)
+    return f'variants/{stem}_{width}w{extension}'
 
-    # Write image to a temporary file, then open again and convert to HTML
-    with NamedTemporaryFile(suffix='.png') as temp:
-        fig.write_image(temp)
-        temp.seek(0)
-        data_uri = base64.b64encode(
-            open(temp.name, 'rb').read()).decode('utf-8')
 
-    # Generate the image tag, inserting the HTML for the figure
-    img_tag = f'''
-<img src='data:image/png;base64,{data_uri}' alt='{alt_text}'>'''
+def build_image_variants(widths=IMAGE_WIDTHS, quality=80):
+    '''
+    Create resized and recompressed copies of the images in the package, at
+    each of the widths that are narrower than the original image. These are
+    used by get_image_path() when the width an image is displayed at is
+    provided. This should be run before building the package (the copies are
+    not kept in the repository), and only replaces copies older than their
+    image.
 
-    return img_tag
+    The copies are in the same format as the original, as st.image() converts
+    any other format to PNG (if the image has transparency) or JPEG each time
+    it is shown - PNG images are reduced to a palette by optimise_png(), and
+    JPEG images are saved at the given quality.
 
+    Parameters
+    ----------
+    widths : list
+        Widths to create copies at (in pixels) - default IMAGE_WIDTHS
+    quality : integer
+        JPEG quality, from 0 to 100 - default 80
 
-def get_image_path(filename):
+    Returns
+    -------
+    created : list
+        Paths to the copies that were created
     '''
-    Get path for image in the kailo-beewell-dashboard package
+    images_dir = str(files('kailo_beewell_dashboard').joinpath('images'))
+    created = []
+    for root, dirs, names in os.walk(images_dir):
+        # Don't create copies of the copies
+        if root == images_dir and 'variants' in dirs:
+            dirs.remove('variants')
+        for name in names:
+            if not name.lower().endswith(('.png', '.jpg', '.jpeg')):
+                continue
+            src_path = os.path.join(root, name)
+            filename = os.path.relpath(src_path, images_dir).replace(
+                os.sep, '/')
+            with Image.open(src_path) as img:
+                for width in widths:
+                    if width >= img.width:
+                        continue
+                    path = get_image_path(variant_filename(filename, width))
+                    if (os.path.exists(path) and
+                            os.path.getmtime(path) >= os.path.getmtime(
+                                src_path)):
+                        continue
+                    height = round(img.height * width / img.width)
+                    resized = img.resize((width, height),
+                                         Image.Resampling.LANCZOS)
+                    buffer = BytesIO()
+                    if img.format == 'PNG':
+                        resized.save(buffer, format='PNG')
+                        image = optimise_png(buffer.getvalue())
+                    else:
+                        resized.convert('RGB').save(
+                            buffer, format='JPEG', quality=quality,
+                            optimize=True, progressive=True)
+                        image = buffer.getvalue()
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    with open(path, 'wb') as f:
+                        f.write(image)
+                    created.append(path)
+    return created
+
+
+def get_image_path(filename, width=None):
+    '''
+    Get path for image in the kailo-beewell-dashboard package. If the width
+    it will be displayed at is provided, this is the smallest resized copy
+    (see build_image_variants()) that is at least that wide, or the original
+    image if there are none.
 
     Parameters
     ----------
     filename: string
         Name of the image file within the package (e.g. 'image.png')
+    width : integer
+        Optional input, width the image will be displayed at (in pixels).
+        Default is None, which returns the original image.
 
     Returns
     -------
     img_path : string
         Path to image within the package
     '''
+    if width is not None:
+        for variant_width in sorted(IMAGE_WIDTHS):
+            if variant_width < width:
+                continue
+            variant_path = str(files('kailo_beewell_dashboard').joinpath(
+                f'images/{variant_filename(filename, variant_width)}'))
+            if os.path.exists(variant_path):
+                return variant_path
     img_path = str(files('kailo_beewell_dashboard')
                    .joinpath(f'images/{filename}'))
     return img_path
+
+
+@lru_cache
+def get_image_data_uri(filename):
+    '''
+    Get one of the images in the kailo-beewell-dashboard package as a base64
+    data URI. This is cached, so each image is only read and encoded once per
+    process.
+
+    Parameters
+    ----------
+    filename: string
+        Name of the image file within the package (e.g. 'image.png')
+
+    Returns
+    -------
+    data_uri : string
+        Data URI with the encoded image
+    '''
+    img_path = get_image_path(filename)
+    mime = mimetypes.guess_type(img_path)[0]
+    with open(img_path, 'rb') as f:
+        encoded = base64.b64encode(f.read()).decode('utf-8')
+    return f'data:{mime};base64,{encoded}'
+
+
+def get_image_src(filename, image_urls='data'):
+    '''
+    Get the source to use in an HTML image tag for one of the images in the
+    kailo-beewell-dashboard package
+
+    Parameters
+    ----------
+    filename: string
+        Name of the image file within the package (e.g. 'image.png')
+    image_urls : string
+        Either 'data' (default), to include the encoded image in the HTML, or
+        'file', to refer to the image file (which keeps the HTML small, but
+        means it can only be viewed on the same machine)
+
+    Returns
+    -------
+    src : string
+        Data URI or file URL for the image
+    '''
+    if image_urls == 'file':
+        return Path(get_image_path(filename)).as_uri()
+    return get_image_data_uri(filename)
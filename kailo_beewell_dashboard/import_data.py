@@ -1,14 +1,22 @@
 '''
 Helper function for importing the data from TiDB Cloud
 '''
+from contextlib import contextmanager
 import numpy as np
+import os
 import pandas as pd
 import streamlit as st
 from tempfile import NamedTemporaryFile
 import pymysql
+from .reshape_data import index_score_trends, prepare_table
 
+# Number of seconds that the tables imported by load_tidb_tables() are shared
+# for before they are imported again (so sessions pick up refreshed data),
+# set by the KAILO_TABLES_TTL environment variable (default one hour)
+TABLES_TTL = float(os.environ.get('KAILO_TABLES_TTL', 3600))
 
-def get_df(query, conn):
+
+def get_df(query, conn, params=None):
     '''
     Get data from the connected SQL database
 
@@ -18,6 +26,8 @@ def get_df(query, conn):
         SQL query
     conn : connection object
         Connection to the SQL database
+    params : tuple
+        Optional input, values for any placeholders (%s) in the query
 
     Returns:
     --------
@@ -25,21 +35,128 @@ def get_df(query, conn):
         Dataframe produced from the query
     '''
     cursor = conn.cursor()
-    cursor.execute(query)
+    cursor.execute(query, params)
     columns = [desc[0] for desc in cursor.description]
     df = pd.DataFrame(cursor.fetchall(), columns=columns)
     return df
 
 
-def import_tidb_data(survey_type):
+@contextmanager
+def tidb_connection():
+    '''
+    Connect to TiDB Cloud, using the details provided in the streamlit secrets.
+    Used as a context manager, closing the connection once finished.
+
+    Yields
+    ------
+    conn : connection object
+        Connection to the SQL database
+    '''
+    # Create temporary PEM file for setting up the connection
+    with NamedTemporaryFile(suffix='.pem') as temp:
+
+        # Write the temporary file
+        temp.write(st.secrets.tidb.root_cert.encode('utf-8'))
+
+        # Temporary file have pointer to current position in file - as we
+        # have just written, the pointer is at the end of the last write,
+        # so if you don't seek, you would read from the end of the file and
+        # find nothing
+        temp.seek(0)
+
+        # Set up connection manually, providing the temporary PEM file
+        # (as cannot use st.connection() without providing tempfile name
+        # in secrets)
+        conn = pymysql.connect(
+            host=st.secrets.tidb.host,
+            user=st.secrets.tidb.username,
+            password=st.secrets.tidb.password,
+            database=st.secrets.tidb.database,
+            port=st.secrets.tidb.port,
+            ssl_verify_cert=False,
+            ssl_verify_identity=False,
+            ssl_ca=temp.name
+        )
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+
+def fix_data_types(key, df):
+    '''
+    Fixes data type issues in the datasets imported from TiDB Cloud
+
+    Parameters
+    ----------
+    key : string
+        Name of the dataset (as used for the session state)
+    df : pandas DataFrame
+        Dataset imported from TiDB Cloud
+
+    Returns
+    -------
+    df : pandas DataFrame
+        Dataset with columns converted to the correct types
+    '''
+    # If dataset is scores with RAG ratings, convert
+    # columns to numeric, and string 'nan' to actual np.nan
+    if key == 'scores_rag':
+        to_fix = ['mean', 'count', 'total_pupils',
+                  'group_n', 'group_wt_mean', 'group_wt_std',
+                  'lower', 'upper']
+        # Include bootstrap confidence intervals, if present
+        to_fix += [col for col in ['ci_lower', 'ci_upper']
+                   if col in df.columns]
+        for col in to_fix:
+            df[col] = pd.to_numeric(df[col], errors='ignore')
+        df['rag'] = df['rag'].replace('nan', np.nan)
+
+    # If dataset is score trends, likewise convert columns to numeric, and
+    # string 'nan' to actual np.nan
+    if key == 'score_trends':
+        for col in ['mean', 'count', 'prev_mean', 'change']:
+            df[col] = pd.to_numeric(df[col], errors='ignore')
+        for col in ['rag', 'prev_wave', 'prev_rag']:
+            df[col] = df[col].replace('nan', np.nan)
+
+    # If dataset is demographic, convert n_responses to numeric
+    if key == 'demographic':
+        df['n_responses'] = pd.to_numeric(df['n_responses'],
+                                          errors='ignore')
+
+    # If dataset is counts, convert counts to numeric
+    if key == 'counts':
+        df['count'] = pd.to_numeric(df['count'],
+                                    errors='ignore')
+    return df
+
+
+@st.cache_resource(show_spinner=False, ttl=TABLES_TTL)
+def load_tidb_tables(survey_type, wave=None):
     '''
     Imports all the datasets from TiDB Cloud, fixes any data type issues, and
-    saves the datasets to the session state.
+    partitions them by school (also indexing those used by filter_by_group(),
+    and creating the summary matrices of RAG ratings).
+    This is cached, so the datasets are imported once and are then shared
+    between all sessions - so they should not be modified. They are imported
+    again once they are older than TABLES_TTL seconds, so new sessions see
+    data refreshed on TiDB Cloud within that time. To use refreshed data
+    straight away, call load_tidb_tables.clear() (or restart the app).
 
     Parameters
     ----------
     survey_type : string
         Designates whether to import for 'standard' or 'symbol' survey
+    wave : string
+        Optional input, survey wave to import (e.g. '2023/24'), for tables with
+        a 'wave' column. Default is None, which imports all rows.
+
+    Returns
+    -------
+    tables : dictionary
+        Dictionary where key is the session state variable and value is the
+        dataset
     '''
     # Define the session state variables (keys) and TIDB datasets (values)
     if survey_type == 'standard':
@@ -52,63 +169,86 @@ def import_tidb_data(survey_type):
                  'counts': 'symbol_school_overall_counts',
                  'demographic': 'symbol_school_aggregate_demographic'}
 
-    # First, check if everything is in the session state - if so, don't need to
-    # connect, but if missing stuff, will want to connect
-    if not all([x in st.session_state for x in items.keys()]):
-
-        # Create temporary PEM file for setting up the connection
-        with NamedTemporaryFile(suffix='.pem') as temp:
-
-            # Write the temporary file
-            temp.write(st.secrets.tidb.root_cert.encode('utf-8'))
-
-            # Temporary file have pointer to current position in file - as we
-            # have just written, the pointer is at the end of the last write,
-            # so if you don't seek, you would read from the end of the file and
-            # find nothing
-            temp.seek(0)
-
-            # Set up connection manually, providing the temporary PEM file
-            # (as cannot use st.connection() without providing tempfile name
-            # in secrets)
-            conn = pymysql.connect(
-                host=st.secrets.tidb.host,
-                user=st.secrets.tidb.username,
-                password=st.secrets.tidb.password,
-                database=st.secrets.tidb.database,
-                port=st.secrets.tidb.port,
-                ssl_verify_cert=False,
-                ssl_verify_identity=False,
-                ssl_ca=temp.name
-            )
-
-            # Loop through each of the items
-            for key, value in items.items():
-
-                # Check if it is in the session state, and if not...
-                if key not in st.session_state:
-
-                    # Import data from TIDB cloud
-                    df = get_df(f'SELECT * FROM {value}', conn)
-
-                    # If dataset is scores with RAG ratings, convert
-                    # columns to numeric, and string 'nan' to actual np.nan
-                    if key == 'scores_rag':
-                        to_fix = ['mean', 'count', 'total_pupils',
-                                  'group_n', 'group_wt_mean', 'group_wt_std',
-                                  'lower', 'upper']
-                        for col in to_fix:
-                            df[col] = pd.to_numeric(df[col], errors='ignore')
-                        df['rag'] = df['rag'].replace('nan', np.nan)
-
-                    # If dataset is demographic, convert n_responses to numeric
-                    if key == 'demographic':
-                        df['n_responses'] = pd.to_numeric(df['n_responses'],
-                                                          errors='ignore')
-
-                    # If dataset is counts, convert counts to numeric
-                    if key == 'counts':
-                        df['count'] = pd.to_numeric(df['count'],
-                                                    errors='ignore')
-                    # Save into the session state
-                    st.session_state[key] = df
+    tables = dict()
+    with tidb_connection() as conn:
+
+        # Loop through each of the items
+        for key, value in items.items():
+
+            # Import data from TIDB cloud (filtering to wave if given)
+            if wave is None:
+                df = get_df(f'SELECT * FROM {value}', conn)
+            else:
+                df = get_df(f'SELECT * FROM {value} WHERE wave = %s',
+                            conn, (wave,))
+
+            # Fix data types, then partition and index the table
+            tables[key] = prepare_table(
+                key, fix_data_types(key, df), survey_type)
+
+    return tables
+
+
+def import_tidb_data(survey_type, wave=None):
+    '''
+    Imports all the datasets from TiDB Cloud (using load_tidb_tables(), so
+    they are only imported once and shared between sessions), and saves the
+    datasets to the session state.
+
+    Parameters
+    ----------
+    survey_type : string
+        Designates whether to import for 'standard' or 'symbol' survey
+    wave : string
+        Optional input, survey wave to import (e.g. '2023/24'), for tables with
+        a 'wave' column. Default is None, which imports all rows.
+    '''
+    # Define the session state variables
+    if survey_type == 'standard':
+        keys = ['scores_rag', 'responses', 'counts', 'demographic']
+    elif survey_type == 'symbol':
+        keys = ['responses', 'counts', 'demographic']
+
+    # If a different wave was previously imported, remove it from the session
+    # state so the chosen wave is imported instead
+    if st.session_state.get('wave') != wave:
+        for key in keys:
+            st.session_state.pop(key, None)
+        st.session_state['wave'] = wave
+
+    # First, check if everything is in the session state - if not, get the
+    # datasets and save them into the session state
+    if not all([x in st.session_state for x in keys]):
+        st.session_state.update(load_tidb_tables(survey_type, wave))
+
+
+def import_tidb_trends(school, survey_type='standard'):
+    '''
+    Imports the score trends (change in scores between waves) for the chosen
+    school from TiDB Cloud, fixes any data type issues, indexes them by
+    school, group and topic using index_score_trends(), and saves them to the
+    session state as 'score_trends'. Only the rows for the chosen school are
+    imported, rather than all waves for all schools, so they are imported
+    again if the school changes.
+
+    Parameters
+    ----------
+    school : string
+        Name of the school
+    survey_type : string
+        Designates whether to import for 'standard' (default) or 'symbol'
+        survey
+    '''
+    # If trends for a different school were previously imported, remove them
+    # from the session state so the chosen school is imported instead
+    if st.session_state.get('trends_school') != school:
+        st.session_state.pop('score_trends', None)
+        st.session_state['trends_school'] = school
+
+    if 'score_trends' not in st.session_state:
+        with tidb_connection() as conn:
+            df = get_df(f'''
+SELECT * FROM {survey_type}_school_score_trends WHERE school_lab = %s''',
+                        conn, (school,))
+        df = fix_data_types('score_trends', df)
+        st.session_state['score_trends'] = index_score_trends(df)
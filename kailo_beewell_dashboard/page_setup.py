@@ -1,9 +1,28 @@
 '''
 Helper functions for setting up the page and page formatting.
 '''
-import base64
+from functools import lru_cache
 import streamlit as st
 from importlib.resources import files
+from .images import get_image_data_uri
+from .renderer_pool import start_renderer_pool
+
+
+@lru_cache
+def get_dashboard_css():
+    '''
+    Import the CSS stylesheet for the dashboard. This is cached, so the file
+    is only read once per process.
+
+    Returns
+    -------
+    css_style : string
+        Contents of the stylesheet
+    '''
+    css_path = str(files('kailo_beewell_dashboard').joinpath('css/style.css'))
+    with open(css_path) as css:
+        css_style = css.read()
+    return css_style
 
 
 def page_logo():
@@ -11,19 +30,14 @@ def page_logo():
     Create logo to go above the pages in the sidebar
     '''
     # Set up logo for display in markdown, which we use instead of st.image()
-    # to allow inline display and alt_text
-    img_path = str(files('kailo_beewell_dashboard')
-                   .joinpath('images/kailo_beewell_logo_padded.png'))
-    file = open(img_path, 'rb')
-    contents = file.read()
-    url = base64.b64encode(contents).decode('utf-8')
-    file.close()
+    # to allow inline display and alt_text (encoded once per process)
+    url = get_image_data_uri('kailo_beewell_logo_padded.png')
 
     # Display logo
     st.markdown(f'''
 <style>
     [data-testid='stSidebarNav'] {{
-        background-image: url('data:image/png;base64,{url}');
+        background-image: url('{url}');
         background-repeat: no-repeat;
         padding-top: 110px; /* Move page names down */
         background-position: 0px 50px; /* Move image down */
@@ -52,14 +66,18 @@ def page_setup(type):
 {type.capitalize()} #BeeWell survey dashboard for North Devon and Torridge in
 2023/24 as part of Kailo.'''})
 
-    # Import CSS style
-    css_path = str(files('kailo_beewell_dashboard').joinpath('css/style.css'))
-    with open(css_path) as css:
-        st.markdown(f'<style>{css.read()}</style>', unsafe_allow_html=True)
+    # Import CSS style (read once per process)
+    st.markdown(f'<style>{get_dashboard_css()}</style>',
+                unsafe_allow_html=True)
 
     # Add page logo
     page_logo()
 
+    # Start the renderers used to create images for the PDF reports in the
+    # background (only happens once per process, as the pool is shared)
+    if type in ['standard', 'symbol']:
+        start_renderer_pool()
+
 
 def blank_lines(n):
     '''
@@ -0,0 +1,201 @@
+'''
+Functions to convert the HTML reports to PDF using WeasyPrint. The stylesheet
+and fonts are only parsed once per thread, and reused for every report.
+'''
+import os
+import tempfile
+import threading
+import time
+from weasyprint import CSS, HTML
+from weasyprint.text.fonts import FontConfiguration
+from .report_cache import report_cache_key, report_disk_cache
+from .static_report import (
+    generate_static_report,
+    generate_static_symbol_report,
+    get_report_css,
+    write_report)
+
+# Font configuration and stylesheet for each thread. A FontConfiguration
+# holds a fontconfig/Pango font map that is not safe to share between
+# threads, and the stylesheet's fonts are registered with it, so each thread
+# converting reports (e.g. the report job queue) has its own
+_thread_data = threading.local()
+
+
+def get_font_config():
+    '''
+    Get the WeasyPrint font configuration used by all reports in the current
+    thread. This is cached, so fonts are only loaded once per thread.
+
+    Returns
+    -------
+    font_config : FontConfiguration
+        WeasyPrint font configuration
+    '''
+    font_config = getattr(_thread_data, 'font_config', None)
+    if font_config is None:
+        font_config = FontConfiguration()
+        _thread_data.font_config = font_config
+    return font_config
+
+
+def get_report_stylesheet():
+    '''
+    Get the report stylesheet parsed by WeasyPrint, with the font
+    configuration from get_font_config(). This is cached, so the CSS is only
+    parsed once per thread.
+
+    Returns
+    -------
+    stylesheet : CSS
+        WeasyPrint stylesheet
+    '''
+    stylesheet = getattr(_thread_data, 'stylesheet', None)
+    if stylesheet is None:
+        stylesheet = CSS(string=get_report_css(),
+                         font_config=get_font_config())
+        _thread_data.stylesheet = stylesheet
+    return stylesheet
+
+
+def html_to_pdf(html=None, target=None, filename=None):
+    '''
+    Convert a report to PDF, using the stylesheet and fonts cached for the
+    current thread. The HTML should be created without the stylesheet
+    (inline_css=False), else it will be parsed again for every report.
+
+    Parameters
+    ----------
+    html : string
+        HTML of the report (or provide filename)
+    target : string or file object
+        Optional input, the path or file to write the PDF to. Default is None,
+        which returns the PDF as bytes.
+    filename : string
+        Optional input, path to a file with the HTML of the report, used if
+        html is not provided
+
+    Returns
+    -------
+    pdf : bytes
+        The PDF (or None if it was written to target)
+    timings : dictionary
+        Time taken to lay out the pages ('layout') and to write the PDF
+        ('write') (in seconds)
+    '''
+    start = time.perf_counter()
+    # The report file is UTF-8 (else WeasyPrint guesses the encoding, and can
+    # garble non-ASCII text)
+    if html is None:
+        source = HTML(filename=filename, encoding='utf-8')
+    else:
+        source = HTML(string=html)
+    document = source.render(
+        stylesheets=[get_report_stylesheet()], font_config=get_font_config())
+    layout_time = time.perf_counter() - start
+    pdf = document.write_pdf(target)
+    timings = {'layout': layout_time,
+               'write': time.perf_counter() - start - layout_time}
+    return pdf, timings
+
+
+def create_pdf_report(survey_type='standard', target=None, image_urls='data',
+                      **report_args):
+    '''
+    Create the report for a school as a PDF, with a breakdown of the time
+    taken to build the HTML, lay out the pages, and write the PDF. The HTML
+    is written to a temporary file as it is created, rather than being held
+    in memory.
+
+    Parameters
+    ----------
+    survey_type : string
+        Designates whether this is for 'standard' (default) or 'symbol' survey
+    target : string or file object
+        Optional input, the path or file to write the PDF to. Default is None,
+        which returns the PDF as bytes.
+    image_urls : string
+        Whether to include the logo and illustration in the HTML ('data',
+        default) or refer to the image files ('file'), which keeps the HTML
+        smaller
+    **report_args
+        Inputs to generate_static_report() (for the standard survey) or
+        generate_static_symbol_report() (for the symbol survey), such as
+        chosen_school, df_prop, counts, dem_prop and pdf_title
+
+    Returns
+    -------
+    pdf : bytes
+        The PDF (or None if it was written to target)
+    timings : dictionary
+        Time taken to build the HTML ('html'), lay out the pages ('layout'),
+        write the PDF ('write'), and in total ('total') (in seconds)
+    '''
+    start = time.perf_counter()
+    if survey_type == 'standard':
+        generate_report = generate_static_report
+    elif survey_type == 'symbol':
+        generate_report = generate_static_symbol_report
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        # Build HTML report, without the stylesheet (as the parsed stylesheet
+        # is provided to WeasyPrint)
+        html_path = os.path.join(temp_dir, 'report.html')
+        write_report(generate_report(
+            image_urls=image_urls, inline_css=False, **report_args),
+            html_path)
+        html_time = time.perf_counter() - start
+
+        # Convert to PDF
+        pdf, timings = html_to_pdf(target=target, filename=html_path)
+
+    timings['html'] = html_time
+    timings['total'] = time.perf_counter() - start
+    return pdf, timings
+
+
+def get_report_pdf(survey_type='standard', image_urls='data', use_cache=True,
+                   on_progress=None, **report_args):
+    '''
+    Get the report for a school as a PDF, from the report cache if it has
+    already been built for the same inputs and data, or else by creating it
+    (and adding it to the cache).
+
+    Parameters
+    ----------
+    survey_type : string
+        Designates whether this is for 'standard' (default) or 'symbol' survey
+    image_urls : string
+        Whether to include the logo and illustration in the HTML ('data',
+        default) or refer to the image files ('file'). This doesn't change
+        the PDF, so isn't part of the cache key.
+    use_cache : boolean
+        Whether to use the report cache - default True
+    on_progress : function
+        Optional input, function called after each section of the report is
+        created - see generate_static_report()
+    **report_args
+        Inputs to generate_static_report() (for the standard survey) or
+        generate_static_symbol_report() (for the symbol survey), such as
+        chosen_school, df_prop, counts, dem_prop and pdf_title
+
+    Returns
+    -------
+    pdf : bytes
+        The PDF
+    timings : dictionary
+        Time taken to build the report - see create_pdf_report(). This is None
+        if the report was from the cache.
+    '''
+    if use_cache:
+        key = report_cache_key(survey_type, report_args)
+        pdf = report_disk_cache.get(key)
+        if pdf is not None:
+            return pdf, None
+
+    pdf, timings = create_pdf_report(
+        survey_type=survey_type, image_urls=image_urls,
+        on_progress=on_progress, **report_args)
+    if use_cache:
+        report_disk_cache.set(key, pdf)
+    return pdf, timings
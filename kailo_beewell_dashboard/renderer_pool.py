@@ -0,0 +1,256 @@
+'''
+Pool of kaleido renderers used to export plotly figures as images. These are
+started in the background before they are needed, and shared by all sessions
+of the dashboard, so several reports can be rendered at once.
+'''
+from contextlib import contextmanager
+import os
+import queue
+import threading
+import plotly.io as pio
+from kaleido.scopes.plotly import PlotlyScope
+
+# Pool used by get_renderer_pool(), created on first use
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class Renderer:
+    '''
+    A kaleido renderer (which runs its own headless Chromium process), counting
+    the number of figures it has rendered.
+
+    The health check and shutdown use kaleido's private _proc and
+    _shutdown_kaleido() (tested with kaleido 0.2.1). If a kaleido version
+    doesn't have them, the renderer instead counts as started once it has
+    rendered a figure, and is shut down by replacing its scope (kaleido stops
+    the process when the old scope is deleted).
+
+    Attributes
+    ----------
+    scope : PlotlyScope
+        Kaleido scope used to render the figures
+    renders : integer
+        Number of figures rendered
+    '''
+    def __init__(self):
+        self.scope = self.create_scope()
+        self.renders = 0
+        self._started = False
+
+    @staticmethod
+    def create_scope():
+        '''
+        Create a kaleido scope, using the same plotly.js and MathJax as
+        plotly's own kaleido scope
+
+        Returns
+        -------
+        scope : PlotlyScope
+            Kaleido scope (its Chromium process starts on the first render)
+        '''
+        scope = PlotlyScope()
+        scope.plotlyjs = pio.kaleido.scope.plotlyjs
+        scope.mathjax = pio.kaleido.scope.mathjax
+        return scope
+
+    def render(self, fig, format='png', scale=1):
+        '''
+        Render a figure as an image
+
+        Parameters
+        ----------
+        fig : plotly figure object or dictionary
+            Figure to be rendered
+        format : string
+            Image format (e.g. 'png', 'svg') - default 'png'
+        scale : float
+            Number of image pixels per pixel of the figure's layout - default 1
+
+        Returns
+        -------
+        image : bytes
+            The rendered image
+        '''
+        image = self.scope.transform(fig, format=format, scale=scale)
+        self.renders += 1
+        self._started = True
+        return image
+
+    def warm_up(self):
+        '''
+        Start the Chromium process by rendering a blank figure
+        '''
+        self.scope.transform({'data': [], 'layout': {}},
+                             format='png', width=10, height=10)
+        self._started = True
+
+    def is_healthy(self):
+        '''
+        Check whether the Chromium process has been started and is running
+        (or, if kaleido doesn't expose the process, whether the renderer has
+        been started)
+
+        Returns
+        -------
+        healthy : boolean
+            True if process is running
+        '''
+        if not hasattr(self.scope, '_proc'):
+            return self._started
+        proc = self.scope._proc
+        return proc is not None and proc.poll() is None
+
+    def shutdown(self):
+        '''
+        Stop the Chromium process. The renderer can still be used after, and
+        starts a new process when needed.
+        '''
+        shutdown_kaleido = getattr(self.scope, '_shutdown_kaleido', None)
+        if shutdown_kaleido is not None:
+            shutdown_kaleido()
+        else:
+            self.scope = self.create_scope()
+        self._started = False
+
+
+class RendererPool:
+    '''
+    Pool of kaleido renderers. A renderer is leased from the pool to render
+    figures, and is returned to the pool once done. Before each lease, the
+    renderer is checked, and is started if it isn't running, or replaced if it
+    has rendered max_renders figures (as the memory used by Chromium grows
+    over time).
+
+    Parameters
+    ----------
+    size : integer
+        Number of renderers - default is the KAILO_RENDERER_POOL_SIZE
+        environment variable, or 2 if that isn't set
+    max_renders : integer
+        Number of figures a renderer can render before it is replaced - default
+        is the KAILO_RENDERER_MAX_RENDERS environment variable, or 500 if that
+        isn't set
+
+    Attributes
+    ----------
+    recycled : integer
+        Number of renderers that have been replaced
+    '''
+    def __init__(self, size=None, max_renders=None):
+        if size is None:
+            size = int(os.environ.get('KAILO_RENDERER_POOL_SIZE', 2))
+        if max_renders is None:
+            max_renders = int(
+                os.environ.get('KAILO_RENDERER_MAX_RENDERS', 500))
+        self.size = size
+        self.max_renders = max_renders
+        self.recycled = 0
+        self._idle = queue.Queue()
+        for _ in range(size):
+            self._idle.put(Renderer())
+
+    @contextmanager
+    def lease(self, timeout=None):
+        '''
+        Lease a renderer from the pool, waiting for one to be free if they are
+        all in use. Used as a context manager, returning the renderer to the
+        pool on exit.
+
+        Parameters
+        ----------
+        timeout : float
+            Maximum time to wait for a renderer (in seconds), raising
+            queue.Empty if none became free - default None, which waits until
+            one is free
+
+        Yields
+        ------
+        renderer : Renderer
+            A started renderer
+        '''
+        renderer = self._idle.get(timeout=timeout)
+        try:
+            # Replace renderer if it has reached its limit, or start it (or
+            # restart it if the process stopped)
+            if renderer.renders >= self.max_renders:
+                renderer.shutdown()
+                renderer = Renderer()
+                self.recycled += 1
+            if not renderer.is_healthy():
+                renderer.warm_up()
+            yield renderer
+        finally:
+            self._idle.put(renderer)
+
+    def warm_up(self, background=True):
+        '''
+        Start all of the renderers in the pool
+
+        Parameters
+        ----------
+        background : boolean
+            Whether to start them in a background thread (so this returns
+            immediately), default True
+        '''
+        def warm_up_all():
+            # The pool is first in first out, so each lease gets the next
+            # renderer
+            for _ in range(self.size):
+                with self.lease():
+                    pass
+
+        if background:
+            threading.Thread(target=warm_up_all, daemon=True).start()
+        else:
+            warm_up_all()
+
+    def shutdown(self):
+        '''
+        Stop all of the renderers in the pool that are not in use
+        '''
+        renderers = []
+        while not self._idle.empty():
+            renderers.append(self._idle.get())
+        for renderer in renderers:
+            renderer.shutdown()
+            self._idle.put(renderer)
+
+
+def get_renderer_pool():
+    '''
+    Get the renderer pool shared by the whole process, creating it if this is
+    the first use
+
+    Returns
+    -------
+    pool : RendererPool
+        The shared renderer pool
+    '''
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = RendererPool()
+        return _pool
+
+
+def start_renderer_pool(size=None, max_renders=None):
+    '''
+    Create the shared renderer pool and start its renderers in the background,
+    so the first report doesn't have to wait for them. Does nothing if the
+    pool has already been created.
+
+    Parameters
+    ----------
+    size : integer
+        Number of renderers - see RendererPool
+    max_renders : integer
+        Number of figures a renderer can render before it is replaced - see
+        RendererPool
+    '''
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            return
+        _pool = RendererPool(size=size, max_renders=max_renders)
+    _pool.warm_up(background=True)
@@ -0,0 +1,161 @@
+'''
+Caches for the PDF reports. Finished reports are kept on disk, so the same
+report can be downloaded again without being rebuilt. The sections of each
+report are also cached, so that when reports are rebuilt (for example, after
+one school's data is corrected), any section whose input rows are unchanged
+is reused rather than created again.
+'''
+import hashlib
+import os
+import pandas as pd
+import tempfile
+from . import __version__
+from .caching import DiskCache, SizedLRUCache
+from .images import CHART_DPI, PNG_COLOURS
+from .reshape_data import get_data_version, hash_rows
+
+# Cache of the finished reports, on disk in the directory set by the
+# KAILO_REPORT_CACHE_DIR environment variable (or a folder in the temporary
+# directory if that isn't set). Like the section cache below, this is keyed on
+# the package version.
+report_disk_cache = DiskCache(
+    directory=os.environ.get(
+        'KAILO_REPORT_CACHE_DIR',
+        os.path.join(tempfile.gettempdir(), 'kailo_beewell_reports')),
+    max_size=1024*1024*1024)
+
+# Cache of the HTML for each section, shared between reports - held in
+# memory, and on disk in the directory set by the KAILO_SECTION_CACHE_DIR
+# environment variable (or a folder in the temporary directory if that isn't
+# set). This is keyed on the package version, so should be cleared if the
+# sections are changed without changing the version.
+section_memory_cache = SizedLRUCache(max_size=32*1024*1024, size_func=len)
+section_disk_cache = DiskCache(
+    directory=os.environ.get(
+        'KAILO_SECTION_CACHE_DIR',
+        os.path.join(tempfile.gettempdir(), 'kailo_beewell_sections')),
+    max_size=256*1024*1024)
+
+
+def section_cache_key(name, inputs):
+    '''
+    Get the key for a section in the section cache - a hash of the name of the
+    section, its inputs (with dataframes hashed by their rows), the package
+    version and the chart image settings (CHART_DPI and PNG_COLOURS)
+
+    Parameters
+    ----------
+    name : string
+        Name of the section (e.g. 'summary_table')
+    inputs : list
+        Inputs that the section's HTML depends on - dataframes with the rows
+        used by the section, and any other values (e.g. school, group)
+
+    Returns
+    -------
+    key : string
+        Hash of the section and its inputs
+    '''
+    hasher = hashlib.sha256(
+        f'{name}-{__version__}-{CHART_DPI}-{PNG_COLOURS}'.encode('utf-8'))
+    for value in inputs:
+        if isinstance(value, pd.DataFrame):
+            value = hash_rows(value)
+        hasher.update(f'-{value!r}'.encode('utf-8'))
+    return f'{hasher.hexdigest()}.html'
+
+
+def get_cached_section(key):
+    '''
+    Get the HTML for a section from the section cache, checking memory and
+    then disk (adding to memory if it was found on disk)
+
+    Parameters
+    ----------
+    key : string
+        Key for the section, from section_cache_key()
+
+    Returns
+    -------
+    html : string
+        HTML of the section, or None if not in the cache
+    '''
+    html = section_memory_cache.get(key)
+    if html is None:
+        html = section_disk_cache.get(key)
+        if html is not None:
+            html = html.decode('utf-8')
+            section_memory_cache.set(key, html)
+    return html
+
+
+def cache_section(key, html):
+    '''
+    Add the HTML for a section to the section cache, in memory and on disk
+
+    Parameters
+    ----------
+    key : string
+        Key for the section, from section_cache_key()
+    html : string
+        HTML of the section
+    '''
+    section_memory_cache.set(key, html)
+    section_disk_cache.set(key, html.encode('utf-8'))
+
+
+def cached_section(name, inputs, create_section):
+    '''
+    Get the HTML for a section from the section cache, or create it and add
+    it to the cache if not present
+
+    Parameters
+    ----------
+    name : string
+        Name of the section (e.g. 'summary_table')
+    inputs : list
+        Inputs that the section's HTML depends on - see section_cache_key()
+    create_section : function
+        Function with no inputs which returns a list with the HTML content of
+        the section
+
+    Returns
+    -------
+    content : list
+        HTML content of the section
+    '''
+    key = section_cache_key(name, inputs)
+    html = get_cached_section(key)
+    if html is None:
+        html = ''.join(create_section())
+        cache_section(key, html)
+    return [html]
+
+
+def report_cache_key(survey_type, report_args):
+    '''
+    Get the key for a report in the report cache - a hash of the survey type,
+    the report's inputs (such as the school and group, with dataframes
+    identified by their version), the package version and the chart image
+    settings (CHART_DPI and PNG_COLOURS)
+
+    Parameters
+    ----------
+    survey_type : string
+        Designates whether this is for 'standard' or 'symbol' survey
+    report_args : dictionary
+        Inputs to generate_static_report() or generate_static_symbol_report()
+
+    Returns
+    -------
+    key : string
+        Hash of the report's inputs
+    '''
+    hasher = hashlib.sha256(
+        f'{survey_type}-{__version__}-{CHART_DPI}-{PNG_COLOURS}'
+        .encode('utf-8'))
+    for name, value in sorted(report_args.items()):
+        if isinstance(value, pd.DataFrame):
+            value = get_data_version(value)
+        hasher.update(f'-{name}={value!r}'.encode('utf-8'))
+    return f'{hasher.hexdigest()}.pdf'
@@ -0,0 +1,287 @@
+'''
+Build the PDF reports in the background, so the dashboard isn't blocked
+while a report is created. Requests for the same report are combined into one
+job, and the number of reports built at once is limited.
+'''
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import copy
+import os
+import pandas as pd
+import streamlit as st
+import threading
+import time
+import uuid
+from .pdf_report import get_report_pdf
+from .report_cache import report_cache_key, report_disk_cache
+from .reshape_data import get_data_version
+
+
+class ReportJob:
+    '''
+    A request to build a report, which is updated as the report is built.
+
+    Parameters
+    ----------
+    job_id : string
+        Unique identifier for the job
+    key : tuple
+        Identifies the report - see report_job_key()
+
+    Attributes
+    ----------
+    status : string
+        Either 'queued', 'running', 'done' or 'failed'
+    sections_done : integer
+        Number of sections of the report that have been completed
+    sections_total : integer
+        Total number of sections in the report (None until it is running)
+    pdf : bytes
+        The finished report (None until it is done)
+    timings : dictionary
+        Time taken to build the report - see create_pdf_report() (None if
+        it was from the report cache)
+    error : string
+        Description of the error, if the job failed
+    created : float
+        Time the job was created
+    finished : float
+        Time the job finished (None until it is done or failed)
+    '''
+    def __init__(self, job_id, key):
+        self.job_id = job_id
+        self.key = key
+        self.status = 'queued'
+        self.sections_done = 0
+        self.sections_total = None
+        self.pdf = None
+        self.timings = None
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+
+    def progress(self):
+        '''
+        Find the proportion of the report that has been completed
+
+        Returns
+        -------
+        progress : float
+            Proportion between 0 and 1
+        '''
+        if self.status == 'done':
+            return 1.0
+        if not self.sections_total:
+            return 0.0
+        return self.sections_done / self.sections_total
+
+
+def report_job_key(survey_type, report_args):
+    '''
+    Create the key that identifies a report, so requests for the same report
+    can be combined. Dataframes are identified by their version.
+
+    Parameters
+    ----------
+    survey_type : string
+        Designates whether this is for 'standard' or 'symbol' survey
+    report_args : dictionary
+        Inputs to get_report_pdf()
+
+    Returns
+    -------
+    key : tuple
+        The survey type, and each input (sorted by name)
+    '''
+    inputs = tuple(
+        (name, get_data_version(value) if isinstance(value, pd.DataFrame)
+         else value)
+        for name, value in sorted(report_args.items()))
+    return (survey_type, inputs)
+
+
+class ReportJobQueue:
+    '''
+    Queue of report jobs, run by a pool of threads. Submitting a report that
+    has already been requested returns the existing job (unless it failed),
+    and reports already in the report cache are finished straight away.
+    Finished jobs are kept so they can be collected, with the oldest removed
+    (and their PDF released) once there are more than max_finished. The jobs
+    are only changed while holding the queue's lock, and get() returns a copy,
+    so a job is never seen part way through an update.
+
+    Parameters
+    ----------
+    max_running : integer
+        Maximum number of reports built at once - default is the
+        KAILO_REPORT_JOBS environment variable, or 2 if that isn't set
+    max_finished : integer
+        Number of finished jobs to keep - default 16
+    '''
+    def __init__(self, max_running=None, max_finished=16):
+        if max_running is None:
+            max_running = int(os.environ.get('KAILO_REPORT_JOBS', 2))
+        self.max_finished = max_finished
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_running, thread_name_prefix='report_job')
+        self._jobs = OrderedDict()
+        self._jobs_by_key = dict()
+        self._lock = threading.Lock()
+
+    def submit(self, survey_type='standard', **report_args):
+        '''
+        Request a report, starting a new job if the same report hasn't already
+        been requested
+
+        Parameters
+        ----------
+        survey_type : string
+            Designates whether this is for 'standard' (default) or 'symbol'
+            survey
+        **report_args
+            Inputs to get_report_pdf() (such as chosen_school,
+            chosen_group, df_prop, counts, dem_prop and pdf_title)
+
+        Returns
+        -------
+        job_id : string
+            Identifier for the job
+        '''
+        key = report_job_key(survey_type, report_args)
+        with self._lock:
+            job = self._jobs_by_key.get(key)
+            if job is not None and job.status != 'failed':
+                return job.job_id
+
+        # Check the report cache (outside the lock, as it reads from disk)
+        pdf = report_disk_cache.get(report_cache_key(survey_type, report_args))
+
+        with self._lock:
+            # Another request for the same report may have been submitted
+            # while reading the cache
+            job = self._jobs_by_key.get(key)
+            if job is not None and job.status != 'failed':
+                return job.job_id
+
+            # If the report was in the report cache, the job is finished at
+            # once, else it is built in the background
+            job = ReportJob(uuid.uuid4().hex, key)
+            if pdf is not None:
+                job.pdf = pdf
+                job.status = 'done'
+                job.finished = time.time()
+            self._jobs[job.job_id] = job
+            self._jobs_by_key[key] = job
+            self._remove_finished()
+
+        if pdf is None:
+            self._executor.submit(self._run, job, survey_type, report_args)
+        return job.job_id
+
+    def get(self, job_id):
+        '''
+        Get a job
+
+        Parameters
+        ----------
+        job_id : string
+            Identifier for the job
+
+        Returns
+        -------
+        job : ReportJob
+            Copy of the job as it is now (which isn't updated), or None if it
+            wasn't found (or has been removed)
+        '''
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return copy.copy(job) if job is not None else None
+
+    def _run(self, job, survey_type, report_args):
+        '''
+        Build the report for a job, recording its progress and result
+        '''
+        def on_progress(sections_done, sections_total):
+            with self._lock:
+                job.sections_done = sections_done
+                job.sections_total = sections_total
+
+        with self._lock:
+            job.status = 'running'
+        try:
+            pdf, timings = get_report_pdf(
+                survey_type=survey_type, on_progress=on_progress,
+                **report_args)
+            with self._lock:
+                job.pdf, job.timings = pdf, timings
+                job.status = 'done'
+                job.finished = time.time()
+                self._remove_finished()
+        except Exception as err:
+            with self._lock:
+                job.error = repr(err)
+                job.status = 'failed'
+                job.finished = time.time()
+                self._remove_finished()
+
+    def _remove_finished(self):
+        '''
+        Remove the oldest finished jobs, if there are more than max_finished,
+        releasing their PDF. Must be called while holding the lock.
+        '''
+        finished = [job for job in self._jobs.values()
+                    if job.finished is not None]
+        for job in finished[:max(len(finished) - self.max_finished, 0)]:
+            del self._jobs[job.job_id]
+            if self._jobs_by_key.get(job.key) is job:
+                del self._jobs_by_key[job.key]
+            job.pdf = None
+
+
+@st.cache_resource(show_spinner=False)
+def get_report_jobs():
+    '''
+    Get the report job queue. This is cached, so it is shared by all sessions.
+
+    Returns
+    -------
+    jobs : ReportJobQueue
+        The shared job queue
+    '''
+    return ReportJobQueue()
+
+
+def report_job_download(job_id, file_name, poll_interval=1):
+    '''
+    Show the progress of a report job on the streamlit page, rerunning the
+    page every poll_interval seconds until it has finished, and then show a
+    button to download the report
+
+    Parameters
+    ----------
+    job_id : string
+        Identifier for the job, from get_report_jobs().submit()
+    file_name : string
+        Name for the downloaded file
+    poll_interval : float
+        Seconds to wait before rerunning the page to check progress
+
+    Returns
+    -------
+    job : ReportJob
+        The job, or None if it wasn't found
+    '''
+    job = get_report_jobs().get(job_id)
+    if job is None:
+        st.warning('Report not found - please try creating it again.')
+    elif job.status == 'done':
+        st.download_button(
+            label='Download report', data=job.pdf, file_name=file_name,
+            mime='application/pdf')
+    elif job.status == 'failed':
+        st.error('Sorry, there was a problem creating the report.')
+    else:
+        st.progress(job.progress(), text='Creating report...')
+        time.sleep(poll_interval)
+        st.rerun()
+    return job
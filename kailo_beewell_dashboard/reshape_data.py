@@ -2,53 +2,351 @@
 Helper functions for reshaping data or extracting a certain element from the
 data, often used across multiple different pages
 '''
+import hashlib
 import pandas as pd
 from ast import literal_eval
 import numpy as np
+import weakref
 
+# Columns that index_by_group() sorts and indexes the tables on (if present)
+GROUP_INDEX_COLS = ['school_lab', 'year_group_lab', 'gender_lab', 'fsm_lab',
+                    'sen_lab', 'variable', 'wave']
 
-def filter_by_group(df, chosen_group, output, chosen_school=None,
-                    chosen_variable=None, survey_type='standard'):
+# Information stored for dataframes by store_table_info() (e.g. indexes),
+# where key is the id() of the dataframe
+_table_info = dict()
+
+# Variables not shown on the summary page
+SUMMARY_EXCLUDE = ['birth_you_age_score', 'overall_count', 'staff_talk_score',
+                   'home_talk_score', 'peer_talk_score']
+
+# RAG ratings, in the order of their codes in the summary matrix
+SUMMARY_RAG = [np.nan, 'below', 'average', 'above']
+
+
+def store_table_info(df, name, value):
     '''
-    Filter dataframe so just contains rows relevant for chosen group (either
-    results from all pupils, or from the two chosen groups) and school
+    Store information about a dataframe (e.g. an index), which is kept until
+    the dataframe is deleted. The dataframe itself is unchanged.
 
     Parameters
     ----------
     df : dataframe
-        Dataframe to be filtered
+        Dataframe that the information is about
+    name : string
+        Name of the information (e.g. 'group_index')
+    value : any
+        The information to store
+    '''
+    # If nothing is stored for the dataframe yet, create a record, and remove
+    # it once the dataframe is deleted
+    info = _table_info.get(id(df))
+    if info is None or info['ref']() is not df:
+        info = {'ref': weakref.ref(df)}
+        _table_info[id(df)] = info
+        weakref.finalize(df, _table_info.pop, id(df), None)
+
+    # Store the value, alongside the signature of the dataframe at the time
+    info[name] = (value, table_signature(df))
+
+
+def get_table_info(df, name):
+    '''
+    Get information stored about a dataframe by store_table_info()
+
+    Parameters
+    ----------
+    df : dataframe
+        Dataframe that the information is about
+    name : string
+        Name of the information (e.g. 'group_index')
+
+    Returns
+    -------
+    value : any
+        The information, or None if nothing was stored (or the dataframe has
+        changed since it was stored - see table_signature())
+    '''
+    info = _table_info.get(id(df))
+    if info is None or info['ref']() is not df or name not in info:
+        return None
+    value, signature = info[name]
+    if signature != table_signature(df):
+        return None
+    return value
+
+
+def table_signature(df):
+    '''
+    Describe the shape of a dataframe, so get_table_info() can check that
+    information stored about it is still valid. This is the number of rows,
+    the column names, and which columns are read-only. Values in read-only
+    columns (see freeze_table()) can't be changed in place, and replacing the
+    column (e.g. df['col'] = ...) makes it writeable, so any change to the
+    data of a frozen dataframe changes its signature.
+
+    Parameters
+    ----------
+    df : dataframe
+        Dataframe to describe
+
+    Returns
+    -------
+    signature : tuple
+        Number of rows, the column names, and whether each column is read-only
+    '''
+    read_only = tuple(not values.to_numpy().flags.writeable
+                      for _, values in df.items())
+    return (len(df.index), tuple(df.columns), read_only)
+
+
+def freeze_table(df):
+    '''
+    Copy a dataframe with read-only values, so that information stored about
+    it by store_table_info() can't go out of date. Changing a value in place
+    (e.g. with df.loc) raises a ValueError, and adding, removing or replacing
+    columns is detected by get_table_info(). Columns with pandas extension
+    types (e.g. categorical) are copied but can't be made read-only.
+
+    Parameters
+    ----------
+    df : dataframe
+        Dataframe to freeze
+
+    Returns
+    -------
+    df : dataframe
+        Copy of the dataframe, with read-only values
+    '''
+    columns = dict()
+    for col in df.columns:
+        if isinstance(df[col].dtype, np.dtype):
+            values = df[col].to_numpy(copy=True)
+            values.flags.writeable = False
+        else:
+            values = df[col].array.copy()
+        columns[col] = values
+    return pd.DataFrame(columns, index=df.index, copy=False)
+
+
+def get_data_version(df):
+    '''
+    Get a token identifying the contents of a dataframe, so results derived
+    from it can be cached and reused until the data changes. The token is
+    stored using store_table_info(), so is only calculated once for each
+    dataframe (which should not be modified after).
+
+    Parameters
+    ----------
+    df : dataframe
+        Dataframe to get the version of
+
+    Returns
+    -------
+    data_version : string
+        Hash of the column names and contents of the dataframe
+    '''
+    data_version = get_table_info(df, 'data_version')
+    if data_version is None:
+        data_version = hash_rows(df)
+        store_table_info(df, 'data_version', data_version)
+    return data_version
+
+
+def hash_rows(df):
+    '''
+    Hash the column names and contents of a dataframe (or a subset of its
+    rows), ignoring the index
+
+    Parameters
+    ----------
+    df : dataframe
+        Dataframe to hash
+
+    Returns
+    -------
+    row_hash : string
+        Hash of the column names and contents of the dataframe
+    '''
+    row_hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    hasher = hashlib.sha1(row_hashes.tobytes())
+    hasher.update(repr(list(df.columns)).encode('utf-8'))
+    return hasher.hexdigest()
+
+
+def partition_by_school(df):
+    '''
+    Sort the dataframe so that the rows for each school are together, and
+    record where each school's rows start and end. This means that
+    get_school_partition() can return a school's rows as a slice of the
+    dataframe, rather than filtering the whole dataframe each time.
+
+    Parameters
+    ----------
+    df : dataframe
+        Dataframe with a 'school_lab' column
+
+    Returns
+    -------
+    df : dataframe
+        Dataframe sorted by school (with order otherwise unchanged) and a new
+        index, which is read-only (see freeze_table())
+    '''
+    df = freeze_table(
+        df.sort_values('school_lab', kind='stable').reset_index(drop=True))
+
+    # Find the positions where the school changes, and then the start and end
+    # of each school's rows (excluding rows with no school)
+    codes, uniques = pd.factorize(df['school_lab'])
+    changes = np.flatnonzero(codes[1:] != codes[:-1]) + 1
+    starts = np.concatenate([[0], changes])
+    stops = np.concatenate([changes, [len(codes)]])
+    partitions = {uniques[codes[start]]: (start, stop)
+                  for start, stop in zip(starts, stops) if codes[start] >= 0}
+    store_table_info(df, 'school_partitions', partitions)
+
+    return df
+
+
+def get_school_partition(df, school):
+    '''
+    Get the rows for a school. If the dataframe was partitioned using
+    partition_by_school(), this is a slice of the dataframe (and should not be
+    modified), else the dataframe is filtered to the school.
+
+    Parameters
+    ----------
+    df : dataframe
+        Dataframe with a 'school_lab' column
+    school : string
+        Name of the school
+
+    Returns
+    -------
+    school_df : dataframe
+        Rows for that school
+    '''
+    partitions = get_table_info(df, 'school_partitions')
+    if partitions is None:
+        return df[df['school_lab'] == school]
+    start, stop = partitions.get(school, (0, 0))
+    return df.iloc[start:stop]
+
+
+def index_by_group(df):
+    '''
+    Create an index for the dataframe, used by filter_by_group() to find rows
+    for a school, group and variable without filtering the whole dataframe.
+
+    Each row is given a single integer key combining its values in the
+    GROUP_INDEX_COLS, and the keys are sorted once. Rows for any combination of
+    values can then be found from the sorted keys with np.searchsorted(). The
+    index is stored using store_table_info(), so the dataframe itself is
+    unchanged, and should not be modified after it is indexed.
+
+    Parameters
+    ----------
+    df : dataframe
+        Dataframe to index (e.g. scores with RAG ratings, or responses)
+
+    Returns
+    -------
+    df : dataframe
+        The same dataframe, now indexed
+    '''
+    # Find the integer code for each value in each column (sorted, with NaN
+    # as 0), and combine the codes from each column into a single key
+    columns = [col for col in GROUP_INDEX_COLS if col in df.columns]
+    levels = dict()
+    keys = np.zeros(len(df.index), dtype=np.int64)
+    for col in columns:
+        codes, uniques = pd.factorize(df[col], sort=True)
+        levels[col] = pd.Index(uniques)
+        keys = keys * (len(uniques) + 1) + (codes + 1)
+
+    # Sort the keys, keeping the row positions so we can return to them
+    order = np.argsort(keys, kind='stable')
+
+    # Store the index
+    store_table_info(df, 'group_index', {
+        'levels': levels,
+        'keys': keys[order],
+        'order': order})
+
+    return df
+
+
+def lookup_group_index(group_index, values):
+    '''
+    Find the positions of rows matching the chosen values, using an index
+    created by index_by_group()
+
+    Parameters
+    ----------
+    group_index : dictionary
+        Index created by index_by_group(), from get_table_info()
+    values : dictionary
+        Dictionary where key is an indexed column and value is a list of the
+        values to keep. Any indexed columns not provided can have any value.
+
+    Returns
+    -------
+    positions : array
+        Positions of the matching rows, in their original order
+    '''
+    # Find keys for every combination of the chosen values
+    keys = np.zeros(1, dtype=np.int64)
+    for col, level in group_index['levels'].items():
+        if col in values:
+            codes = level.get_indexer(values[col])
+            codes = codes[codes >= 0] + 1
+        else:
+            codes = np.arange(len(level) + 1)
+        keys = (keys[:, None] * (len(level) + 1) + codes[None, :]).ravel()
+
+    # Find the range of the sorted keys that match each of those keys
+    starts = np.searchsorted(group_index['keys'], keys, side='left')
+    lengths = np.searchsorted(group_index['keys'], keys, side='right') - starts
+
+    # Get the positions from within those ranges, and return to original order
+    within = np.arange(lengths.sum()) - np.repeat(
+        np.cumsum(lengths) - lengths, lengths)
+    positions = group_index['order'][np.repeat(starts, lengths) + within]
+    return np.sort(positions)
+
+
+def get_group_values(chosen_group, survey_type='standard'):
+    '''
+    Find the values of each demographic column that are needed for the chosen
+    group (either results from all pupils, or from the chosen groups)
+
+    Parameters
+    ----------
     chosen_group : string
         The group for results to be viewed by - one of: 'For all pupils',
         'By year group', 'By gender', 'By FSM', or 'By SEN'
-    output : string
-        Defines where data will be used - either 'explore' or 'summary'
-    chosen_school : string
-        Optional input, name of a school to filter to as well
-    chosen_variable : string
-        Optional input, name of a variable to filter to as well
     survey_type : string
-        Designates whether this filtering is for 'standard' or 'symbol' survey
+        Designates whether this is for 'standard' or 'symbol' survey
 
     Returns
     -------
-    Depends on chosen output
+    group_values : dictionary
+        Dictionary where key is the demographic column and value is a list of
+        the values to keep (excluding sen_lab for the symbol survey)
+    group_lab : string
+        Name of the column that the chosen group is in, or None if for all
+        pupils
+    order : list
+        The values of the chosen group in the order they should be shown, or
+        None if for all pupils
     '''
     # Set default values
     year_group = ['All']
     gender = ['All']
     fsm = ['All']
     sen = ['All']
-
-    # These are default values that each page will need to avoid errors
-    # (explore uses it - it could use any of them - and summary doesn't)
-    if output == 'explore':
-        group_lab = 'year_group_lab'
-    elif output == 'summary':
-        group_lab = None
-        order = None
-    elif output == 'compare':
-        group_lab = 'year_group_lab'
-        order = ['All']
+    group_lab = None
+    order = None
 
     # Depending on chosen breakdown, alter one of the above variables
     # If the chosen group was All, then no changes are made, as this is default
@@ -73,21 +371,83 @@ def filter_by_group(df, chosen_group, output, chosen_school=None,
         sen = ['SEN', 'Non-SEN']
         order = ['SEN', 'Non-SEN']
 
-    # Filter to chosen group (exc. SEN filter for symbol survey)
-    chosen = df[
-        (df['year_group_lab'].isin(year_group)) &
-        (df['gender_lab'].isin(gender)) &
-        (df['fsm_lab'].isin(fsm))]
+    # Combine into dictionary (exc. SEN for symbol survey)
+    group_values = {'year_group_lab': year_group,
+                    'gender_lab': gender,
+                    'fsm_lab': fsm}
     if survey_type == 'standard':
-        chosen = chosen[chosen['sen_lab'].isin(sen)]
+        group_values['sen_lab'] = sen
 
-    # Filter to chosen school, if relevant
-    if chosen_school is not None:
-        chosen = chosen[chosen['school_lab'] == chosen_school]
+    return group_values, group_lab, order
 
-    # Filter to chosen variable, if relevant
+
+def filter_by_group(df, chosen_group, output, chosen_school=None,
+                    chosen_variable=None, survey_type='standard',
+                    chosen_wave=None):
+    '''
+    Filter dataframe so just contains rows relevant for chosen group (either
+    results from all pupils, or from the two chosen groups) and school
+
+    Parameters
+    ----------
+    df : dataframe
+        Dataframe to be filtered
+    chosen_group : string
+        The group for results to be viewed by - one of: 'For all pupils',
+        'By year group', 'By gender', 'By FSM', or 'By SEN'
+    output : string
+        Defines where data will be used - either 'explore' or 'summary'
+    chosen_school : string
+        Optional input, name of a school to filter to as well
+    chosen_variable : string
+        Optional input, name of a variable to filter to as well
+    survey_type : string
+        Designates whether this filtering is for 'standard' or 'symbol' survey
+    chosen_wave : string
+        Optional input, survey wave to filter to as well (e.g. '2023/24'), for
+        dataframes containing multiple waves in a 'wave' column
+
+    Returns
+    -------
+    Depends on chosen output
+    '''
+    # Find values for the chosen group
+    group_values, group_lab, order = get_group_values(
+        chosen_group, survey_type)
+
+    # If the chosen group was All, use default values that each page will
+    # need to avoid errors (explore uses it - it could use any of them - and
+    # summary doesn't)
+    if group_lab is None:
+        if output == 'explore':
+            group_lab = 'year_group_lab'
+        elif output == 'compare':
+            group_lab = 'year_group_lab'
+            order = ['All']
+
+    # Add the chosen school, variable and wave to the values to filter by
+    values = group_values.copy()
+    if chosen_school is not None:
+        values['school_lab'] = [chosen_school]
     if chosen_variable is not None:
-        chosen = chosen[chosen['variable'] == chosen_variable]
+        values['variable'] = [chosen_variable]
+    if chosen_wave is not None:
+        values['wave'] = [chosen_wave]
+
+    # If the dataframe was indexed using index_by_group(), find the rows from
+    # the index
+    group_index = get_table_info(df, 'group_index')
+    if (group_index is not None and
+            all(col in group_index['levels'] for col in values.keys())):
+        chosen = df.iloc[lookup_group_index(group_index, values)]
+
+    # Otherwise, filter to chosen group (exc. SEN filter for symbol survey),
+    # and school, variable and wave if relevant
+    else:
+        mask = True
+        for col, col_values in values.items():
+            mask &= df[col].isin(col_values)
+        chosen = df[mask]
 
     # Return the relevant results for the given output
     if output == 'explore':
@@ -98,6 +458,184 @@ def filter_by_group(df, chosen_group, output, chosen_school=None,
         return chosen, group_lab, order
 
 
+def index_summary_rag(df, survey_type='standard'):
+    '''
+    Create the summary matrix of RAG ratings for every school (and wave, if
+    the dataframe has a 'wave' column) - with a row for each topic, and a
+    column for all pupils and each pupil group. These are coded as integers,
+    with the code being the position of the rating in SUMMARY_RAG (so 0 is
+    np.nan). The matrices are stored using store_table_info() and used by
+    get_summary_rag(), so the summary page can be produced without filtering
+    or pivoting the dataframe each time.
+
+    Parameters
+    ----------
+    df : dataframe
+        Dataframe containing the RAG ratings for each topic for each school
+    survey_type : string
+        Designates whether this is for 'standard' or 'symbol' survey
+
+    Returns
+    -------
+    df : dataframe
+        The same dataframe, now with summary matrices
+    '''
+    # Remove variables that are not shown on the summary page
+    df_summary = df[~df['variable'].isin(SUMMARY_EXCLUDE)]
+
+    # Find the column of the matrix for each row - 0 if row is for all pupils,
+    # or position of that group in the columns. Rows from other combinations
+    # of groups are left as -1 and not included
+    group_values, _, _ = get_group_values('For all pupils', survey_type)
+    group_cols = list(group_values.keys())
+    not_all = (df_summary[group_cols] != 'All').to_numpy()
+    col_codes = np.where(not_all.sum(axis=1) == 0, 0, -1)
+    columns = {'For all pupils': ['All pupils']}
+    n_col = 1
+    for chosen_group in ['By year group', 'By gender', 'By FSM', 'By SEN']:
+        _, group_lab, order = get_group_values(chosen_group, survey_type)
+        if group_lab not in group_cols:
+            continue
+        codes = pd.Categorical(df_summary[group_lab], categories=order).codes
+        only_group = (not_all.sum(axis=1) == 1) & (codes >= 0)
+        col_codes[only_group] = n_col + codes[only_group]
+        columns[chosen_group] = order
+        n_col += len(order)
+    keep = col_codes >= 0
+
+    # Find codes for the school and wave (so results from different waves
+    # are kept in separate matrices), topic (in order they appear) and RAG
+    # rating
+    if 'wave' in df_summary.columns:
+        waves = df_summary['wave']
+    else:
+        waves = pd.Series(None, index=df_summary.index, dtype=object)
+    school_codes, schools = pd.MultiIndex.from_arrays(
+        [df_summary['school_lab'], waves]).factorize()
+    topic_codes, topics = pd.factorize(df_summary['variable_lab'])
+    rag_codes = pd.Categorical(
+        df_summary['rag'], categories=SUMMARY_RAG[1:]).codes + 1
+
+    # Fill matrix for all schools at once, recording which topics each has
+    rag = np.zeros((len(schools), len(topics), n_col), dtype=np.int8)
+    rag[school_codes[keep], topic_codes[keep], col_codes[keep]] = (
+        rag_codes[keep])
+    present = np.zeros((len(schools), len(topics)), dtype=bool)
+    present[school_codes[keep], topic_codes[keep]] = True
+
+    # Find the columns for each group
+    group_slices = dict()
+    start = 0
+    for chosen_group, order in columns.items():
+        group_slices[chosen_group] = (order, slice(start, start + len(order)))
+        start += len(order)
+
+    # Store matrix for each school and wave (None if there is no wave), and
+    # the latest wave for each school (used if no wave is chosen)
+    matrices = dict()
+    latest_wave = dict()
+    for i, (school, wave) in enumerate(schools):
+        wave = None if pd.isna(wave) else wave
+        matrices[(school, wave)] = (np.asarray(topics)[present[i]],
+                                    rag[i][present[i]])
+        if (school not in latest_wave or latest_wave[school] is None or
+                (wave is not None and wave > latest_wave[school])):
+            latest_wave[school] = wave
+
+    store_table_info(df, 'summary_rag', {'columns': group_slices,
+                                         'matrices': matrices,
+                                         'latest_wave': latest_wave})
+
+    return df
+
+
+def get_summary_rag(df, chosen_school, chosen_group, survey_type='standard',
+                    chosen_wave=None):
+    '''
+    Get the summary matrix of RAG ratings for a school and group, creating
+    the matrices using index_summary_rag() if not already done
+
+    Parameters
+    ----------
+    df : dataframe
+        Dataframe containing the RAG ratings for each topic for each school
+    chosen_school : string
+        Name of chosen school
+    chosen_group : string
+        The group for results to be viewed by - one of: 'For all pupils',
+        'By year group', 'By gender', 'By FSM', or 'By SEN'
+    survey_type : string
+        Designates whether this is for 'standard' or 'symbol' survey
+    chosen_wave : string
+        Optional input, wave to get the ratings for (e.g. '2024/25'), if the
+        dataframe has a 'wave' column. Default is None, which uses the school's
+        latest wave.
+
+    Returns
+    -------
+    topics : array
+        Label for each topic, in the order they should be shown
+    headings : list
+        Heading for each column of RAG ratings
+    rag : array
+        Integer array with a row for each topic and column for each heading,
+        where values are the position of the RAG rating in SUMMARY_RAG
+    '''
+    summary_rag = get_table_info(df, 'summary_rag')
+    if summary_rag is None:
+        index_summary_rag(df, survey_type)
+        summary_rag = get_table_info(df, 'summary_rag')
+    headings, cols = summary_rag['columns'][chosen_group]
+    if chosen_wave is None:
+        chosen_wave = summary_rag['latest_wave'].get(chosen_school)
+    topics, rag = summary_rag['matrices'].get(
+        (chosen_school, chosen_wave),
+        (np.array([], dtype=object), np.zeros((0, cols.stop), dtype=np.int8)))
+    return topics, headings, rag[:, cols]
+
+
+def prepare_table(key, df, survey_type='standard'):
+    '''
+    Partition and index one of the dashboard datasets, as needed by the
+    functions which use it. The table is partitioned by school so each
+    session can use a slice with its own school's rows, the tables that are
+    filtered by filter_by_group() are indexed, the summary matrices of RAG
+    ratings are created for the scores, and the version of each dataset is
+    found (used to cache results derived from them). For the symbol survey,
+    the columns that the charts group results by are added to the responses
+    ('group') and demographic ('plot_group') tables, as the prepared tables
+    are shared and can't be changed after.
+
+    Parameters
+    ----------
+    key : string
+        Name of the dataset - 'scores_rag', 'responses', 'counts' or
+        'demographic'
+    df : dataframe
+        The dataset
+    survey_type : string
+        Designates whether this is for 'standard' or 'symbol' survey
+
+    Returns
+    -------
+    df : dataframe
+        The partitioned and indexed dataset, which is read-only (add columns
+        to a copy instead)
+    '''
+    if survey_type == 'symbol':
+        if key == 'responses' and 'group' not in df.columns:
+            df = df.assign(group='symbol')
+        elif key == 'demographic' and 'plot_group' not in df.columns:
+            df = df.assign(plot_group=df['measure'])
+    df = partition_by_school(df)
+    if key in ['scores_rag', 'responses']:
+        df = index_by_group(df)
+    if key == 'scores_rag':
+        df = index_summary_rag(df, survey_type)
+    get_data_version(df)
+    return df
+
+
 def extract_nested_results(chosen, group_lab=None, plot_group=False):
     '''
     Extract lists of results that were stored in dataframe.
@@ -160,7 +698,7 @@ def extract_nested_results(chosen, group_lab=None, plot_group=False):
     return chosen_result
 
 
-def get_school_size(counts, school, survey_type='standard'):
+def get_school_size(counts, school, survey_type='standard', wave=None):
     '''
     Get the total pupil number for a given school
 
@@ -172,6 +710,9 @@ def get_school_size(counts, school, survey_type='standard'):
         Name of the school
     survey_type : string
         Designates whether this filtering is for 'standard' or 'symbol' survey
+    wave : string
+        Optional input, survey wave (e.g. '2023/24'), for dataframes containing
+        multiple waves in a 'wave' column
 
     Returns
     -------
@@ -179,7 +720,7 @@ def get_school_size(counts, school, survey_type='standard'):
         Total number of pupils at school (who answered at least one question)
     '''
     # Filter to relevant school
-    school_counts = counts.loc[counts['school_lab'] == school]
+    school_counts = get_school_partition(counts, school)
 
     # Find total school size
     df = school_counts[(school_counts['year_group_lab'] == 'All') &
@@ -187,6 +728,98 @@ def get_school_size(counts, school, survey_type='standard'):
                        (school_counts['fsm_lab'] == 'All')]
     if survey_type == 'standard':
         df = df[df['sen_lab'] == 'All']
+    if wave is not None:
+        df = df[df['wave'] == wave]
     school_size = df['count'].values[0].astype(int)
 
     return school_size
+
+
+def index_score_trends(trends):
+    '''
+    Index the score trends by school, pupil group, topic and wave, so that
+    results for a given school, group and topic can be looked up from the
+    sorted index by get_score_trend(), rather than filtering the whole
+    dataframe.
+
+    Parameters
+    ----------
+    trends : dataframe
+        Output of calculate_score_trends()
+
+    Returns
+    -------
+    trends : dataframe
+        Score trends with sorted MultiIndex
+    '''
+    index_cols = [col for col in ['school_lab', 'year_group_lab', 'gender_lab',
+                                  'fsm_lab', 'sen_lab', 'variable', 'wave']
+                  if col in trends.columns]
+    return trends.set_index(index_cols).sort_index()
+
+
+def get_score_trend(trends, chosen_school, chosen_group, chosen_variable,
+                    survey_type='standard', chosen_wave=None):
+    '''
+    Get the change in score since the previous wave for the chosen school,
+    group and topic
+
+    Parameters
+    ----------
+    trends : dataframe
+        Output of index_score_trends()
+    chosen_school : string
+        Name of the school
+    chosen_group : string
+        The group for results to be viewed by - one of: 'For all pupils',
+        'By year group', 'By gender', 'By FSM', or 'By SEN'
+    chosen_variable : string
+        Name of the topic (e.g. 'autonomy_score')
+    survey_type : string
+        Designates whether this is for 'standard' or 'symbol' survey
+    chosen_wave : string
+        Optional input, wave to get the change for (e.g. '2024/25'). Default
+        is None, which uses the latest wave.
+
+    Returns
+    -------
+    trend : dataframe or None
+        Row for each of the groups (in order), with the wave, mean, RAG, and
+        the previous wave, mean, RAG and change in mean since then. Returns
+        None if there are no results for the school and topic (for example,
+        if the school has not taken part in the chosen wave).
+    '''
+    # Find values for the chosen group
+    group_values, group_lab, order = get_group_values(
+        chosen_group, survey_type)
+    if group_lab is None:
+        group_lab = 'year_group_lab'
+        order = ['All']
+
+    # Look up results from the sorted index (which is ordered by school,
+    # groups, variable then wave). Groups and waves without results are
+    # dropped from the key, as looking up a missing label raises a KeyError
+    if chosen_wave is None:
+        wave = slice(None)
+    else:
+        wave = [chosen_wave]
+    key = [[value for value in values if value in level]
+           if isinstance(values, list) else values
+           for values, level in zip(
+               (chosen_school, *group_values.values(), chosen_variable, wave),
+               trends.index.levels)]
+    if any(values == [] for values in key):
+        return None
+    try:
+        trend = trends.loc[tuple(key), :]
+    except KeyError:
+        return None
+    if trend.empty:
+        return None
+    trend = trend.reset_index()
+
+    # For each group, keep the latest wave (or the chosen wave), in order
+    trend = (trend.groupby(group_lab).tail(1)
+             .set_index(group_lab).reindex(order).reset_index())
+
+    return trend
@@ -442,6 +442,69 @@ def create_response_label_dict():
     return labels
 
 
+def create_branching_dict():
+    '''
+    Creates dictionary describing the branching questions in the standard
+    #BeeWell survey, which pupils were only asked depending on their answer to
+    a previous (parent) question. For talking about feelings, pupils who
+    talked with someone (1) were asked whether they listened and whether it
+    was helpful, and pupils who didn't (0) were asked if they would talk.
+
+    Returns
+    -------
+    branching : dictionary
+        Dictionary where key is the suffix of the branching question, and value
+        is a tuple with the suffix of the parent question and the answer to the
+        parent question that leads to the branching question.
+    '''
+    branching = {
+        'talk_listen': ('talk', 1),
+        'talk_helpful': ('talk', 1),
+        'talk_if': ('talk', 0)
+    }
+    return branching
+
+
+def create_branch_map(labels, branching=None):
+    '''
+    Creates a map of each branching question to its parent question and the
+    parent answer, using the questions in the label dictionary. This means
+    the branching questions only need to be identified once, rather than each
+    time the responses are aggregated.
+
+    Parameters
+    ----------
+    labels : dictionary
+        Dictionary with all possible questions as keys (e.g. output of
+        create_response_label_dict())
+    branching : dictionary
+        Optional input, dictionary describing the branching questions for the
+        survey (see create_branching_dict()). Default is None, which uses the
+        branching questions from the standard survey.
+
+    Returns
+    -------
+    branch_map : dictionary
+        Dictionary where key is a branching question (e.g. 'staff_talk_if')
+        and value is a tuple with the parent question and parent answer
+        (e.g. ('staff_talk', 0))
+    '''
+    if branching is None:
+        branching = create_branching_dict()
+
+    # Find each question which ends with a branching suffix, and where the
+    # parent question (with the same prefix) is also in the labels
+    branch_map = {}
+    for question in labels.keys():
+        for suffix, (parent_suffix, parent_value) in branching.items():
+            if question.endswith(f'_{suffix}'):
+                parent = question[:-len(suffix)] + parent_suffix
+                if parent in labels:
+                    branch_map[question] = (parent, parent_value)
+
+    return branch_map
+
+
 def create_symbol_response_label_dict():
     '''
     Creates dictionary with labels for each response in each question in the
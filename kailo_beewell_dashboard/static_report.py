@@ -2,12 +2,15 @@
 Function to generate a non-interactive PDF version of the dashboard as a
 temporary file that can then be downloaded from the dashboard
 '''
-import base64
-from .images import get_image_path
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
+from .images import get_image_src, get_plotlyjs
 from importlib.resources import files
 from markdown import markdown
 import os
-from .reshape_data import get_school_size
+import threading
+from .report_cache import cached_section
+from .reshape_data import get_school_partition, get_school_size
 from .reuse_text import reuse_text, caution_comparing
 from .summary_rag import summary_intro, summary_table
 from .explore_results import (
@@ -21,42 +24,117 @@ from .who_took_part import (
     demographic_headers,
     demographic_plots)
 
+# Groups that the standard survey reports are produced for
+REPORT_GROUPS = ['For all pupils', 'By year group', 'By gender', 'By FSM',
+                 'By SEN']
 
-def logo_html():
+# Thread pool used by iter_sections(), created on first use
+_section_executor = None
+_section_lock = threading.Lock()
+
+
+def get_section_executor():
+    '''
+    Get the thread pool shared by the whole process that is used to create
+    the sections of the reports, creating it if this is the first use. The
+    number of threads is the KAILO_REPORT_THREADS environment variable, or 4
+    if that isn't set.
+
+    Returns
+    -------
+    executor : ThreadPoolExecutor
+        The shared thread pool
+    '''
+    global _section_executor
+    with _section_lock:
+        if _section_executor is None:
+            _section_executor = ThreadPoolExecutor(
+                max_workers=int(os.environ.get('KAILO_REPORT_THREADS', 4)),
+                thread_name_prefix='report_section')
+        return _section_executor
+
+
+def iter_sections(section_funcs, on_progress=None):
+    '''
+    Create sections of a report at the same time, using the shared thread
+    pool, and return their HTML in the order the sections were provided. The
+    sections are independent, and most of the time creating them is spent
+    waiting for the figures to be rendered, so each can be rendered while
+    others are being built. The sections are started when this is called, and
+    each section's HTML is released once it has been returned.
+
+    Parameters
+    ----------
+    section_funcs : list
+        Functions with no inputs which each return a list with the HTML
+        content of a section
+    on_progress : function
+        Optional input, function called with the number of sections returned
+        so far and the total number of sections, after each section
+
+    Returns
+    -------
+    content : generator
+        Generator with the HTML content of all of the sections, in order
+    '''
+    executor = get_section_executor()
+    futures = [executor.submit(func) for func in section_funcs]
+
+    def section_content():
+        total = len(futures)
+        while futures:
+            yield from futures.pop(0).result()
+            if on_progress is not None:
+                on_progress(total - len(futures), total)
+
+    return section_content()
+
+
+def logo_html(image_urls='data'):
     '''
     Generates HTML string to create logo as displayed on cover page of reports.
 
+    Parameters
+    ----------
+    image_urls : string
+        Either 'data' (default), to include the encoded image in the HTML, or
+        'file', to refer to the image file - see get_image_src()
+
     Returns
     -------
     img_tag : string
         HTML to generate the logo
     '''
-    # Encode image
-    img_path = get_image_path('kailo_beewell_logo_padded.png')
-    data_uri = base64.b64encode(open(img_path, 'rb').read()).decode('utf-8')
+    # Get image (encoded once per process)
+    src = get_image_src('kailo_beewell_logo_padded.png', image_urls)
     # Insert into HTML image tag
     img_tag = f'''
-<img src='data:image/png;base64,{data_uri}' alt='Kailo #BeeWell logo'
+<img src='{src}' alt='Kailo #BeeWell logo'
 style='width:300px; height:182px;'>'''
     return img_tag
 
 
-def illustration_html():
+def illustration_html(image_urls='data'):
     '''
     Generates DIV element containing illustration as displayed on cover page of
     reports.
 
+    Parameters
+    ----------
+    image_urls : string
+        Either 'data' (default), to include the encoded image in the HTML, or
+        'file', to refer to the image file - see get_image_src()
+
     Returns
     -------
     illustration : string
         HTML to generate div containing the illustration
     '''
-    # Encode image
-    img_path = get_image_path('home_image_3_transparent.png')
-    data_uri = base64.b64encode(open(img_path, 'rb').read()).decode('utf-8')
+    # Get image (encoded once per process)
+    src = get_image_src('home_image_3_transparent.png', image_urls)
     # Insert into HTML image tag
     img_tag = f'''
-<img src='data:image/png;base64,{data_uri}' alt='Kailo illustration'
+<img src='{src}' alt='Kailo illustration'
 style='width:650px; height:192px;'>'''
     # Insert into div
     illustration = f'''
@@ -66,55 +144,165 @@ style='width:650px; height:192px;'>'''
     return illustration
 
 
-def structure_report(pdf_title, content):
+@lru_cache
+def get_report_css():
     '''
-    Inserts the provided HTML into the structure of the report - PDF title,
-    importing and reading the CSS style, and inserting the content of report
+    Import the CSS stylesheet for the reports. This is cached, so the file is
+    only read once per process.
+
+    Returns
+    -------
+    css_style : string
+        Contents of the stylesheet
+    '''
+    css_path = str(files('kailo_beewell_dashboard')
+                   .joinpath('css/static_report_style.css'))
+    with open(css_path) as css:
+        css_style = css.read()
+    return css_style
+
+
+def report_head(pdf_title, inline_css=True, include_plotlyjs=False):
+    '''
+    Create the start of the HTML report, up to the start of the content -
+    character encoding (UTF-8, as the report is written with that encoding),
+    PDF title, and importing and reading the CSS style
 
     Parameters
     ----------
     pdf_title : string
         Title for the pdf file
-    content : string
-        HTML content of the report
+    inline_css : boolean
+        Whether to include the CSS stylesheet in the HTML - default True. Set
+        to False when the stylesheet is provided to WeasyPrint seperately (as
+        in html_to_pdf()).
+    include_plotlyjs : boolean
+        Whether to include plotly.js in the HTML, which is needed to draw the
+        charts when chart_format is 'plotly' - default False
 
     Returns
     -------
-    html_content : string
-        HTML to produce the styled report
+    html_head : string
+        Start of the HTML report
     '''
     # Remove the final temporary image file
     if os.path.exists('report/temp_image.png'):
         os.remove('report/temp_image.png')
 
     # Import the CSS stylesheet
-    css_path = str(files('kailo_beewell_dashboard')
-                   .joinpath('css/static_report_style.css'))
-    with open(css_path) as css:
-        css_style = css.read()
+    if inline_css:
+        style = f'''
+    <style>
+        {get_report_css()}
+    </style>'''
+    else:
+        style = ''
 
-    html_content = f'''
+    # Include plotly.js once, for all of the charts
+    if include_plotlyjs:
+        style += f'''
+    <script>{get_plotlyjs()}</script>'''
+
+    html_head = f'''
 <!DOCTYPE html>
 <html>
 <head>
-    <title>{pdf_title}</title>
-    <style>
-        {css_style}
-    </style>
+    <meta charset='utf-8'>
+    <title>{pdf_title}</title>{style}
 </head>
 <body>
-    {''.join(content)}
+    '''
+    return html_head
+
+
+def report_tail():
+    '''
+    Create the end of the HTML report, after the content
+
+    Returns
+    -------
+    html_tail : string
+        End of the HTML report
+    '''
+    return '''
 </body>
 </html>
 '''
+
+
+def structure_report(pdf_title, content, inline_css=True):
+    '''
+    Inserts the provided HTML into the structure of the report - PDF title,
+    importing and reading the CSS style, and inserting the content of report
+
+    Parameters
+    ----------
+    pdf_title : string
+        Title for the pdf file
+    content : string
+        HTML content of the report
+    inline_css : boolean
+        Whether to include the CSS stylesheet in the HTML - default True. Set
+        to False when the stylesheet is provided to WeasyPrint seperately (as
+        in html_to_pdf()).
+
+    Returns
+    -------
+    html_content : string
+        HTML to produce the styled report
+    '''
+    html_content = (report_head(pdf_title, inline_css) + ''.join(content) +
+                    report_tail())
     return html_content
 
 
+def write_report(chunks, target):
+    '''
+    Write a report to a file as it is created, from the HTML chunks returned
+    by generate_static_report() or generate_static_symbol_report(), so the
+    whole report is never held in memory at once
+
+    Parameters
+    ----------
+    chunks : iterable
+        HTML content of the report, in order
+    target : string or file object
+        Path of the file to write to, or an open text file or stream
+    '''
+    if isinstance(target, (str, os.PathLike)):
+        with open(target, 'w', encoding='utf-8') as f:
+            write_report(chunks, f)
+        return
+    for chunk in chunks:
+        target.write(chunk)
+
+
 def create_static_report(chosen_school, chosen_group, df_scores, df_prop,
-                         counts, dem_prop, pdf_title):
+                         counts, dem_prop, pdf_title, chart_format='png',
+                         image_urls='data', inline_css=True):
+    '''
+    Generate a static PDF report for the chosen school and group, with all
+    the key information and figures from the dashboard, as a single string.
+    The inputs are as for generate_static_report().
+
+    Returns
+    -------
+    html_content : string
+        HTML to produce the styled report
+    '''
+    return ''.join(generate_static_report(
+        chosen_school, chosen_group, df_scores, df_prop, counts, dem_prop,
+        pdf_title, chart_format, image_urls, inline_css))
+
+
+def generate_static_report(
+        chosen_school, chosen_group, df_scores, df_prop, counts, dem_prop,
+        pdf_title, chart_format='png', image_urls='data', inline_css=True,
+        on_progress=None):
     '''
     Generate a static PDF report for the chosen school and group, with all
-    the key information and figures from the dashboard
+    the key information and figures from the dashboard, returning the HTML in
+    chunks (in order) as it is created
 
     Parameters
     ----------
@@ -133,6 +321,24 @@ def create_static_report(chosen_school, chosen_group, df_scores, df_prop,
         Dataframe with proportion of each reponse to the demographic questions
     pdf_title : string
         Title for the PDF file
+    chart_format : string
+        Format of the charts - either 'png' (default), 'svg' (which are
+        drawn without kaleido) or 'plotly' (which are drawn by plotly.js when
+        the HTML is opened, so can't be converted to PDF)
+    image_urls : string
+        Whether to include the logo and illustration in the HTML ('data',
+        default) or refer to the image files ('file')
+    inline_css : boolean
+        Whether to include the CSS stylesheet in the HTML - default True
+    on_progress : function
+        Optional input, function called with the number of sections (topic
+        or group pages, and the who took part section) completed so far and
+        the total number of sections, after each section
+
+    Yields
+    ------
+    chunk : string
+        HTML content of the report, in order
     '''
     ##########
     # Set-up #
@@ -155,7 +361,7 @@ def create_static_report(chosen_school, chosen_group, df_scores, df_prop,
     ##############
 
     # Add logo
-    content.append(logo_html())
+    content.append(logo_html(image_urls))
 
     # Get group name with only first character modified to lower case
     group_lower_first = chosen_group[0].lower() + chosen_group[1:]
@@ -179,7 +385,7 @@ def create_static_report(chosen_school, chosen_group, df_scores, df_prop,
     content.append(title_page)
 
     # Add illustration
-    content.append(illustration_html())
+    content.append(illustration_html(image_urls))
 
     ################
     # Introduction #
@@ -240,12 +446,19 @@ def create_static_report(chosen_school, chosen_group, df_scores, df_prop,
     # Summary page #
     ################
 
-    # Summary cover page with guide to RAG ratings
-    content.append(summary_intro(school_size, 'pdf'))
+    # Summary cover page with guide to RAG ratings (reused from the section
+    # cache if the inputs are unchanged, as are all of the sections below)
+    content.extend(cached_section(
+        'summary_intro', [school_size],
+        lambda: [summary_intro(school_size, 'pdf')]))
 
     # Summary grid with RAG ratings for each topic
-    content = summary_table(
-        df_scores, chosen_group, chosen_school, 'pdf', content)
+    content.extend(cached_section(
+        'summary_table',
+        [get_school_partition(df_scores, chosen_school), chosen_school,
+         chosen_group],
+        partial(summary_table, df_scores, chosen_group, chosen_school, 'pdf',
+                [])))
 
     ###########################
     # Explore results section #
@@ -254,39 +467,87 @@ def create_static_report(chosen_school, chosen_group, df_scores, df_prop,
     # Create cover page with title and introduction
     content.append(write_page_title(output='pdf'))
 
-    # Create pages for all of the topics
-    for chosen_variable_lab in topic_dict.keys():
-        content = create_explore_topic_page(
-            chosen_variable_lab, topic_dict, df_scores, chosen_school,
-            chosen_group, df_prop, content)
+    # Create pages for all of the topics, with the pages for each topic
+    # created at the same time (as are the pages for the who took part
+    # section), and added in order
+    def explore_topic(chosen_variable_lab):
+        # Find the rows used by the topic page - the scores for every school
+        # (which are compared), and the school's responses
+        chosen_variable = topic_dict[chosen_variable_lab]
+        topic_scores = df_scores[
+            df_scores['variable'] == f'{chosen_variable}_score']
+        school_prop = get_school_partition(df_prop, chosen_school)
+        topic_prop = school_prop[school_prop['group'] == chosen_variable]
+        return cached_section(
+            'explore_topic_page',
+            [topic_scores, topic_prop, chosen_variable_lab, chosen_school,
+             chosen_group, chart_format],
+            partial(create_explore_topic_page, chosen_variable_lab,
+                    topic_dict, df_scores, chosen_school, chosen_group,
+                    df_prop, [], chart_format))
+
+    sections = [partial(explore_topic, chosen_variable_lab)
+                for chosen_variable_lab in topic_dict.keys()]
 
     #########################
     # Who took part section #
     #########################
 
-    # Create cover page with title and introduction
-    content.append(create_demographic_page_intro(school_size, 'pdf'))
-
-    # Create pages with plots for each measure
-    content = demographic_plots(
-        dem_prop=dem_prop, chosen_school=chosen_school,
-        chosen_group='Compared with other schools in Northern Devon',
-        output='pdf', content=content)
+    # Create cover page with title and introduction, and pages with plots for
+    # each measure
+    def who_took_part():
+        return demographic_plots(
+            dem_prop=dem_prop, chosen_school=chosen_school,
+            chosen_group='Compared with other schools in Northern Devon',
+            output='pdf',
+            content=[create_demographic_page_intro(school_size, 'pdf')],
+            chart_format=chart_format)
+    sections.append(partial(
+        cached_section, 'demographic_plots',
+        [get_school_partition(dem_prop, chosen_school), school_size,
+         chosen_school, 'standard', chart_format],
+        who_took_part))
+    section_content = iter_sections(sections, on_progress)
 
     ######################
     # Create HTML report #
     ######################
 
-    html_content = structure_report(pdf_title, content)
-
-    return html_content
+    # Return the start of the report and the pages created so far, then the
+    # pages from each section as they are completed
+    yield report_head(pdf_title, inline_css,
+                      include_plotlyjs=(chart_format == 'plotly'))
+    yield from content
+    yield from section_content
+    yield report_tail()
 
 
 def create_static_symbol_report(
-        chosen_school,  df_prop, counts, dem_prop, pdf_title):
+        chosen_school,  df_prop, counts, dem_prop, pdf_title,
+        chart_format='png', image_urls='data', inline_css=True):
+    '''
+    Generate a static symbol survey PDF report for the chosen school and group,
+    with all the key information and figures from the dashboard, as a single
+    string. The inputs are as for generate_static_symbol_report().
+
+    Returns
+    -------
+    html_content : string
+        HTML to produce the styled report
+    '''
+    return ''.join(generate_static_symbol_report(
+        chosen_school, df_prop, counts, dem_prop, pdf_title, chart_format,
+        image_urls, inline_css))
+
+
+def generate_static_symbol_report(
+        chosen_school,  df_prop, counts, dem_prop, pdf_title,
+        chart_format='png', image_urls='data', inline_css=True,
+        on_progress=None):
     '''
     Generate a static symbol survey PDF report for the chosen school and group,
-    with all the key information and figures from the dashboard
+    with all the key information and figures from the dashboard, returning
+    the HTML in chunks (in order) as it is created
 
     Parameters
     ----------
@@ -300,6 +561,24 @@ def create_static_symbol_report(
         Dataframe with proportion of each reponse to the demographic questions
     pdf_title : string
         Title for the PDF file
+    chart_format : string
+        Format of the charts - either 'png' (default), 'svg' (which are
+        drawn without kaleido) or 'plotly' (which are drawn by plotly.js when
+        the HTML is opened, so can't be converted to PDF)
+    image_urls : string
+        Whether to include the logo and illustration in the HTML ('data',
+        default) or refer to the image files ('file')
+    inline_css : boolean
+        Whether to include the CSS stylesheet in the HTML - default True
+    on_progress : function
+        Optional input, function called with the number of sections (topic
+        or group pages, and the who took part section) completed so far and
+        the total number of sections, after each section
+
+    Yields
+    ------
+    chunk : string
+        HTML content of the report, in order
     '''
     ##########
     # Set-up #
@@ -321,7 +600,7 @@ def create_static_symbol_report(
     ##############
 
     # Add logo
-    content.append(logo_html())
+    content.append(logo_html(image_urls))
 
     # Title and introduction
     title_page = f'''
@@ -338,7 +617,7 @@ def create_static_symbol_report(
     content.append(title_page)
 
     # Add illustration
-    content.append(illustration_html())
+    content.append(illustration_html(image_urls))
 
     ################
     # Introduction #
@@ -387,40 +666,103 @@ def create_static_symbol_report(
     # Create cover page with title and introduction
     content.append(write_page_title(output='pdf', survey_type='symbol'))
 
-    # Create pages with plots for each measure
+    # Create pages with plots for each group, with the pages for each group
+    # created at the same time (as are the pages for the who took part
+    # section), and added in order. The results all belong to one group,
+    # which prepare_table() adds as a column - if the tables weren't prepared,
+    # it is added to a copy (as the tables are shared)
     chosen_variable = 'symbol'
-    df_prop['group'] = chosen_variable
-    for key, value in survey_groups.items():
+    if 'group' not in df_prop.columns:
+        df_prop = df_prop.assign(group=chosen_variable)
+
+    def explore_group(key, value):
         # Add title for that group
-        content.append(f'''
+        group_content = [f'''
 <h2 id='{key}'; style='page-break-before:always;'>Explore
-results {value[0].lower() + value[1:]}</h2>''')
+results {value[0].lower() + value[1:]}</h2>''']
         # Get results for that school and group
         chosen_result = get_chosen_result(
             chosen_variable, chosen_group=value, df=df_prop,
             school=chosen_school, survey_type='symbol')
         # Add bar charts to the HTML
-        content = create_bar_charts(
-            chosen_variable, chosen_result, output='pdf', content=content)
+        return create_bar_charts(
+            chosen_variable, chosen_result, output='pdf',
+            content=group_content, chart_format=chart_format)
+
+    school_prop = get_school_partition(df_prop, chosen_school)
+    sections = [
+        partial(cached_section, 'explore_group',
+                [school_prop, key, value, chosen_school, chart_format],
+                partial(explore_group, key, value))
+        for key, value in survey_groups.items()]
 
     #########################
     # Who took part section #
     #########################
 
-    # Create cover page with title and introduction
-    content.append(create_demographic_page_intro(school_size, 'pdf'))
-
-    # Create pages with plots for each measure
-    dem_prop['plot_group'] = dem_prop['measure']
-    content = demographic_plots(
-        dem_prop=dem_prop, chosen_school=chosen_school,
-        chosen_group='For your school', output='pdf', content=content,
-        survey_type='symbol')
+    # Create cover page with title and introduction, and pages with plots for
+    # each measure (with a plot for each measure, added to a copy of the
+    # table if it wasn't prepared by prepare_table())
+    if 'plot_group' not in dem_prop.columns:
+        dem_prop = dem_prop.assign(plot_group=dem_prop['measure'])
+
+    def who_took_part():
+        return demographic_plots(
+            dem_prop=dem_prop, chosen_school=chosen_school,
+            chosen_group='For your school', output='pdf',
+            content=[create_demographic_page_intro(school_size, 'pdf')],
+            survey_type='symbol', chart_format=chart_format)
+    sections.append(partial(
+        cached_section, 'demographic_plots',
+        [get_school_partition(dem_prop, chosen_school), school_size,
+         chosen_school, 'symbol', chart_format],
+        who_took_part))
+    section_content = iter_sections(sections, on_progress)
 
     ######################
     # Create HTML report #
     ######################
 
-    html_content = structure_report(pdf_title, content)
+    # Return the start of the report and the pages created so far, then the
+    # pages from each section as they are completed
+    yield report_head(pdf_title, inline_css,
+                      include_plotlyjs=(chart_format == 'plotly'))
+    yield from content
+    yield from section_content
+    yield report_tail()
 
-    return html_content
+
+def create_html_report(survey_type='standard', target=None, **report_args):
+    '''
+    Create an interactive report for a school as a single HTML file, which
+    can be viewed offline. This is the same as the PDF report, but the charts
+    are embedded as JSON and drawn by plotly.js (included once in the file),
+    so no images are rendered and neither kaleido nor WeasyPrint are needed.
+
+    Parameters
+    ----------
+    survey_type : string
+        Designates whether this is for 'standard' (default) or 'symbol' survey
+    target : string or file object
+        Optional input, the path or file to write the HTML to. Default is
+        None, which returns the HTML as a string.
+    **report_args
+        Inputs to generate_static_report() (for the standard survey) or
+        generate_static_symbol_report() (for the symbol survey), such as
+        chosen_school, df_prop, counts, dem_prop and pdf_title
+
+    Returns
+    -------
+    html_content : string
+        HTML of the report (or None if it was written to target)
+    '''
+    if survey_type == 'standard':
+        generate_report = generate_static_report
+    elif survey_type == 'symbol':
+        generate_report = generate_static_symbol_report
+
+    chunks = generate_report(chart_format='plotly', image_urls='data',
+                             inline_css=True, **report_args)
+    if target is None:
+        return ''.join(chunks)
+    write_report(chunks, target)
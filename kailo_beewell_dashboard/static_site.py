@@ -0,0 +1,415 @@
+'''
+Export the reports as a static website, so they can be served as files (for
+example, by Apache) rather than by the dashboard. Each school has its own
+folder, which can be password protected, with a page for each group. The
+charts are written as image files (shared between the pages of each school),
+and the stylesheet, logo and illustration are shared by all schools.
+'''
+import base64
+import hashlib
+from html import escape
+from itertools import chain
+import mimetypes
+import os
+import re
+import secrets
+from .grammar import slugify
+from .images import get_image_data_uri, get_image_path, get_plotlyjs
+from .reshape_data import prepare_table
+from .static_report import (
+    REPORT_GROUPS,
+    generate_static_report,
+    generate_static_symbol_report,
+    get_report_css,
+    report_head,
+    report_tail,
+    write_report)
+
+# Images from the package used in every report, which are stored once in the
+# shared assets folder
+SHARED_IMAGES = ['kailo_beewell_logo_padded.png',
+                 'home_image_3_transparent.png']
+
+# Matches the base64 data URIs of the images in the report HTML
+DATA_URI = re.compile(r'data:(image/[a-z+.-]+);base64,([A-Za-z0-9+/=]+)')
+
+# Characters used by the APR1 password hashes, in the order of their values
+APR1_CHARS = ('./0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+              'abcdefghijklmnopqrstuvwxyz')
+
+
+def apr1_hash(password, salt=None):
+    '''
+    Hash a password with Apache's salted and iterated MD5 scheme ($apr1$),
+    as created by 'htpasswd -m'. This is the strongest scheme that Apache
+    checks on every platform, and (unlike bcrypt) needs no extra packages.
+
+    Parameters
+    ----------
+    password : string
+        Password
+    salt : string
+        Optional input, eight characters from APR1_CHARS. Default is None,
+        which uses a random salt.
+
+    Returns
+    -------
+    password_hash : string
+        Hashed password (e.g. '$apr1$<salt>$<hash>')
+    '''
+    if salt is None:
+        salt = ''.join(secrets.choice(APR1_CHARS) for _ in range(8))
+    password = password.encode('utf-8')
+    magic = b'$apr1$'
+    salt_bytes = salt.encode('ascii')
+
+    # Start with the password, magic string and salt, then add the digest of
+    # the password, salt and password (repeated to the password length)
+    digest = hashlib.md5(password + salt_bytes + password).digest()
+    text = password + magic + salt_bytes
+    for length in range(len(password), 0, -16):
+        text += digest[:min(16, length)]
+    length = len(password)
+    while length:
+        text += b'\x00' if length & 1 else password[:1]
+        length >>= 1
+    digest = hashlib.md5(text).digest()
+
+    # Strengthen the digest with 1000 further rounds
+    for i in range(1000):
+        text = password if i & 1 else digest
+        if i % 3:
+            text += salt_bytes
+        if i % 7:
+            text += password
+        text += digest if i & 1 else password
+        digest = hashlib.md5(text).digest()
+
+    # Encode the digest, with its bytes in the order used by Apache
+    encoded = ''
+    for first, second, third in [(0, 6, 12), (1, 7, 13), (2, 8, 14),
+                                 (3, 9, 15), (4, 10, 5)]:
+        value = (digest[first] << 16) | (digest[second] << 8) | digest[third]
+        encoded += ''.join(APR1_CHARS[(value >> (6 * i)) & 0x3f]
+                           for i in range(4))
+    encoded += ''.join(APR1_CHARS[(digest[11] >> (6 * i)) & 0x3f]
+                       for i in range(2))
+    return f'$apr1${salt}${encoded}'
+
+
+def htpasswd_entry(username, password):
+    '''
+    Create a line for an Apache password file (.htpasswd), with the password
+    hashed using apr1_hash()
+
+    Parameters
+    ----------
+    username : string
+        Username, which can't contain ':' or line breaks
+    password : string
+        Password
+
+    Returns
+    -------
+    entry : string
+        Line for the password file (e.g. 'schoola:$apr1$...')
+    '''
+    if re.search(r'[:\r\n]', username):
+        raise ValueError(f'Username {username!r} can not contain a colon or '
+                         'line break.')
+    return f'{username}:{apr1_hash(password)}'
+
+
+def write_password_gate(school_dir, school, logins, auth_dir):
+    '''
+    Password protect a school's folder, by writing an Apache .htaccess file
+    requiring one of the school's logins, and the .htpasswd file with those
+    logins
+
+    Parameters
+    ----------
+    school_dir : string
+        Path to the school's folder
+    school : string
+        Name of the school
+    logins : dictionary
+        Password for each username that can view the school's pages
+    auth_dir : string
+        Path to the school's folder on the web server (as Apache needs the
+        full path to the password file)
+    '''
+    with open(os.path.join(school_dir, '.htpasswd'), 'w',
+              encoding='utf-8') as f:
+        for username, password in logins.items():
+            f.write(htpasswd_entry(username, password) + '\n')
+    with open(os.path.join(school_dir, '.htaccess'), 'w',
+              encoding='utf-8') as f:
+        f.write(f'''AuthType Basic
+AuthName "#BeeWell survey - {school}"
+AuthUserFile {auth_dir}/.htpasswd
+Require valid-user
+''')
+
+
+def write_shared_assets(assets_dir, chart_format):
+    '''
+    Write the files shared by every school's pages - the stylesheet, the logo
+    and illustration, and plotly.js (if the charts are interactive)
+
+    Parameters
+    ----------
+    assets_dir : string
+        Path to the shared assets folder
+    chart_format : string
+        Format of the charts - either 'png', 'svg' or 'plotly'
+
+    Returns
+    -------
+    shared_uris : dictionary
+        Name of the file in the assets folder for the data URI of each of the
+        shared images
+    '''
+    os.makedirs(assets_dir, exist_ok=True)
+    with open(os.path.join(assets_dir, 'report.css'), 'w',
+              encoding='utf-8') as f:
+        f.write(get_report_css())
+    if chart_format == 'plotly':
+        with open(os.path.join(assets_dir, 'plotly.min.js'), 'w',
+                  encoding='utf-8') as f:
+            f.write(get_plotlyjs())
+
+    shared_uris = dict()
+    for filename in SHARED_IMAGES:
+        with open(get_image_path(filename), 'rb') as src:
+            with open(os.path.join(assets_dir, filename), 'wb') as dst:
+                dst.write(src.read())
+        shared_uris[get_image_data_uri(filename)] = filename
+    return shared_uris
+
+
+def localise_html(chunk, images_dir, shared_uris):
+    '''
+    Replace the data URIs of the images in the report HTML with links to
+    image files. Shared images link to the assets folder, and the others are
+    written to the school's images folder, named by a hash of their contents
+    (so each image is only stored once, however many pages it is on).
+
+    Parameters
+    ----------
+    chunk : string
+        HTML content of the report
+    images_dir : string
+        Path to the school's images folder
+    shared_uris : dictionary
+        Name of the file in the assets folder for the data URI of each of the
+        shared images - see write_shared_assets()
+
+    Returns
+    -------
+    chunk : string
+        HTML content with the images replaced by links
+    '''
+    def to_file(match):
+        if match.group(0) in shared_uris:
+            return f'../assets/{shared_uris[match.group(0)]}'
+        image = base64.b64decode(match.group(2))
+        extension = mimetypes.guess_extension(match.group(1))
+        filename = f'{hashlib.sha1(image).hexdigest()}{extension}'
+        path = os.path.join(images_dir, filename)
+        if not os.path.exists(path):
+            with open(path, 'wb') as f:
+                f.write(image)
+        return f'images/{filename}'
+
+    return DATA_URI.sub(to_file, chunk)
+
+
+def localise_head(head, chart_format='png'):
+    '''
+    Link the start of the HTML report (from report_head(), without the
+    stylesheet) to the stylesheet and plotly.js in the assets folder
+
+    Parameters
+    ----------
+    head : string
+        Start of the HTML report
+    chart_format : string
+        Format of the charts - if 'plotly', the copy of plotly.js in the head
+        is replaced by a link to the assets folder
+
+    Returns
+    -------
+    head : string
+        Start of the HTML report, linked to the shared assets
+    '''
+    links = '''
+    <link rel='stylesheet' href='../assets/report.css'>'''
+    if chart_format == 'plotly':
+        head = head.replace(f'''
+    <script>{get_plotlyjs()}</script>''', '')
+        links += '''
+    <script src='../assets/plotly.min.js'></script>'''
+    return head.replace('\n</head>', f'{links}\n</head>', 1)
+
+
+def write_index(school_dir, chosen_school, pages, pdf_title):
+    '''
+    Write the home page of a school's folder, with a link to each page
+
+    Parameters
+    ----------
+    school_dir : string
+        Path to the school's folder
+    chosen_school : string
+        Name of the school
+    pages : dictionary
+        File name of the page for each group
+    pdf_title : string
+        Title for the page
+    '''
+    links = ''.join(f'''
+    <li><a href='{filename}'>{escape(group)}</a></li>'''
+                    for group, filename in pages.items())
+    content = f'''
+<h1>{escape(chosen_school)}</h1>
+<p>Choose how to view your school's results:</p>
+<ul>{links}
+</ul>'''
+    write_report([localise_head(report_head(pdf_title, inline_css=False)),
+                  content, report_tail()],
+                 os.path.join(school_dir, 'index.html'))
+
+
+def export_school_site(chosen_school, tables, output_dir, survey_type,
+                       groups, chart_format, pdf_title, shared_uris):
+    '''
+    Write the pages for a school - one for each group (with an index page
+    linking to them) for the standard survey, or a single page for the
+    symbol survey
+
+    Parameters
+    ----------
+    chosen_school : string
+        Name of the school
+    tables : dictionary
+        Datasets used in the reports, prepared by prepare_table()
+    output_dir : string
+        Path to the site
+    survey_type : string
+        Designates whether this is for 'standard' or 'symbol' survey
+    groups : list
+        Groups for the standard survey (not used for the symbol survey)
+    chart_format : string
+        Format of the charts - either 'png', 'svg' or 'plotly'
+    pdf_title : string
+        Title for the pages
+    shared_uris : dictionary
+        See write_shared_assets()
+
+    Returns
+    -------
+    school_dir : string
+        Path to the school's folder
+    '''
+    school_dir = os.path.join(output_dir, slugify(chosen_school))
+    images_dir = os.path.join(school_dir, 'images')
+    os.makedirs(images_dir, exist_ok=True)
+
+    def write_page(chunks, filename):
+        # The first chunk is the start of the report, from report_head()
+        chunks = iter(chunks)
+        head = localise_head(next(chunks), chart_format)
+        write_report(
+            chain([head], (localise_html(chunk, images_dir, shared_uris)
+                           for chunk in chunks)),
+            os.path.join(school_dir, filename))
+
+    report_args = dict(
+        chosen_school=chosen_school, df_prop=tables['responses'],
+        counts=tables['counts'], dem_prop=tables['demographic'],
+        pdf_title=pdf_title, chart_format=chart_format, inline_css=False)
+    if survey_type == 'standard':
+        pages = {group: f'{slugify(group)}.html' for group in groups}
+        for group, filename in pages.items():
+            write_page(generate_static_report(
+                chosen_group=group, df_scores=tables['scores_rag'],
+                **report_args), filename)
+        write_index(school_dir, chosen_school, pages, pdf_title)
+    else:
+        write_page(generate_static_symbol_report(**report_args), 'index.html')
+    return school_dir
+
+
+def export_static_site(
+        tables, output_dir, survey_type='standard', logins=None,
+        schools=None, groups=None, chart_format='png',
+        pdf_title='#BeeWell survey report', auth_dir=None):
+    '''
+    Export the reports for every school (and group, for the standard survey)
+    as a static website. Each school has a folder with an index.html page,
+    and the shared assets are in the assets folder. Charts use the figure
+    cache, so are only rendered once for all of the schools.
+
+    Parameters
+    ----------
+    tables : dictionary
+        Datasets used in the reports, as from load_tidb_tables() - 'responses',
+        'counts' and 'demographic' (and 'scores_rag' for the standard survey)
+    output_dir : string
+        Directory to write the site to
+    survey_type : string
+        Designates whether this is for 'standard' or 'symbol' survey
+    logins : dictionary
+        Optional input, with the logins for each school, as a dictionary with
+        the password for each username (e.g. {'School A': {'schoola':
+        'password'}}). If provided, each school's folder is password
+        protected (for Apache), and every school must have at least one
+        login. Default is None, which doesn't protect them.
+    schools : list
+        Names of the schools - default None, which uses every school in the
+        counts
+    groups : list
+        Groups for the standard survey - default None, which uses
+        REPORT_GROUPS. Not used for the symbol survey.
+    chart_format : string
+        Format of the charts - either 'png' (default), 'svg' or 'plotly'
+    pdf_title : string
+        Title for the pages
+    auth_dir : string
+        Path that the site will be copied to on the web server, used to find
+        the password files - default None, which uses output_dir
+
+    Returns
+    -------
+    school_dirs : dictionary
+        Path to the folder for each school
+    '''
+    tables = {key: prepare_table(key, df, survey_type)
+              for key, df in tables.items()}
+    if schools is None:
+        schools = sorted(tables['counts']['school_lab'].unique())
+    if groups is None:
+        groups = REPORT_GROUPS
+    if auth_dir is None:
+        auth_dir = os.path.abspath(output_dir)
+
+    # Check every school has a login before writing anything, so a school's
+    # pages are never left without a password
+    if logins is not None:
+        missing = [school for school in schools if not logins.get(school)]
+        if missing:
+            raise ValueError(f'No logins provided for: {", ".join(missing)}')
+
+    shared_uris = write_shared_assets(
+        os.path.join(output_dir, 'assets'), chart_format)
+
+    school_dirs = dict()
+    for school in schools:
+        school_dirs[school] = export_school_site(
+            school, tables, output_dir, survey_type, groups, chart_format,
+            pdf_title, shared_uris)
+        if logins is not None:
+            write_password_gate(
+                school_dirs[school], school, logins[school],
+                f'{auth_dir}/{slugify(school)}')
+    return school_dirs
@@ -7,7 +7,7 @@ import streamlit as st
 import numpy as np
 from markdown import markdown
 from .page_setup import blank_lines
-from .reshape_data import filter_by_group
+from .reshape_data import SUMMARY_RAG, get_summary_rag
 from .stylable_container import stylable_container
 from .switch_page_button import switch_page
 
@@ -233,7 +233,7 @@ on the "Explore results" page present data from all pupils who took part.*'''
 
 
 def summary_table(df_scores, chosen_group, chosen_school,
-                  output='streamlit', content=None):
+                  output='streamlit', content=None, chosen_wave=None):
     '''
     Produce the summary RAG table using rows and columns, for streamlit page
     or PDF report.
@@ -251,57 +251,33 @@ def summary_table(df_scores, chosen_group, chosen_school,
         Specifies whether to write for 'streamlit' (default) or 'pdf'
     content : list
         Optional input used when output=='pdf', contains HTML for report.
+    chosen_wave : string
+        Optional input, wave to show (e.g. '2024/25'), if df_scores has a
+        'wave' column. Default is None, which uses the school's latest wave.
 
     Returns
     -------
     content : list
         Optional return, used when output=='pdf', contains HTML for report.
     '''
-    # Filter by chosen grouping and school
-    chosen, pivot_var, order = filter_by_group(
-        df=df_scores, chosen_group=chosen_group, output='summary',
-        chosen_school=chosen_school)
-
-    # Filter to variable relevant for summary page
-    chosen = chosen[~chosen['variable'].isin([
-        'birth_you_age_score', 'overall_count', 'staff_talk_score',
-        'home_talk_score', 'peer_talk_score'])]
-
-    if chosen_group != 'For all pupils':
-        # Pivot from wide to long whilst maintaining row order
-        chosen = pd.pivot_table(
-            chosen[['variable_lab', pivot_var, 'rag', 'description']],
-            values='rag', index=['variable_lab', 'description'],
-            columns=pivot_var,
-            aggfunc='sum', sort=False).reset_index().replace(0, np.nan)
-        # Reorder columns
-        chosen = chosen[['variable_lab'] + order + ['description']]
-    else:
-        chosen = chosen[['variable_lab', 'rag', 'description']]
-
-    # Extract description (was used for hover over button but that didn't
-    # work with CSS styling presently)
-    # description = chosen['description']
-    chosen = chosen.drop('description', axis=1)
+    # Get matrix of RAG ratings for each topic and group at the school
+    topics, headings, rag = get_summary_rag(
+        df_scores, chosen_school, chosen_group, chosen_wave=chosen_wave)
+    headings = ['Topic'] + headings
 
     # Set number of columns
-    ncol = len(chosen.columns)
-
-    # Rename columns if in the dataframe
-    colnames = {'variable_lab': 'Topic',
-                'rag': 'All pupils'}
-    chosen = chosen.rename(columns=colnames)
+    ncol = len(headings)
 
     # Add the headings for each column for Streamlit
     if output == 'streamlit':
         # Set up columns
         cols = st.columns([0.3, 0.35, 0.35])
-        # For column names in chosen, write that name in a column
+        # For each heading, write that name in a column
         for i in range(ncol):
             with cols[i]:
                 st.markdown(f'''
 <p style='text-align: center; font-weight: bold; font-size: 22px;'>
-{chosen.columns[i]}</p>''', unsafe_allow_html=True)
+{headings[i]}</p>''', unsafe_allow_html=True)
 
     # Add the headings for each column for PDF:
     elif output == 'pdf':
@@ -311,7 +287,7 @@ def summary_table(df_scores, chosen_group, chosen_school,
         for i in range(ncol):
             temp_headings.append(f'''
 <div class='column{ncol}'>
-    <p style='text-align:center; font-weight:bold;'>{chosen.columns[i]}</p>
+    <p style='text-align:center; font-weight:bold;'>{headings[i]}</p>
 </div>''')
         # Combine into a single HTML string
         content.append(f'''
@@ -321,49 +297,38 @@ def summary_table(df_scores, chosen_group, chosen_school,
 
     # Add the topics and RAG results in Streamlit:
     if output == 'streamlit':
-        # For each row of dataframe, create streamlit columns and write data
-        # from cell
+        # For each topic, create streamlit columns with a button for the
+        # topic and the RAG results
         st.divider()
-        for index, row in chosen.iterrows():
+        for topic, topic_rag in zip(topics, rag):
             cols = st.columns([0.3, 0.35, 0.35])
             st.divider()
-            for i in range(ncol):
-                # Create topic button or score
+            # Create button that, if clicked, changes to details
+            with cols[0]:
+                if st.button(topic):
+                    st.session_state['chosen_variable_lab'] = topic
+                    switch_page('explore results')
+            for i, code in enumerate(topic_rag, start=1):
                 with cols[i]:
-                    if ((row.iloc[i] in ['below', 'average', 'above']) |
-                            pd.isnull(row.iloc[i])):
-                        result_box(row.iloc[i])
-                    else:
-                        # Create button that, if clicked, changes to details
-                        if st.button(row.iloc[i]):
-                            st.session_state['chosen_variable_lab'] = (
-                                row.iloc[i])
-                            switch_page('explore results')
+                    result_box(SUMMARY_RAG[code])
 
     # Add the topics and RAG results in PDF:
     if output == 'pdf':
-        for index, row in chosen.iterrows():
-            content.append('<hr>')
-            # Create temporary list to store the HTML for this row
-            temp_row = list()
-            for i in range(ncol):
-                # Create RAG button HTML
-                if ((row.iloc[i] in ['below', 'average', 'above']) |
-                        pd.isnull(row.iloc[i])):
-                    row_value = result_box(row.iloc[i], 'pdf')
-                # Create topic name HTML
-                else:
-                    row_value = f'''
-<p style='text-align:center;'>{row.iloc[i]}</p>'''
-                # Insert that into the column DIV element
-                temp_row.append(f'''
+        # Create the HTML for each RAG rating once, in the order of the codes
+        # in the matrix, with each inserted into the column DIV element
+        rag_boxes = np.array([f'''
 <div class='column{ncol}'>
-    {row_value}
-</div>''')
-            # Insert that row into the overall HTML content
+    {result_box(rating, 'pdf')}
+</div>''' for rating in SUMMARY_RAG], dtype=object)
+        for topic, topic_rag in zip(topics, rag):
+            content.append('<hr>')
+            # Create topic name HTML, then insert the RAG results, and insert
+            # that row into the overall HTML content
             content.append(f'''
 <div class='row'>
-    {''.join(temp_row)}
+    <div class='column{ncol}'>
+        <p style='text-align:center;'>{topic}</p>
+    </div>{''.join(rag_boxes[topic_rag])}
 </div>''')
 
         return content
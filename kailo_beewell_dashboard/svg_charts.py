@@ -0,0 +1,450 @@
+'''
+Functions to draw the bar charts as SVG images without kaleido, from the
+figure dictionaries created in bar_charts.py. This supports just the features
+used by those charts (bar traces with category x axes, RAG areas and their
+labels, and the legend), and lays them out similarly to plotly.
+'''
+from html import escape
+import math
+import numpy as np
+
+# Fonts and colours used when not set in the figure or its template (from
+# plotly defaults)
+FONT_FAMILY = '"Open Sans", verdana, arial, sans-serif'
+DEFAULT_FONT_COLOUR = '#444'
+DEFAULT_PLOT_BG = '#fff'
+DEFAULT_GRID_COLOUR = '#eee'
+
+# Average width of a character, as a proportion of the font size, used to
+# estimate the width of text
+CHAR_WIDTH = 0.6
+
+
+def text_width(text, size):
+    '''
+    Estimate the width of text (the longest line, if split by '<br>')
+
+    Parameters
+    ----------
+    text : string
+        Text to find width of
+    size : float
+        Font size
+
+    Returns
+    -------
+    width : float
+        Estimated width of the text (in pixels)
+    '''
+    longest = max(len(line) for line in str(text).split('<br>'))
+    return longest * size * CHAR_WIDTH
+
+
+def svg_text(text, x, y, size, colour, anchor='middle', rotate=None):
+    '''
+    Create SVG text element, with a line for each part of text split by '<br>'
+
+    Parameters
+    ----------
+    text : string
+        Text to write
+    x : float
+        Horizontal position of the text
+    y : float
+        Vertical position of the baseline of the first line of text
+    size : float
+        Font size
+    colour : string
+        Font colour
+    anchor : string
+        Horizontal alignment - 'start', 'middle' (default) or 'end'
+    rotate : float
+        Optional input, angle to rotate the text by around (x, y)
+
+    Returns
+    -------
+    element : string
+        SVG text element
+    '''
+    lines = str(text).split('<br>')
+    tspans = ''.join(
+        f"<tspan x='{x:.2f}' dy='{0 if i == 0 else size * 1.2:.2f}'>"
+        f'{escape(line)}</tspan>' for i, line in enumerate(lines))
+    transform = (f" transform='rotate({rotate} {x:.2f} {y:.2f})'"
+                 if rotate is not None else '')
+    return (f"<text x='{x:.2f}' y='{y:.2f}' font-size='{size}' "
+            f"fill='{colour}' text-anchor='{anchor}'{transform}>"
+            f'{tspans}</text>')
+
+
+def svg_rect(x, y, width, height, fill, stroke=None, stroke_width=None):
+    '''
+    Create SVG rectangle element
+
+    Parameters
+    ----------
+    x, y : float
+        Position of top left corner
+    width, height : float
+        Size of rectangle
+    fill : string
+        Fill colour
+    stroke : string
+        Optional input, colour of outline
+    stroke_width : float
+        Optional input, width of outline
+
+    Returns
+    -------
+    element : string
+        SVG rect element
+    '''
+    outline = (f" stroke='{stroke}' stroke-width='{stroke_width}'"
+               if stroke is not None else '')
+    return (f"<rect x='{x:.2f}' y='{y:.2f}' width='{max(width, 0):.2f}' "
+            f"height='{max(height, 0):.2f}' fill='{fill}'{outline}/>")
+
+
+def nice_ticks(lower, upper, max_ticks):
+    '''
+    Find evenly spaced round values for the ticks on an axis
+
+    Parameters
+    ----------
+    lower, upper : float
+        Range of the axis
+    max_ticks : integer
+        Maximum number of ticks
+
+    Returns
+    -------
+    ticks : list
+        Values of ticks within the range
+    step : float
+        Difference between ticks
+    '''
+    span = upper - lower
+    if span <= 0:
+        return [lower], 1
+    raw_step = span / max(max_ticks, 1)
+    magnitude = 10 ** math.floor(math.log10(raw_step))
+    step = next(multiple * magnitude for multiple in [1, 2, 2.5, 5, 10]
+                if multiple * magnitude >= raw_step)
+    first = math.ceil(lower / step) * step
+    ticks = list(np.arange(first, upper + step * 1e-9, step))
+    return ticks, step
+
+
+def format_tick(value, step, suffix=''):
+    '''
+    Format value of a tick on the y axis
+
+    Parameters
+    ----------
+    value : float
+        Value of tick
+    step : float
+        Difference between ticks (used to choose decimal places)
+    suffix : string
+        Optional input, text to add after the value (e.g. '%')
+
+    Returns
+    -------
+    label : string
+        Tick label
+    '''
+    decimals = max(0, -math.floor(math.log10(step))) if step < 1 else 0
+    if decimals == 0 and step != int(step):
+        decimals = 1
+    return f'{value:.{decimals}f}{suffix}'
+
+
+def is_light(colour):
+    '''
+    Check whether a hex colour is light (so should have dark text on it)
+
+    Parameters
+    ----------
+    colour : string
+        Hex colour (e.g. '#FF6E4A')
+
+    Returns
+    -------
+    light : boolean
+        True if the colour is light
+    '''
+    colour = colour.lstrip('#')
+    r, g, b = (int(colour[i:i+2], 16) for i in (0, 2, 4))
+    return (r * 299 + g * 587 + b * 114) / 1000 >= 128
+
+
+def format_bar_text(texttemplate, value):
+    '''
+    Create the label for a bar, from a template in the form
+    '%{y:<format>}<suffix>' (as used by the charts in bar_charts.py)
+
+    Parameters
+    ----------
+    texttemplate : string
+        Template for the text, or None if no text
+    value : float
+        Value of bar
+
+    Returns
+    -------
+    text : string
+        Label for the bar, or None if no text
+    '''
+    if texttemplate is None or not texttemplate.startswith('%{y'):
+        return None
+    spec, suffix = texttemplate[3:].split('}', 1)
+    return format(value, spec.lstrip(':')) + suffix
+
+
+def fig_to_svg(fig, alt_text=''):
+    '''
+    Draw a bar chart figure (as created by responses_figure() or
+    ordered_bar_figure() in bar_charts.py) as an SVG image
+
+    Parameters
+    ----------
+    fig : dictionary
+        Plotly figure
+    alt_text : string
+        Alternative text for the figure
+
+    Returns
+    -------
+    svg : string
+        SVG image
+    '''
+    layout = fig['layout']
+    template = layout.get('template', dict()).get('layout', dict())
+    width = layout.get('width', 600)
+    height = layout.get('height', 411)
+    font_size = layout.get('font', dict()).get('size', 12)
+    xaxis = layout.get('xaxis', dict())
+    yaxis = layout.get('yaxis', dict())
+    legend = layout.get('legend', dict())
+    plot_bg = template.get('plot_bgcolor', DEFAULT_PLOT_BG)
+    template_xaxis = template.get('xaxis', dict())
+    template_yaxis = template.get('yaxis', dict())
+    grid_colour = template_yaxis.get('gridcolor', DEFAULT_GRID_COLOUR)
+    font_colour = template.get('font', dict()).get(
+        'color', DEFAULT_FONT_COLOUR)
+    traces = [trace for trace in fig['data'] if trace.get('type') == 'bar']
+
+    # Get the bar heights as float arrays, so missing values (None, as from
+    # groups hidden due to low response) become NaN
+    trace_ys = [np.asarray(trace['y'], dtype=float) for trace in traces]
+
+    # Find the categories on the x axis, in the order they first appear, or
+    # ordered by the total of the bars
+    categories = []
+    totals = dict()
+    for trace, ys in zip(traces, trace_ys):
+        for x, y in zip(trace['x'], ys):
+            if x not in totals:
+                categories.append(x)
+                totals[x] = 0
+            if not np.isnan(y):
+                totals[x] += y
+    if xaxis.get('categoryorder') == 'total ascending':
+        categories = sorted(categories, key=lambda x: totals[x])
+
+    # Find x tick labels (replaced by ticktext if given)
+    if 'ticktext' in xaxis:
+        ticktext = dict(zip(xaxis['tickvals'], xaxis['ticktext']))
+        xlabels = [ticktext.get(x, str(x)) for x in categories]
+    else:
+        xlabels = [str(x) for x in categories]
+
+    # Find y axis range - as given, or from zero to just above the tallest bar
+    values = [y for ys in trace_ys for y in ys[~np.isnan(ys)]]
+    if 'range' in yaxis:
+        ymin, ymax = yaxis['range']
+    else:
+        ymin, ymax = 0, (max(values) * 1.05 if values and max(values) > 0
+                         else 1)
+
+    # Find legend size
+    xtick_font = xaxis.get('tickfont', dict())
+    ytick_font = yaxis.get('tickfont', dict())
+    xtick_size = xtick_font.get('size', font_size)
+    ytick_size = ytick_font.get('size', font_size)
+    legend_font = legend.get('font', dict())
+    legend_size = legend_font.get('size', font_size)
+    legend_title = legend.get('title', dict()).get('text', '')
+    legend_width = max([text_width(legend_title, legend_size)] +
+                       [40 + text_width(trace['name'], legend_size)
+                        for trace in traces]) + 10
+
+    # Find margins, making space for the tick labels, axis titles and legend
+    top = layout.get('margin', dict()).get('t', 100)
+    right = width - legend_width - 20
+    ytitle = yaxis.get('title', dict())
+    ytitle_size = ytitle.get('font', dict()).get('size', font_size)
+    ytitle_lines = len(ytitle.get('text', '').split('<br>'))
+    plot_height_estimate = height - top - 80
+    ticks, step = nice_ticks(
+        ymin, ymax, max(2, int(plot_height_estimate / (ytick_size * 2.5))))
+    suffix = yaxis.get('ticksuffix', '')
+    ytick_labels = [format_tick(tick, step, suffix) for tick in ticks]
+    ytick_width = max(text_width(label, ytick_size) for label in ytick_labels)
+    left = max(80, ytick_width + 20 + ytitle_lines * ytitle_size * 1.2 + 10)
+    slot = (right - left) / max(len(categories), 1)
+    rotate_xlabels = any(text_width(label, xtick_size) > slot * 0.95
+                         for label in xlabels)
+    if rotate_xlabels:
+        xtick_height = (max(text_width(label, xtick_size)
+                            for label in xlabels) * 0.5 + xtick_size)
+    else:
+        xtick_height = xtick_size * 1.2
+    xtitle = xaxis.get('title', dict())
+    xtitle_size = xtitle.get('font', dict()).get('size', font_size)
+    xtitle_lines = len(xtitle.get('text', '').split('<br>'))
+    bottom = max(80, xtick_height + 10 + xtitle_lines * xtitle_size * 1.2 +
+                 10)
+    plot_top, plot_bottom = top, height - bottom
+    plot_height = plot_bottom - plot_top
+    slot = (right - left) / max(len(categories), 1)
+
+    def y_to_px(value):
+        # Convert value on y axis to position on image (clipped to the axis)
+        value = min(max(value, ymin), ymax)
+        return plot_bottom - (value - ymin) / (ymax - ymin) * plot_height
+
+    elements = []
+
+    # Draw plot background
+    elements.append(svg_rect(left, plot_top, right - left, plot_height,
+                             plot_bg))
+
+    # Draw shapes (the RAG areas) below the grid lines and bars
+    for shape in layout.get('shapes', []):
+        x0 = left + shape['x0'] * (right - left)
+        x1 = left + shape['x1'] * (right - left)
+        y0, y1 = y_to_px(shape['y0']), y_to_px(shape['y1'])
+        line = shape.get('line', dict())
+        elements.append(svg_rect(
+            x0, min(y0, y1), x1 - x0, abs(y1 - y0), shape['fillcolor'],
+            line.get('color'), line.get('width')))
+
+    # Draw grid lines, and x axis grid lines at each category
+    if yaxis.get('showgrid', template_yaxis.get('showgrid', True)):
+        for tick in ticks:
+            y = y_to_px(tick)
+            elements.append(
+                f"<line x1='{left:.2f}' y1='{y:.2f}' x2='{right:.2f}' "
+                f"y2='{y:.2f}' stroke='{grid_colour}' stroke-width='1'/>")
+    if xaxis.get('showgrid', template_xaxis.get('showgrid', False)):
+        for i in range(len(categories)):
+            x = left + slot * (i + 0.5)
+            elements.append(
+                f"<line x1='{x:.2f}' y1='{plot_top:.2f}' x2='{x:.2f}' "
+                f"y2='{plot_bottom:.2f}' stroke='{grid_colour}' "
+                "stroke-width='1'/>")
+
+    # Draw the bars (side by side if barmode is group), with their labels
+    grouped = layout.get('barmode') == 'group'
+    group_width = slot * 0.8
+    if grouped and traces:
+        bar_width = group_width / len(traces)
+    else:
+        bar_width = group_width
+    position = {x: i for i, x in enumerate(categories)}
+    labels = []
+    for t, (trace, ys) in enumerate(zip(traces, trace_ys)):
+        colour = trace.get('marker', dict()).get('color', '#636efa')
+        for x, y in zip(trace['x'], ys):
+            if np.isnan(y):
+                continue
+            x0 = left + slot * position[x] + slot * 0.1
+            if grouped:
+                x0 += bar_width * t
+            y_top, y_base = y_to_px(y), y_to_px(0)
+            elements.append(svg_rect(x0, min(y_top, y_base), bar_width,
+                                     abs(y_base - y_top), colour))
+            text = format_bar_text(trace.get('texttemplate'), y)
+            if text is None:
+                continue
+            # Label inside the top of the bar if it fits (rotating the text if
+            # the bar is too narrow), otherwise above the bar (shrinking the
+            # text to fit the width of the bar if needed)
+            x_mid = x0 + bar_width / 2
+            bar_height = abs(y_base - y_top)
+            inside_colour = '#444' if is_light(colour) else '#fff'
+            if (text_width(text, font_size) <= bar_width - 4 and
+                    bar_height >= font_size * 1.4):
+                labels.append(svg_text(text, x_mid, y_top + font_size * 1.1,
+                                       font_size, inside_colour))
+            elif (font_size * 1.2 <= bar_width and
+                    text_width(text, font_size) <= bar_height - 6):
+                labels.append(svg_text(
+                    text, x_mid - font_size * 0.35, y_top + 4, font_size,
+                    inside_colour, anchor='start', rotate=90))
+            else:
+                fit_size = bar_width / (len(text) * CHAR_WIDTH)
+                size = max(min(font_size, fit_size), 6)
+                labels.append(svg_text(text, x_mid, y_top - 4,
+                                       round(size, 1), font_colour))
+    elements.extend(labels)
+
+    # Draw y axis tick labels and title
+    ytick_colour = ytick_font.get('color', font_colour)
+    for tick, label in zip(ticks, ytick_labels):
+        elements.append(svg_text(label, left - 8, y_to_px(tick) +
+                                 ytick_size * 0.35, ytick_size, ytick_colour,
+                                 anchor='end'))
+    ytitle_x = (left - ytick_width - 20 -
+                (ytitle_lines - 1) * ytitle_size * 1.2)
+    elements.append(svg_text(
+        ytitle.get('text', ''), ytitle_x, plot_top + plot_height / 2,
+        ytitle_size, ytitle.get('font', dict()).get('color', font_colour),
+        rotate=-90))
+
+    # Draw x axis tick labels (rotated if they overlap) and title
+    xtick_colour = xtick_font.get('color', font_colour)
+    for i, label in enumerate(xlabels):
+        x = left + slot * (i + 0.5)
+        y = plot_bottom + xtick_size + 4
+        if rotate_xlabels:
+            elements.append(svg_text(label, x, y, xtick_size, xtick_colour,
+                                     anchor='start', rotate=30))
+        else:
+            elements.append(svg_text(label, x, y, xtick_size, xtick_colour))
+    elements.append(svg_text(
+        xtitle.get('text', ''), left + (right - left) / 2,
+        plot_bottom + xtick_height + 10 + xtitle_size,
+        xtitle_size, xtitle.get('font', dict()).get('color', font_colour)))
+
+    # Draw annotations (the labels for the RAG areas)
+    for annotation in layout.get('annotations', []):
+        x = left + annotation['x'] * (right - left) + 2
+        y = y_to_px(annotation['y']) + font_size + 2
+        elements.append(svg_text(annotation['text'], x, y, font_size,
+                                 font_colour, anchor='start'))
+
+    # Draw legend to the right of the plot
+    legend_colour = legend_font.get('color', font_colour)
+    legend_x = right + 20
+    legend_y = plot_top + legend_size
+    if legend_title:
+        elements.append(svg_text(legend_title, legend_x, legend_y,
+                                 legend_size, legend_colour, anchor='start'))
+        legend_y += legend_size * 1.5
+    for trace in traces:
+        colour = trace.get('marker', dict()).get('color', '#636efa')
+        elements.append(svg_rect(legend_x + 6, legend_y - legend_size * 0.8,
+                                 legend_size * 0.9, legend_size * 0.9,
+                                 colour))
+        elements.append(svg_text(trace['name'], legend_x + 40, legend_y,
+                                 legend_size, legend_colour, anchor='start'))
+        legend_y += legend_size * 1.5
+
+    return (f"<svg xmlns='http://www.w3.org/2000/svg' width='{width}' "
+            f"height='{height}' viewBox='0 0 {width} {height}' role='img' "
+            f"aria-label='{escape(alt_text)}' font-family='{FONT_FAMILY}'>"
+            f'<title>{escape(alt_text)}</title>'
+            f"<rect width='{width}' height='{height}' fill='white'/>"
+            f"{''.join(elements)}</svg>")
@@ -5,12 +5,58 @@ for the dashboard.
 '''
 import numpy as np
 import pandas as pd
-import re
+from .response_labels import create_branch_map
+
+
+def define_groups(group_type='standard'):
+    '''
+    Define the pupil groups that results are aggregated by. When providing a
+    filter, the first value is the name of the category and the second is the
+    variable.
+
+    Parameters
+    ----------
+    group_type : string
+        Links to the type of demographic groupings performed. Either
+        'standard', 'symbol' or 'none' - default is standard.
+
+    Returns
+    -------
+    groups : list
+        List where first item is 'All', and any other items are lists with
+        the category and the variable to filter on
+    '''
+    if group_type == 'standard':
+        groups = [
+            'All',
+            ['Year 8', 'year_group_lab'],
+            ['Year 10', 'year_group_lab'],
+            ['Girl', 'gender_lab'],
+            ['Boy', 'gender_lab'],
+            ['FSM', 'fsm_lab'],
+            ['Non-FSM', 'fsm_lab'],
+            ['SEN', 'sen_lab'],
+            ['Non-SEN', 'sen_lab']]
+    elif group_type == 'symbol':
+        groups = [
+            'All',
+            ['Year 7', 'year_group_lab'],
+            ['Year 8', 'year_group_lab'],
+            ['Year 9', 'year_group_lab'],
+            ['Year 10', 'year_group_lab'],
+            ['Year 11', 'year_group_lab'],
+            ['Girl', 'gender_lab'],
+            ['Boy', 'gender_lab'],
+            ['FSM', 'fsm_lab'],
+            ['Non-FSM', 'fsm_lab']]
+    elif group_type == 'none':
+        groups = ['All']
+    return groups
 
 
 def results_by_site_and_group(
         data, agg_func, no_pupils, response_col=None, labels=None,
-        group_type='standard', site_col='school_lab'):
+        group_type='standard', site_col='school_lab', wave_col=None):
     '''
     Aggregate results for all possible sites (schools or areas) and groups
     (setting result to 0 or NaN if no pupils from a particular group are
@@ -39,6 +85,10 @@ def results_by_site_and_group(
         'standard', 'symbol' or 'none' - default is standard.
     site_col: string
         Name of column with site - e.g. 'school_lab' (default), 'msoa'.
+    wave_col : string
+        Optional input, name of column with the survey wave (e.g. 'wave'). If
+        provided, results are aggregated seperately for each wave, and the
+        wave is recorded in the result. Default is None (single wave).
 
     Returns
     -------
@@ -46,37 +96,23 @@ def results_by_site_and_group(
         Dataframe where each row has the aggregation results, along with
         the relevant school and pupil groups used in that calculation
     '''
+    # If there are multiple waves, aggregate each wave seperately
+    if wave_col is not None:
+        result_list = list()
+        for wave in data[wave_col].dropna().drop_duplicates().sort_values():
+            res = results_by_site_and_group(
+                data=data[data[wave_col] == wave], agg_func=agg_func,
+                no_pupils=no_pupils, response_col=response_col, labels=labels,
+                group_type=group_type, site_col=site_col)
+            res[wave_col] = wave
+            result_list.append(res)
+        return pd.concat(result_list)
 
     # Initialise list to store results
     result_list = list()
 
-    # Define the groups that we want to aggregate by - when providing a filter,
-    # first value is the name of the category and the second is the variable
-    if group_type == 'standard':
-        groups = [
-            'All',
-            ['Year 8', 'year_group_lab'],
-            ['Year 10', 'year_group_lab'],
-            ['Girl', 'gender_lab'],
-            ['Boy', 'gender_lab'],
-            ['FSM', 'fsm_lab'],
-            ['Non-FSM', 'fsm_lab'],
-            ['SEN', 'sen_lab'],
-            ['Non-SEN', 'sen_lab']]
-    elif group_type == 'symbol':
-        groups = [
-            'All',
-            ['Year 7', 'year_group_lab'],
-            ['Year 8', 'year_group_lab'],
-            ['Year 9', 'year_group_lab'],
-            ['Year 10', 'year_group_lab'],
-            ['Year 11', 'year_group_lab'],
-            ['Girl', 'gender_lab'],
-            ['Boy', 'gender_lab'],
-            ['FSM', 'fsm_lab'],
-            ['Non-FSM', 'fsm_lab']]
-    elif group_type == 'none':
-        groups = ['All']
+    # Define the groups that we want to aggregate by
+    groups = define_groups(group_type)
 
     # For each of the sites (which we know will all be present at least once
     # as we base the site list on the dataset itself)
@@ -170,7 +206,8 @@ def convert_boolean(true_list, false_list, mask):
     return [next(iter_true) if item else next(iter_false) for item in mask]
 
 
-def aggregate_proportions(data, response_col, labels, hide_low_response=False):
+def aggregate_proportions(data, response_col, labels, hide_low_response=False,
+                          branch_map=None):
     '''
     Aggregates each of the columns provided by response_col, for the chosen
     dataset.
@@ -184,10 +221,12 @@ def aggregate_proportions(data, response_col, labels, hide_low_response=False):
     have a function that just returns counts of responses to 1, 2 and 4, which
     would then create issues when we try and plot the data.
 
-    For the branching question (talking about feelings), the value counts are
-    calculated from a subset of the data (as the no response should only be
+    For the branching questions (e.g. talking about feelings), the value counts
+    are calculated from a subset of the data (as the no response should only be
     from those who branched onto that question, and not those who branched onto
-    the other question (or never answered the first branching question)).
+    the other question (or never answered the first branching question)). The
+    subset for each parent question and answer is only found once, and then
+    reused for each of the questions branching from it.
 
     Parameters
     ----------
@@ -203,14 +242,24 @@ def aggregate_proportions(data, response_col, labels, hide_low_response=False):
         Whether to hide responses when a response option gets less than 10
         responses (rather than norm elsewhere, which is just requiring 10
         responses to the entire item rather than to each response option)
+    branch_map : dictionary
+        Optional input, output of create_branch_map(), with the parent
+        question and answer for each branching question. Default is None,
+        which creates it from labels using the standard survey branching.
 
     Returns
     -------
     pd.concat(rows): dataframe
         Dataframe with the aggregate responses to each of the response_col
     '''
-    # Initialise list to store rows of the dataframe
+    # Create the map of branching questions, if not provided
+    if branch_map is None:
+        branch_map = create_branch_map(labels)
+
+    # Initialise list to store rows of the dataframe, and dictionary to store
+    # the mask for each parent question and answer
     rows = list()
+    parent_masks = dict()
 
     # Loop through the columns of interest
     for col_lab in response_col:
@@ -218,26 +267,17 @@ def aggregate_proportions(data, response_col, labels, hide_low_response=False):
         # Find the name of the numeric version of the column
         col = col_lab.replace('_lab', '')
 
-        # Identify if column is branching from "yes" to talking with someone
-        if any([substring in col for substring in ['talk_listen',
-                                                   'talk_helpful']]):
-            # Get the prefix (staff, home or peer)
-            prefix = re.sub('_talk_listen|_talk_helpful', '', col)
-            # Filter the data to only those who said they talked with them
-            # (branch)
-            data_subset = data[data[f'{prefix}_talk'] == 1]
-            # Find value counts
-            value_counts = data_subset[col].value_counts(dropna=False)
-
-        # Identify if the column is branching from "no" to talking with someone
-        elif 'talk_if' in col:
-            # Get the prefix (staff, home or peer)
-            prefix = re.sub('_talk_if', '', col)
-            # Filter the data to only those who said they didn't talk to them
-            # (branch)
-            data_subset = data[data[f'{prefix}_talk'] == 0]
+        # If column is a branching question, filter the data to only those
+        # who gave the relevant answer to the parent question (branch)
+        if col in branch_map:
+            # Find the mask for the parent answer, if not already found
+            parent = branch_map[col]
+            if parent not in parent_masks:
+                parent_masks[parent] = (
+                    data[parent[0]] == parent[1]).to_numpy()
             # Find value counts
-            value_counts = data_subset[col].value_counts(dropna=False)
+            value_counts = data.loc[parent_masks[parent], col].value_counts(
+                dropna=False)
 
         # For any other columns, no subsetting of the data is required
         else:
@@ -319,7 +359,7 @@ def aggregate_counts(df):
     return res
 
 
-def aggregate_demographic(data, response_col, labels):
+def aggregate_demographic(data, response_col, labels, wave_col=None):
     '''
     Aggregates the demographic data by school and group (seperate to
     results_by_school_and_group() as we want to aggregate by school v.s. all
@@ -334,6 +374,10 @@ def aggregate_demographic(data, response_col, labels):
         List of demographic columns to be aggregated
     labels : dictionary
         Dictionary with response options for each variable
+    wave_col : string
+        Optional input, name of column with the survey wave (e.g. 'wave'). If
+        provided, results are aggregated seperately for each wave, and the
+        wave is recorded in the result. Default is None (single wave).
 
     Returns
     -------
@@ -341,6 +385,17 @@ def aggregate_demographic(data, response_col, labels):
         Dataframe with % responses to demographic questions, for each school,
         compared with all other schools
     '''
+    # If there are multiple waves, aggregate each wave seperately
+    if wave_col is not None:
+        result_list = list()
+        for wave in data[wave_col].dropna().drop_duplicates().sort_values():
+            res = aggregate_demographic(
+                data=data[data[wave_col] == wave].copy(),
+                response_col=response_col, labels=labels)
+            res[wave_col] = wave
+            result_list.append(res)
+        return pd.concat(result_list)
+
     # Initialise list to store results
     result_list = list()
 
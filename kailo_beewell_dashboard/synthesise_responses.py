@@ -4,14 +4,16 @@ which provide functions for synthesis (creation and aggregation) of data
 for the dashboard.
 '''
 from collections import defaultdict
+from functools import partial
 import numpy as np
 from .response_labels import (
-    create_response_label_dict, create_symbol_response_label_dict)
+    create_branch_map, create_response_label_dict,
+    create_symbol_response_label_dict)
 from .synthesise_aggregate import (
     aggregate_proportions, results_by_site_and_group)
 
 
-def aggregate_standard_responses(df, site_col):
+def aggregate_standard_responses(df, site_col, wave_col=None):
     '''
     Aggregate responses to standard survey (non-demographic), using functions
     including aggregate_proportions() and results_by_site_and_group().
@@ -22,6 +24,9 @@ def aggregate_standard_responses(df, site_col):
         Pupil-level survey responses
     site_col : string
         Name of column with site to group by (e.g. 'school_lab', 'site')
+    wave_col : string
+        Optional input, name of column with the survey wave (e.g. 'wave'), to
+        aggregate each wave seperately. Default is None (single wave).
     '''
     # Make list of columns that we want to count responses for
     # These are lab columns, but with demographic items removed
@@ -44,17 +49,23 @@ def aggregate_standard_responses(df, site_col):
     for key, value in labels.items():
         value.update({np.nan: 'No response'})
 
+    # Identify the branching questions once, to reuse for each site and group
+    branch_map = create_branch_map(labels)
+
     # Create version where every question has count 0, to use when there is no
     # pupils of a particular group (ie. no-one in certain FSM/SEN/gender/year)
     no_pupils = aggregate_proportions(
-        data=df, response_col=response_col, labels=labels)
+        data=df, response_col=response_col, labels=labels,
+        branch_map=branch_map)
     no_pupils[['count', 'percentage', 'n_responses']] = 0
 
     # Find results of aggregation for each pupil group
     result = results_by_site_and_group(
-        data=df, agg_func=aggregate_proportions, no_pupils=no_pupils,
+        data=df,
+        agg_func=partial(aggregate_proportions, branch_map=branch_map),
+        no_pupils=no_pupils,
         response_col=response_col, labels=labels, group_type='standard',
-        site_col=site_col)
+        site_col=site_col, wave_col=wave_col)
 
     # Hide results where n<10
     result.loc[result['n_responses'] < 10,
@@ -63,7 +74,7 @@ def aggregate_standard_responses(df, site_col):
     return result
 
 
-def aggregate_symbol_responses(df, site_col):
+def aggregate_symbol_responses(df, site_col, wave_col=None):
     '''
     Aggregate responses to symbol survey (non-demographic), using functions
     including aggregate_proportions() and results_by_site_and_group().
@@ -74,6 +85,9 @@ def aggregate_symbol_responses(df, site_col):
         Pupil-level survey responses
     site_col : string
         Name of column with site to group by (e.g. 'school_lab', 'site')
+    wave_col : string
+        Optional input, name of column with the survey wave (e.g. 'wave'), to
+        aggregate each wave seperately. Default is None (single wave).
     '''
     # Make list of columns that we want to count responses for
     # These are lab columns, but with demographic items removed
@@ -92,18 +106,24 @@ def aggregate_symbol_responses(df, site_col):
     for key, value in labels.items():
         value.update({np.nan: 'No response'})
 
+    # Identify the branching questions once, to reuse for each site and group
+    branch_map = create_branch_map(labels)
+
     # Create version where every question has count 0, to use when a school has
     # no pupils of a particular subgroup (i.e. no-one in certain
     # FSM/SEN/gender/year)
     no_pupils = aggregate_proportions(
-        data=df, response_col=response_col, labels=labels)
+        data=df, response_col=response_col, labels=labels,
+        branch_map=branch_map)
     no_pupils[['count', 'percentage', 'n_responses']] = 0
 
     # Find results of aggregation for each pupil group
     result = results_by_site_and_group(
-        data=df, agg_func=aggregate_proportions, no_pupils=no_pupils,
+        data=df,
+        agg_func=partial(aggregate_proportions, branch_map=branch_map),
+        no_pupils=no_pupils,
         response_col=response_col, labels=labels, group_type='symbol',
-        site_col=site_col)
+        site_col=site_col, wave_col=wave_col)
 
     # Hide results where n<10
     result.loc[result['n_responses'] < 10,
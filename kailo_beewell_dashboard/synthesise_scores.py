@@ -6,6 +6,8 @@ for the dashboard.
 import math
 import numpy as np
 import pandas as pd
+import warnings
+from .synthesise_aggregate import define_groups
 
 
 def sum_score(df):
@@ -325,7 +327,167 @@ def score_descriptives(values, counts):
     return result
 
 
-def create_rag_ratings(df):
+def bootstrap_score_ci(data, group_type='standard', site_col='school_lab',
+                       n_boot=1000, confidence=95, batch_size=100,
+                       min_count=10, seed=None, wave_col=None):
+    '''
+    Find bootstrap confidence intervals for the mean of every score column,
+    for all possible sites and groups (matching the rows produced by
+    results_by_site_and_group() with aggregate_scores()).
+
+    Pupils are resampled with replacement within each site and group. To
+    avoid looping over sites, groups and topics, pupils are stacked once per
+    group they belong to, and arranged into a padded array with a block for
+    each site and group. Each batch of resamples is drawn as a count of how
+    many times each pupil was picked, and the sums and counts for all blocks
+    and score columns are then found with a single batched matrix product.
+
+    Parameters
+    ----------
+    data : pandas dataframe
+        Pupil-level survey responses, with their site, demographics and the
+        score columns (ending '_score')
+    group_type : string
+        Links to the type of demographic groupings performed. Either
+        'standard', 'symbol' or 'none' - default is standard.
+    site_col : string
+        Name of column with site - e.g. 'school_lab' (default), 'msoa'.
+    n_boot : integer
+        Number of bootstrap resamples - default 1000.
+    confidence : integer
+        Confidence level for the interval, as a percentage - default 95.
+    batch_size : integer
+        Number of resamples to process in each batch - default 100.
+    min_count : integer
+        Intervals are set to NaN where fewer than this many pupils had a
+        score, to match results hidden when n<10 - default 10.
+    seed : integer
+        Optional seed for the random number generator.
+    wave_col : string
+        Optional input, name of column with the survey wave (e.g. 'wave'). If
+        provided, pupils are only resampled within the same wave, and the wave
+        is recorded in the result. Default is None (single wave).
+
+    Returns
+    -------
+    result : pandas DataFrame
+        Dataframe with the site, groups and variable, and the lower and upper
+        bounds of the confidence interval ('ci_lower' and 'ci_upper')
+    '''
+    # If there are multiple waves, find intervals for each wave seperately
+    if wave_col is not None:
+        rng = np.random.default_rng(seed)
+        result_list = list()
+        for wave in data[wave_col].dropna().drop_duplicates().sort_values():
+            res = bootstrap_score_ci(
+                data=data[data[wave_col] == wave], group_type=group_type,
+                site_col=site_col, n_boot=n_boot, confidence=confidence,
+                batch_size=batch_size, min_count=min_count, seed=rng)
+            res[wave_col] = wave
+            result_list.append(res)
+        return pd.concat(result_list)
+
+    # Make a list of the columns that provide a score, and get their values
+    score_col = [col for col in data.columns if col.endswith('_score')]
+    values = data[score_col].to_numpy(dtype=float)
+
+    # Number the sites (sorted, to match results_by_site_and_group()), with
+    # pupils without a site set to -1
+    site_codes, sites = pd.factorize(data[site_col], sort=True)
+    n_sites = len(sites)
+
+    # Stack the pupils once for each group that they belong to, recording the
+    # cell (site and group combination) of each row
+    groups = define_groups(group_type)
+    rows_list = list()
+    cells_list = list()
+    for i, group in enumerate(groups):
+        mask = site_codes >= 0
+        if group != 'All':
+            mask &= (data[group[1]] == group[0]).to_numpy()
+        rows = np.flatnonzero(mask)
+        rows_list.append(rows)
+        cells_list.append(i * n_sites + site_codes[rows])
+    rows = np.concatenate(rows_list)
+    cells = np.concatenate(cells_list)
+
+    # Find the size of each cell, and the position of each row within its
+    # cell, then arrange the scores into a padded array with a block for each
+    # cell. NaN are replaced by 0 with a mask recording which were not NaN
+    # (so means ignore NaN, as in aggregate_scores())
+    n_cells = len(groups) * n_sites
+    sizes = np.bincount(cells, minlength=n_cells)
+    order = np.argsort(cells, kind='stable')
+    position = np.empty(len(cells), dtype=int)
+    position[order] = np.arange(len(cells)) - np.repeat(
+        np.cumsum(sizes) - sizes, sizes)
+    max_size = sizes.max()
+    scores = np.zeros((n_cells, max_size, len(score_col)))
+    not_nan = np.zeros((n_cells, max_size, len(score_col)))
+    stacked = values[rows]
+    scores[cells, position] = np.nan_to_num(stacked)
+    not_nan[cells, position] = ~np.isnan(stacked)
+
+    # Resample in batches, finding the mean of each cell and score column
+    rng = np.random.default_rng(seed)
+    boot_means = np.empty((n_boot, n_cells, len(score_col)))
+    for batch_start in range(0, n_boot, batch_size):
+        n_batch = min(batch_size, n_boot - batch_start)
+        # Draw a random position within the same cell for every row, and
+        # count how many times each position was drawn in each resample
+        draw = (rng.random((n_batch, len(cells))) * sizes[cells]).astype(int)
+        flat = ((np.arange(n_batch)[:, None] * n_cells + cells) * max_size
+                + draw)
+        weights = np.bincount(
+            flat.ravel(), minlength=n_batch * n_cells * max_size).reshape(
+                n_batch, n_cells, max_size).transpose(1, 0, 2).astype(float)
+        # Sum scores and counts for each cell with a batched matrix product
+        sums = np.matmul(weights, scores)
+        counts = np.matmul(weights, not_nan)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            boot_means[batch_start:batch_start+n_batch] = (
+                sums / counts).transpose(1, 0, 2)
+
+    # Find percentiles for the interval, ignoring resamples with no scores
+    alpha = (100 - confidence) / 2
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        lower, upper = np.nanpercentile(
+            boot_means, [alpha, 100 - alpha], axis=0)
+
+    # Hide intervals when there were fewer than min_count pupils with a score
+    observed = not_nan.sum(axis=1)
+    lower[observed < min_count] = np.nan
+    upper[observed < min_count] = np.nan
+
+    # Create dataframe with a row for each cell (with at least one pupil) and
+    # score column
+    present = np.flatnonzero(sizes > 0)
+    lower = lower[present]
+    upper = upper[present]
+    cell_site = np.repeat(present % n_sites, len(score_col))
+    cell_group = np.repeat(present // n_sites, len(score_col))
+    result = pd.DataFrame({
+        'variable': np.tile(score_col, len(present)),
+        'ci_lower': lower.ravel(),
+        'ci_upper': upper.ravel(),
+        site_col: np.asarray(sites)[cell_site]})
+
+    # Set each group as all, replacing one if filter used
+    if group_type != 'none':
+        group_cols = ['year_group_lab', 'gender_lab', 'fsm_lab']
+        if group_type == 'standard':
+            group_cols.append('sen_lab')
+        for col in group_cols:
+            col_values = np.array(
+                [group[0] if group != 'All' and group[1] == col else 'All'
+                 for group in groups], dtype=object)
+            result[col] = col_values[cell_group]
+
+    return result
+
+
+def create_rag_ratings(df, ci=None):
     '''
     Generate rag ratings (above, average, below) based on scores
 
@@ -333,6 +495,9 @@ def create_rag_ratings(df):
     ----------
     df : dataframe
         Contains scores by site, and potentially by pupil group too
+    ci : dataframe
+        Optional input, output of bootstrap_score_ci(). If provided, the
+        confidence intervals are added as columns alongside the mean and RAG.
 
     Result:
     -------
@@ -344,7 +509,8 @@ def create_rag_ratings(df):
     # Get name of grouping columns (assumes only columns in the dataframe
     # are those with mean and count, the site (msoa or school), and then that
     # all other columns are what scores are grouped by) - i.e. just 'variable'
-    # for area maps, or 'variable' plus the demographic columns
+    # for area maps, or 'variable' plus the demographic columns (plus 'wave'
+    # if there are multiple waves, so sites are only compared within a wave)
     score_groups = [e for e in list(df.columns) if e not in [
         'mean', 'count', 'msoa', 'school_lab']]
 
@@ -372,4 +538,56 @@ def create_rag_ratings(df):
     choices = ['below', 'average', 'above']
     rag.loc[:, 'rag'] = np.select(conditions, choices, default=np.nan)
 
+    # Add the bootstrap confidence intervals, if provided
+    if ci is not None:
+        rag = pd.merge(rag, ci, how='left', on=[
+            col for col in ci.columns if col not in ['ci_lower', 'ci_upper']])
+
     return rag
+
+
+def calculate_score_trends(df, wave_col='wave'):
+    '''
+    Find the change in scores since the previous survey wave, for each site,
+    pupil group and topic.
+
+    Parameters
+    ----------
+    df : dataframe
+        Output of create_rag_ratings() for multiple waves, with scores and RAG
+        ratings by site, wave, and potentially by pupil group too
+    wave_col : string
+        Name of column with the survey wave - default 'wave'. Waves should
+        sort into chronological order (e.g. '2023/24', '2024/25').
+
+    Returns
+    -------
+    trends : dataframe
+        Dataframe with the site, groups, variable and wave, the mean, count and
+        RAG rating, and the wave, mean and RAG from the previous wave with
+        results for that site and group ('prev_wave', 'prev_mean', 'prev_rag'),
+        and the change in mean since then ('change')
+    '''
+    # Get name of columns identifying a result (site, groups and variable)
+    keys = [col for col in ['msoa', 'school_lab', 'year_group_lab',
+                            'gender_lab', 'fsm_lab', 'sen_lab', 'variable']
+            if col in df.columns]
+
+    # Sort so waves are in order within each site, group and variable
+    trends = (df[keys + [wave_col, 'mean', 'count', 'rag']]
+              .sort_values(keys + [wave_col])
+              .reset_index(drop=True))
+
+    # Get results from the previous wave, only using waves where there was a
+    # result (i.e. not n<10)
+    previous = (trends[trends['mean'].notna()]
+                .groupby(keys)[[wave_col, 'mean', 'rag']]
+                .shift(1)
+                .rename(columns={wave_col: 'prev_wave', 'mean': 'prev_mean',
+                                 'rag': 'prev_rag'}))
+    trends = trends.join(previous)
+
+    # Find change in mean score since the previous wave
+    trends['change'] = trends['mean'] - trends['prev_mean']
+
+    return trends
@@ -3,7 +3,7 @@ Helper functions for the 'Who took part' section of the dashboard and report
 '''
 from markdown import markdown
 import streamlit as st
-from .reshape_data import extract_nested_results
+from .reshape_data import extract_nested_results, get_school_partition
 from .bar_charts import survey_responses
 from .bar_charts_text import create_response_description
 
@@ -92,7 +92,7 @@ def demographic_headers(survey_type='standard'):
 def demographic_plots(
         dem_prop, chosen_school=None, chosen_group=None,
         group_lab='school_group_lab', output='streamlit', content=None,
-        survey_type='standard', dashboard_type='school'):
+        survey_type='standard', dashboard_type='school', chart_format='png'):
     '''
     Creates the plots for the Who Took Part page/section, with the relevant
     headers and descriptions, for the streamlit dashboard or PDF report.
@@ -118,6 +118,10 @@ def demographic_plots(
         survey dashboard.
     dashboard_type : string
         Specifies whether this is for 'school' (default) or 'area' dashboard.
+    chart_format : string
+        Format of the charts when output=='pdf' - either 'png' (default),
+        'svg' (which are drawn without kaleido) or 'plotly' (which are drawn
+        by plotly.js when the HTML is opened)
 
     Returns
     -------
@@ -126,8 +130,9 @@ def demographic_plots(
     '''
     # If its for a school dashboard
     if dashboard_type == 'school':
-        # Filter to results from current school
-        chosen = dem_prop[dem_prop['school_lab'] == chosen_school]
+        # Filter to results from current school (and the other schools they
+        # are compared with, which are stored with the current school)
+        chosen = get_school_partition(dem_prop, chosen_school)
         # If only looking at that school, drop the comparator school group data
         if chosen_group == 'For your school':
             chosen = chosen[chosen['school_group'] == 1]
@@ -200,7 +205,8 @@ def demographic_plots(
                 survey_responses(to_plot, page='demographic')
             elif output == 'pdf':
                 content = survey_responses(to_plot, font_size=14, output='pdf',
-                                           content=content, page='demographic')
+                                           content=content, page='demographic',
+                                           chart_format=chart_format)
 
     if output == 'pdf':
         return content
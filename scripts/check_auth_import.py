@@ -0,0 +1,95 @@
+'''
+Check that importing the authentication module doesn't load Django (which
+is set up the first time a password is checked), and time the import.
+
+Each run imports the module in a new Python process, so nothing is already
+imported, and the median time is reported. If Django and the dashboard's
+settings are available (i.e. this is run from the dashboard repository), the
+time to set up Django is also reported - this is the cost deferred to the
+first login.
+
+With the package installed (e.g. `pip install -e .`), run:
+    python scripts/check_auth_import.py
+'''
+import json
+import statistics
+import subprocess
+import sys
+
+# Code run in each new process - imports the module, and reports the time
+# taken and whether any Django modules were imported
+IMPORT_CODE = '''
+import json, sys, time
+start = time.perf_counter()
+import kailo_beewell_dashboard.authentication as auth
+seconds = time.perf_counter() - start
+django = sorted(name for name in sys.modules if name.split('.')[0] == 'django')
+if {setup}:
+    start = time.perf_counter()
+    auth.setup_django()
+    setup_seconds = time.perf_counter() - start
+else:
+    setup_seconds = None
+print(json.dumps({{'seconds': seconds, 'django': django,
+                  'setup_seconds': setup_seconds}}))
+'''
+
+
+def time_import(setup=False, runs=5):
+    '''
+    Import the authentication module in new processes
+
+    Parameters
+    ----------
+    setup : boolean
+        Whether to also set up Django after the import - default False
+    runs : integer
+        Number of processes to run - default 5
+
+    Returns
+    -------
+    results : list
+        Result from each process - dictionary with the import time
+        ('seconds'), the Django modules imported ('django'), and the time to
+        set up Django ('setup_seconds', None if not set up)
+    '''
+    results = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, '-c', IMPORT_CODE.format(setup=setup)],
+            capture_output=True, text=True, check=True).stdout
+        results.append(json.loads(output.splitlines()[-1]))
+    return results
+
+
+def django_available():
+    '''
+    Check whether Django and the dashboard's settings can be imported
+
+    Returns
+    -------
+    available : boolean
+        True if Django can be set up
+    '''
+    code = 'import django, config.settings'
+    return subprocess.run([sys.executable, '-c', code],
+                          capture_output=True).returncode == 0
+
+
+if __name__ == '__main__':
+    results = time_import()
+    for result in results:
+        assert not result['django'], (
+            f'Importing authentication loaded Django: {result["django"]}')
+    median = statistics.median(result['seconds'] for result in results)
+    print(f'Import without Django: {median * 1000:.0f} ms (median of '
+          f'{len(results)} runs)')
+
+    if django_available():
+        results = time_import(setup=True)
+        median = statistics.median(
+            result['setup_seconds'] for result in results)
+        print(f'Django set up on first login: {median * 1000:.0f} ms')
+    else:
+        print('Django (or the dashboard settings) not available, so the time '
+              'to set it up was not measured')
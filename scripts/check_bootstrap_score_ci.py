@@ -0,0 +1,155 @@
+'''
+Check bootstrap_score_ci() against a direct loop over the resamples, sites
+and groups, on a small synthetic frame with uneven group sizes (including
+groups much smaller than the padded block size, and empty groups).
+
+The direct loop draws from the random number generator in the same layout
+as bootstrap_score_ci() (a batch of uniform draws for every stacked pupil),
+so with a fixed seed both must give the same intervals.
+
+With the package installed (e.g. `pip install -e .`), run:
+    python scripts/check_bootstrap_score_ci.py
+'''
+import numpy as np
+import pandas as pd
+import warnings
+from kailo_beewell_dashboard.synthesise_aggregate import define_groups
+from kailo_beewell_dashboard.synthesise_scores import bootstrap_score_ci
+
+
+def make_data(seed=0):
+    '''
+    Create pupil-level scores for three sites of very different sizes, with
+    some missing scores and a pupil without a site
+
+    Parameters
+    ----------
+    seed : integer
+        Seed for the random number generator
+
+    Returns
+    -------
+    data : pandas dataframe
+        Pupil-level data with site, demographics and two score columns
+    '''
+    rng = np.random.default_rng(seed)
+    sites = ['School A'] * 40 + ['School B'] * 13 + ['School C'] * 4
+    n = len(sites) + 1
+    data = pd.DataFrame({
+        'school_lab': sites + [np.nan],
+        'year_group_lab': rng.choice(['Year 8', 'Year 10'], n, p=[0.8, 0.2]),
+        'gender_lab': rng.choice(['Girl', 'Boy'], n),
+        'fsm_lab': rng.choice(['FSM', 'Non-FSM'], n, p=[0.15, 0.85]),
+        # No pupils are SEN, so those groups are empty
+        'sen_lab': 'Non-SEN',
+        'autonomy_score': rng.integers(5, 25, n).astype(float),
+        'life_satisfaction_score': rng.integers(0, 10, n).astype(float)})
+    data.loc[rng.choice(n, 8, replace=False), 'autonomy_score'] = np.nan
+    return data
+
+
+def direct_bootstrap_ci(data, n_boot, confidence, batch_size, seed):
+    '''
+    Find the bootstrap intervals by resampling each site and group in turn
+
+    Parameters
+    ----------
+    data : pandas dataframe
+        Pupil-level data, as from make_data()
+    n_boot : integer
+        Number of bootstrap resamples
+    confidence : integer
+        Confidence level for the interval, as a percentage
+    batch_size : integer
+        Number of resamples drawn at once
+    seed : integer
+        Seed for the random number generator
+
+    Returns
+    -------
+    result : pandas DataFrame
+        Dataframe with the site, groups, variable and interval bounds
+    '''
+    score_col = [col for col in data.columns if col.endswith('_score')]
+    sites = data['school_lab'].dropna().drop_duplicates().sort_values()
+
+    # Pupils in each group, in the order they are stacked
+    groups = define_groups('standard')
+    members = list()
+    for group in groups:
+        mask = data['school_lab'].notna()
+        if group != 'All':
+            mask &= data[group[1]] == group[0]
+        members.append(np.flatnonzero(mask))
+    offsets = np.cumsum([0] + [len(m) for m in members])
+
+    rng = np.random.default_rng(seed)
+    cells = [(site, i) for i in range(len(groups)) for site in sites]
+    means = {cell: list() for cell in cells}
+    for batch_start in range(0, n_boot, batch_size):
+        n_batch = min(batch_size, n_boot - batch_start)
+        draws = rng.random((n_batch, offsets[-1]))
+        for b in range(n_batch):
+            for site, i in cells:
+                in_site = np.flatnonzero(
+                    data['school_lab'].to_numpy()[members[i]] == site)
+                pupils = members[i][in_site]
+                picks = (draws[b, offsets[i] + in_site]
+                         * len(pupils)).astype(int)
+                # Resamples with no scores have a mean of NaN
+                with warnings.catch_warnings():
+                    warnings.simplefilter('ignore', category=RuntimeWarning)
+                    means[(site, i)].append(
+                        np.nanmean(data[score_col].to_numpy()[pupils[picks]],
+                                   axis=0)
+                        if len(pupils) else [np.nan] * len(score_col))
+
+    alpha = (100 - confidence) / 2
+    rows = list()
+    for site, i in cells:
+        boot = np.array(means[(site, i)], dtype=float)
+        if np.isnan(boot).all():
+            continue
+        for j, col in enumerate(score_col):
+            values = boot[:, j]
+            values = values[~np.isnan(values)]
+            if len(values):
+                lower, upper = np.percentile(values, [alpha, 100 - alpha])
+            else:
+                lower = upper = np.nan
+            group = groups[i]
+            rows.append({
+                'school_lab': site, 'variable': col,
+                'group': 'All' if group == 'All' else group[0],
+                'ci_lower': lower, 'ci_upper': upper})
+    return pd.DataFrame(rows)
+
+
+if __name__ == '__main__':
+    data = make_data()
+    n_boot, confidence, batch_size, seed = 203, 90, 64, 42
+
+    # Compare with min_count=0, so intervals for the smallest groups are kept
+    fast = bootstrap_score_ci(
+        data, n_boot=n_boot, confidence=confidence, batch_size=batch_size,
+        min_count=0, seed=seed)
+    group_cols = ['year_group_lab', 'gender_lab', 'fsm_lab', 'sen_lab']
+    fast['group'] = fast[group_cols].apply(
+        lambda row: next((v for v in row if v != 'All'), 'All'), axis=1)
+    direct = direct_bootstrap_ci(data, n_boot, confidence, batch_size, seed)
+
+    key = ['school_lab', 'group', 'variable']
+    merged = fast.merge(direct, on=key, how='outer', suffixes=('', '_direct'),
+                        indicator=True)
+    assert (merged['_merge'] == 'both').all(), 'Sites and groups differ'
+    for bound in ['ci_lower', 'ci_upper']:
+        assert np.allclose(merged[bound], merged[f'{bound}_direct'],
+                           equal_nan=True), f'{bound} differs'
+
+    # With the default min_count, groups with fewer than 10 scores are hidden
+    hidden = bootstrap_score_ci(data, n_boot=n_boot, seed=seed)
+    small = hidden['school_lab'] == 'School C'
+    assert hidden.loc[small, ['ci_lower', 'ci_upper']].isnull().all().all()
+
+    print(f'bootstrap_score_ci() matches the direct loop for '
+          f'{len(merged)} intervals')
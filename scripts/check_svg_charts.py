@@ -0,0 +1,83 @@
+'''
+Check that fig_to_svg() draws the bar charts when some bars are missing, as
+for a demographic chart where one group was hidden due to low response (its
+percentages are stored as nan, which extract_nested_results() turns into
+None).
+
+The missing bars should be skipped, so the chart should match the one drawn
+from the same figure with the missing bars given as NaN instead of None.
+
+With the package installed (e.g. `pip install -e .`), run:
+    python scripts/check_svg_charts.py
+'''
+import numpy as np
+import pandas as pd
+import warnings
+from kailo_beewell_dashboard.bar_charts import responses_figure
+from kailo_beewell_dashboard.reshape_data import extract_nested_results
+from kailo_beewell_dashboard.svg_charts import fig_to_svg
+
+
+def make_results():
+    '''
+    Create the nested results for one question for two groups, where the
+    results for the second group were hidden
+
+    Returns
+    -------
+    chosen : pandas dataframe
+        Results with the nested lists as strings
+    '''
+    return pd.DataFrame({
+        'measure': 'autonomy',
+        'measure_lab': 'Autonomy',
+        'gender_lab': ['Girl', 'Boy'],
+        'n_responses': [20, 12],
+        'cat': ['[1, 2, 3]', '[1, 2, 3]'],
+        'cat_lab': ["['Never', 'Sometimes', 'Often']"] * 2,
+        'percentage': ['[25.0, 50.0, 25.0]', '[nan, nan, nan]'],
+        'count': ['[5, 10, 5]', '[nan, nan, nan]']})
+
+
+def count_bars(svg, colour):
+    '''
+    Count the bars of a colour in an SVG chart (excluding the legend marker)
+    '''
+    return svg.count(f"fill='{colour}'") - 1
+
+
+def main():
+    '''
+    Draw the chart with the hidden group, with its percentages as NaN and as
+    None, and check only the bars for the shown group are drawn
+    '''
+    # Depending on the pandas version, concatenating the results keeps the
+    # hidden percentages as None or converts them to NaN
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', FutureWarning)
+        results = extract_nested_results(make_results(),
+                                         group_lab='gender_lab')
+    hidden = results['group'] == 'Boy'
+    nan_results = results.assign(
+        percentage=results['percentage'].astype(float))
+    none_results = results.assign(percentage=pd.Series(
+        np.where(hidden, None, nan_results['percentage']), dtype=object,
+        index=results.index))
+    colour_map = {'Girl': '#5D98AB', 'Boy': '#FFB7C1'}
+
+    nan_svg = fig_to_svg(responses_figure(nan_results, colour_map,
+                                          'Percentage'))
+    fig = responses_figure(none_results, colour_map, 'Percentage')
+    assert all(y is None for y in fig['data'][1]['y'])
+    none_svg = fig_to_svg(fig)
+    assert none_svg == nan_svg, 'None and NaN bars were drawn differently'
+
+    shown_bars = count_bars(nan_svg, colour_map['Girl'])
+    hidden_bars = count_bars(nan_svg, colour_map['Boy'])
+    assert shown_bars == 3, f'shown group has {shown_bars} bars, not 3'
+    assert hidden_bars == 0, f'hidden group has {hidden_bars} bars, not 0'
+    print('fig_to_svg() skips the bars for the hidden group')
+
+
+if __name__ == '__main__':
+    main()